@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 32))
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "adaptive") # 'legacy', 'standard' or 'adaptive'
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", 5))
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", 10))
+AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", 60))
+BUCKET_VALIDATION_TTL = float(os.getenv("BUCKET_VALIDATION_TTL", 900)) # Seconds a successful head_bucket is trusted
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    retries={"mode": AWS_RETRY_MODE, "max_attempts": AWS_MAX_ATTEMPTS},
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+    tcp_keepalive=True,
+)
+
+_lock = threading.Lock()
+_sessions: dict[str, boto3.Session] = {}
+_clients: dict[tuple[str, str], object] = {}
+_validated_buckets: dict[str, float] = {}
+
+# --- Sessions & Clients ---
+
+def _credential(name: str) -> str | None:
+    """
+    Reads a credential from the environment. The upper-case names win; the lower-case ones from env_example also work.
+    """
+    return os.getenv(name.upper()) or os.getenv(name.lower())
+
+def get_session(region_name: str = AWS_REGION) -> boto3.Session:
+    """
+    Returns a cached boto3 session per region, so credentials are resolved only once.
+    """
+    with _lock:
+        session = _sessions.get(region_name)
+        if session is None:
+            session = boto3.Session(
+                aws_access_key_id=_credential("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=_credential("AWS_SECRET_ACCESS_KEY"),
+                aws_session_token=_credential("AWS_SESSION_TOKEN"),
+                region_name=region_name,
+            )
+            _sessions[region_name] = session
+        return session
+
+def get_client(service_name: str, region_name: str = AWS_REGION):
+    """
+    Returns a cached client per (service, region) that shares one connection pool across calls and threads.
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    session = get_session(region_name)
+    with _lock: # Sessions are not thread-safe while creating clients
+        client = _clients.get(key)
+        if client is None:
+            client = session.client(service_name, config=CLIENT_CONFIG)
+            _clients[key] = client
+            logger.debug(f"Created boto3 '{service_name}' client for region '{region_name}'.")
+    return client
+
+def validate_bucket(s3_client, bucket_name: str, ttl: float = BUCKET_VALIDATION_TTL) -> None:
+    """
+    Runs head_bucket at most once per `ttl` seconds for each bucket. Errors are raised and not cached.
+    """
+    now = time.monotonic()
+    with _lock:
+        validated_at = _validated_buckets.get(bucket_name)
+    if validated_at is not None and now - validated_at < ttl:
+        return
+
+    s3_client.head_bucket(Bucket=bucket_name)
+    with _lock:
+        _validated_buckets[bucket_name] = now
+
+def clear_cache() -> None:
+    """
+    Drops every cached session, client and bucket validation (e.g. after rotating credentials).
+    """
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+        _validated_buckets.clear()
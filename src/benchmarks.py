@@ -0,0 +1,449 @@
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.compaction import compact_month, month_days
+from src.dataset import partition_path, read_pregao
+from src.etl import B3_FOOTER_CODES, transform_b3_data
+from src.refine_job import TOTAL_COLUMN, top_n_window
+from src.s3_upload import write_parquet_to_s3
+from src.table_parser import read_b3_table
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+RAW_FIXTURES_GLOB = "raw/pregao_b3/ano=*/mes=*/dia=*.parquet"
+BENCHMARK_RESULTS_DIR = os.getenv("BENCHMARK_RESULTS_DIR", "benchmark_results")
+BENCHMARK_REGRESSION_THRESHOLD = float(os.getenv("BENCHMARK_REGRESSION_THRESHOLD", 0.15)) # Relative slowdown flagged by --compare
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 150)) # `python -m src --help`, interpreter start included
+LAMBDA_IMPORT_BUDGET_MS = float(os.getenv("LAMBDA_IMPORT_BUDGET_MS", 600)) # Cold import of src.trigger_glue
+
+HEAVY_MODULES = ("pandas", "pyarrow", "numpy", "selenium", "webdriver_manager", "bs4", "boto3", "dotenv")
+
+# --- Fixtures ---
+
+def load_raw_fixture() -> pd.DataFrame:
+    """
+    Loads the transformed B3 partitions committed under raw/pregao_b3.
+    """
+    paths = sorted(glob.glob(RAW_FIXTURES_GLOB))
+    if not paths:
+        raise FileNotFoundError(f"No Parquet fixtures found for '{RAW_FIXTURES_GLOB}'. Run from the repository root.")
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+def format_br_number(value: float, decimals: int = 0) -> str:
+    """
+    Formats a number the way the B3 site displays it: 476976044 -> '476.976.044', 0.495 -> '0,495'.
+    """
+    return f"{value:,.{decimals}f}".translate(str.maketrans(",.", ".,"))
+
+def render_b3_page_html(df: pd.DataFrame, filler_blocks: int = 2000) -> str:
+    """
+    Renders rows as a B3 index page: the portfolio table (with its footer rows) surrounded by unrelated markup,
+    so parsers pay for the document size the same way they do on the live page.
+    """
+    body_rows = "".join(
+        f"<tr><td>{row.cod}</td><td>{row.acao}</td><td>{row.tipo}</td>"
+        f"<td>{format_br_number(row.qtde_teorica)}</td><td>{format_br_number(row.part_teorica_porc, 3)}</td></tr>"
+        for row in df.itertuples(index=False)
+    )
+    filler = "".join(f'<div class="nav-item"><a href="#item{i}">Item {i}</a></div>' for i in range(filler_blocks))
+    return (
+        "<html><head><title>Composição da Carteira</title></head><body>"
+        f"<nav>{filler}</nav>"
+        '<table class="table table-responsive-sm table-responsive-md">'
+        "<thead><tr><th>Código</th><th>Ação</th><th>Tipo</th><th>Qtde. Teórica</th><th>Part. (%)</th></tr></thead>"
+        f"<tbody>{body_rows}</tbody>"
+        "<tfoot><tr><td>Quantidade Teórica Total</td><td></td><td></td><td>99.999.999.999</td><td>100,000</td></tr>"
+        "<tr><td>Redutor</td><td></td><td></td><td>16.522.783,12345</td><td></td></tr></tfoot>"
+        f"</table><footer>{filler}</footer></body></html>"
+    )
+
+def make_synthetic_raw_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Builds a raw B3 frame (as returned by the extractors) of arbitrary size from the committed partitions,
+    with footer rows interleaved every ~90 rows like the concatenated daily pages.
+    """
+    fixture = load_raw_fixture()
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(fixture), rows)
+    sample = fixture.iloc[picks].reset_index(drop=True)
+
+    qtde = sample["qtde_teorica"].to_numpy()
+    raw = pd.DataFrame({
+        "Código": sample["cod"].to_numpy(dtype=object),
+        "Ação": sample["acao"].to_numpy(dtype=object),
+        "Tipo": sample["tipo"].to_numpy(dtype=object),
+        "Qtde. Teórica": pd.Series(qtde).map("{:,}".format).str.replace(",", ".", regex=False).to_numpy(dtype=object),
+        "Part. (%)": sample["part_teorica_porc"].map("{:.3f}".format).str.replace(".", ",", regex=False).to_numpy(dtype=object),
+    })
+    footer_positions = np.arange(0, rows, 90)
+    raw.loc[footer_positions, "Código"] = np.resize(np.array(B3_FOOTER_CODES, dtype=object), len(footer_positions))
+    return raw
+
+def legacy_transform_b3_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The transform shipped before the schema-enforced version, kept only as a benchmark baseline.
+    """
+    df_transformed = df.copy()
+    df_transformed = df_transformed[df_transformed["Código"] != "Redutor"]
+    df_transformed = df_transformed[df_transformed["Código"] != "Quantidade Teórica Total"]
+    df_transformed.loc[:, "valor_limpo"] = df_transformed["Qtde. Teórica"].astype(str).str.replace(".", "", regex=False)
+    df_transformed.loc[:, "Qtde. Teórica"] = pd.to_numeric(df_transformed["valor_limpo"], errors="coerce")
+    df_transformed.drop(columns=["valor_limpo"], inplace=True)
+    return df_transformed.rename(columns={
+        "Código": "cod", "Ação": "acao", "Tipo": "tipo", "Qtde. Teórica": "qtde_teorica", "Part. (%)": "part_teorica_porc",
+    })
+
+# --- Benchmarks ---
+
+def _time(function, repeat: int) -> float:
+    """
+    Returns the best wall time, in milliseconds, of `repeat` single calls.
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+def benchmark_table_parsing(repeat: int = 20) -> dict:
+    """
+    Compares pd.read_html over the full page with the table-scoped lxml parser from src/table_parser.py.
+    """
+    df = load_raw_fixture()
+    page_df = df.head(20) # One pagination step of the B3 table
+    html = render_b3_page_html(page_df)
+
+    read_html_ms = _time(lambda: pd.read_html(io.StringIO(html), match="Código", attrs={"class": "table"},
+                                              thousands=None, converters={"Part. (%)": str})[0], repeat)
+    lxml_ms = _time(lambda: read_b3_table(html), repeat)
+
+    return {
+        "benchmark": "table_parsing",
+        "rows": len(page_df),
+        "html_bytes": len(html.encode("utf-8")),
+        "read_html_ms": round(read_html_ms, 3),
+        "table_parser_ms": round(lxml_ms, 3),
+        "speedup": round(read_html_ms / lxml_ms, 2),
+    }
+
+def benchmark_transform(rows: int = 1_000_000, repeat: int = 3) -> dict:
+    """
+    Times transform_b3_data against the legacy implementation on a synthetic frame.
+    """
+    raw = make_synthetic_raw_frame(rows)
+    logging.getLogger("src.etl").setLevel(logging.WARNING) # Keep per-call INFO logs out of the timings
+
+    legacy_ms = _time(lambda: legacy_transform_b3_data(raw), repeat)
+    transform_ms = _time(lambda: transform_b3_data(raw), repeat)
+    output = transform_b3_data(raw)
+
+    return {
+        "benchmark": "transform",
+        "rows": rows,
+        "legacy_ms": round(legacy_ms, 3),
+        "transform_ms": round(transform_ms, 3),
+        "speedup": round(legacy_ms / transform_ms, 2),
+        "output_mb": round(output.memory_usage(deep=True).sum() / 2**20, 2),
+    }
+
+def write_daily_partitions(root: str, year: int) -> int:
+    """
+    Writes one small Parquet file per day of `year` under `root`, like the daily pipeline does. Returns the file count.
+    """
+    fixture = load_raw_fixture()
+    days = [day for month in range(1, 13) for day in month_days(year, month)]
+    for day in days:
+        path = f"{partition_path(root, day)}.parquet"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixture.to_parquet(path, index=False)
+    return len(days)
+
+def benchmark_compaction(year: int = 2024, repeat: int = 5) -> dict:
+    """
+    Reads a year of daily partitions before and after compacting its months, for the full table and for one code.
+    """
+    logging.getLogger("src.dataset").setLevel(logging.WARNING)
+    logging.getLogger("src.compaction").setLevel(logging.WARNING)
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    code = load_raw_fixture()["cod"].iloc[0]
+
+    with tempfile.TemporaryDirectory() as root:
+        files = write_daily_partitions(root, year)
+        daily_ms = _time(lambda: read_pregao(start, end, root=root), repeat)
+        daily_code_ms = _time(lambda: read_pregao(start, end, codes=[code], root=root), repeat)
+        before = read_pregao(start, end, root=root)
+
+        for month in range(1, 13):
+            compact_month(year, month, root)
+        compacted_ms = _time(lambda: read_pregao(start, end, root=root), repeat)
+        compacted_code_ms = _time(lambda: read_pregao(start, end, codes=[code], root=root), repeat)
+        after = read_pregao(start, end, root=root)
+
+    return {
+        "benchmark": "compaction",
+        "daily_files": files,
+        "rows": len(after),
+        "same_rows": len(before) == len(after),
+        "daily_read_ms": round(daily_ms, 3),
+        "compacted_read_ms": round(compacted_ms, 3),
+        "speedup": round(daily_ms / compacted_ms, 2),
+        "daily_read_one_code_ms": round(daily_code_ms, 3),
+        "compacted_read_one_code_ms": round(compacted_code_ms, 3),
+    }
+
+def benchmark_parquet_codecs(rows: int = 1_000_000, codecs: tuple[str, ...] = ("snappy", "zstd", "gzip", "none"),
+                             repeat: int = 3) -> dict:
+    """
+    Encode and decode times and file sizes of the transformed schema for each Parquet codec.
+    """
+    table = pa.Table.from_pandas(transform_b3_data(make_synthetic_raw_frame(rows)), preserve_index=False)
+    results = {}
+    for codec in codecs:
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression=codec)
+        payload = buffer.getvalue()
+        encode_ms = _time(lambda: pq.write_table(table, io.BytesIO(), compression=codec), repeat)
+        decode_ms = _time(lambda: pq.read_table(io.BytesIO(payload)), repeat)
+        results[codec] = {"encode_ms": round(encode_ms, 3), "decode_ms": round(decode_ms, 3), "bytes": len(payload)}
+    return {"benchmark": "parquet_codecs", "rows": table.num_rows, "codecs": results}
+
+def make_window_daily_sums(days: int = 8, codes: int = 5_000, seed: int = 42) -> list[pa.Table]:
+    """
+    Per-day (cod, acao, qtde_teorica) sums as kept by src/refine_job.py, for `codes` synthetic tickers.
+    """
+    rng = np.random.default_rng(seed)
+    cods = np.array([f"C{i:05d}" for i in range(codes)], dtype=object)
+    return [pa.table({"cod": cods, "acao": cods, "qtde_teorica": rng.integers(1, 10**10, codes)}) for _ in range(days)]
+
+def benchmark_window_aggregation(days: int = 8, codes: int = 5_000, top_n: int = 5, repeat: int = 5) -> dict:
+    """
+    The Glue job's 7-day SQL (GROUP BY + ORDER BY SUM DESC LIMIT n, run here on in-memory SQLite)
+    against the pyarrow top_n_window used by the incremental refine job.
+    """
+    daily = make_window_daily_sums(days, codes)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE pregao (cod TEXT, acao TEXT, qtde_teorica INTEGER)")
+    conn.executemany("INSERT INTO pregao VALUES (?, ?, ?)",
+                     (row for table in daily for row in zip(*(table[name].to_pylist() for name in table.column_names))))
+    sql = f"""
+        SELECT cod, acao, SUM(qtde_teorica) AS {TOTAL_COLUMN} FROM pregao
+        GROUP BY cod, acao ORDER BY {TOTAL_COLUMN} DESC, cod LIMIT {top_n}
+    """
+    sql_ms = _time(lambda: conn.execute(sql).fetchall(), repeat)
+    arrow_ms = _time(lambda: top_n_window(daily, top_n), repeat)
+    same = [tuple(row) for row in conn.execute(sql).fetchall()] == list(zip(*top_n_window(daily, top_n).to_pydict().values()))
+    conn.close()
+    return {
+        "benchmark": "window_aggregation",
+        "rows": days * codes,
+        "sql_ms": round(sql_ms, 3),
+        "top_n_window_ms": round(arrow_ms, 3),
+        "speedup": round(sql_ms / arrow_ms, 2),
+        "same_result": same,
+    }
+
+class LocalS3Stub:
+    """
+    In-memory stand-in for the S3 calls made by src/s3_upload.py, so uploads can be timed offline without the
+    network. Objects end up in `objects`.
+    """
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self._uploads: dict[str, dict[int, bytes]] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        self.objects[f"{Bucket}/{Key}"] = bytes(Body)
+        return {"ETag": str(hash(Body))}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> dict:
+        upload_id = f"{Key}-{len(self._uploads)}"
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> dict:
+        self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict) -> dict:
+        parts = self._uploads.pop(UploadId)
+        self.objects[f"{Bucket}/{Key}"] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        return {}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> dict:
+        self._uploads.pop(UploadId, None)
+        return {}
+
+def benchmark_s3_upload(rows: int = 2_000_000, repeat: int = 3) -> dict:
+    """
+    Streams a transformed frame through write_parquet_to_s3 into the local S3 stand-in (encoding + part handling).
+    """
+    df = transform_b3_data(make_synthetic_raw_frame(rows))
+    client = LocalS3Stub()
+    upload_ms = _time(lambda: write_parquet_to_s3(client, df, "bucket", "raw/b3_dados_brutos.parquet"), repeat)
+    size = len(client.objects["bucket/raw/b3_dados_brutos.parquet"])
+    return {
+        "benchmark": "s3_upload",
+        "rows": len(df),
+        "bytes": size,
+        "upload_ms": round(upload_ms, 3),
+        "mb_per_s": round(size / 2**20 / (upload_ms / 1000), 2),
+    }
+
+def _startup_probe(statement: str) -> list[str]:
+    """
+    Heavy modules loaded by `statement` in a fresh interpreter.
+    """
+    code = f"import sys\n{statement}\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return [name for name in output.strip().split(",") if name]
+
+def benchmark_startup(repeat: int = 5, budget_ms: float = STARTUP_BUDGET_MS,
+                      lambda_budget_ms: float = LAMBDA_IMPORT_BUDGET_MS) -> dict:
+    """
+    Cold start of the CLI and of the Lambda module, each in a new interpreter. `within_budget` is False (and
+    main() exits with 1) when either one gets slower than its budget or the CLI starts importing heavy modules.
+    """
+    def run(command: list[str]) -> None:
+        subprocess.run(command, capture_output=True, check=True)
+
+    cli_ms = _time(lambda: run([sys.executable, "-m", "src", "--help"]), repeat)
+    lambda_ms = _time(lambda: run([sys.executable, "-c", "import src.trigger_glue"]), repeat)
+    cli_heavy = _startup_probe("import src.cli; src.cli.build_parser().format_help()")
+    lambda_heavy = _startup_probe("import src.trigger_glue")
+    return {
+        "benchmark": "startup",
+        "cli_help_ms": round(cli_ms, 2),
+        "lambda_import_ms": round(lambda_ms, 2),
+        "cli_heavy_modules": cli_heavy,
+        "lambda_heavy_modules": lambda_heavy, # boto3 is expected: it ships with the Lambda runtime
+        "budget_ms": budget_ms,
+        "lambda_budget_ms": lambda_budget_ms,
+        "within_budget": cli_ms <= budget_ms and lambda_ms <= lambda_budget_ms and not cli_heavy
+                         and not set(lambda_heavy) - {"boto3"},
+    }
+
+BENCHMARKS = {
+    "table_parsing": benchmark_table_parsing,
+    "transform": benchmark_transform,
+    "compaction": benchmark_compaction,
+    "parquet_codecs": benchmark_parquet_codecs,
+    "window_aggregation": benchmark_window_aggregation,
+    "s3_upload": benchmark_s3_upload,
+    "startup": benchmark_startup,
+}
+# Smaller inputs for a quick local check (--quick)
+QUICK_PARAMS = {
+    "transform": {"rows": 100_000},
+    "parquet_codecs": {"rows": 100_000},
+    "window_aggregation": {"codes": 1_000},
+    "s3_upload": {"rows": 200_000},
+}
+
+# --- Results ---
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(names: list[str] | None = None, quick: bool = False) -> dict:
+    """
+    Runs the selected benchmarks and returns them with the environment they ran in.
+    """
+    results = []
+    for name in names or list(BENCHMARKS):
+        logger.info(f"Running benchmark '{name}'...")
+        results.append(BENCHMARKS[name](**(QUICK_PARAMS.get(name, {}) if quick else {})))
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "quick": quick,
+        "results": results,
+    }
+
+def _timings(result: dict, prefix: str = "") -> dict[str, float]:
+    """
+    Flattens every *_ms value of a benchmark result ({'codecs': {'zstd': {'encode_ms': 1}}} -> 'codecs.zstd.encode_ms').
+    """
+    timings = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            timings.update(_timings(value, f"{prefix}{key}."))
+        elif key.endswith("_ms") and isinstance(value, (int, float)):
+            timings[f"{prefix}{key}"] = float(value)
+    return timings
+
+def compare_results(baseline: dict, current: dict, threshold: float = BENCHMARK_REGRESSION_THRESHOLD) -> list[dict]:
+    """
+    Timings that got more than `threshold` slower than in `baseline`.
+    """
+    previous = {result["benchmark"]: _timings(result) for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        for metric, value in _timings(result).items():
+            before = previous.get(result["benchmark"], {}).get(metric)
+            if before and value > before * (1 + threshold):
+                regressions.append({"benchmark": result["benchmark"], "metric": metric, "baseline_ms": before,
+                                    "current_ms": value, "change": round(value / before - 1, 3)})
+    return regressions
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the ETL hot paths.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run (default: all).")
+    parser.add_argument("--quick", action="store_true", help="Use smaller inputs.")
+    parser.add_argument("--output", help=f"Results file (default: {BENCHMARK_RESULTS_DIR}/<timestamp>-<commit>.json).")
+    parser.add_argument("--compare", help="Baseline results file; exits with 1 when a timing regressed.")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_REGRESSION_THRESHOLD)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    report = run_benchmarks(args.only, args.quick)
+    for result in report["results"]:
+        print(json.dumps(result, ensure_ascii=False))
+
+    output = args.output or os.path.join(
+        BENCHMARK_RESULTS_DIR, f"{datetime.now():%Y%m%dT%H%M%S}-{report['commit'] or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    logger.info(f"Results written to '{output}'.")
+
+    over_budget = [result["benchmark"] for result in report["results"] if result.get("within_budget") is False]
+    if over_budget:
+        logger.error(f"Over budget: {', '.join(over_budget)}.")
+        return 1
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare_results(json.load(file), report, args.threshold)
+        for regression in regressions:
+            logger.warning(f"Regression: {json.dumps(regression)}")
+        if regressions:
+            return 1
+        logger.info(f"No timing regressed more than {args.threshold:.0%} against '{args.compare}'.")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -1,101 +1,83 @@
-import requests
-import sqlite3
 import logging
 from datetime import datetime
-import os
-import pandas as pd
-from io import BytesIO
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-
-data_hora = datetime.today()
-
-# Criar conexão com banco SQLite
-db_path = "aws_etl_projeto2_fiap.db"
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# Criar tabela se não existir
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS preco_bitcoin (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        data_hora TEXT,
-        preco_brl REAL
-    )
-""")
-conn.commit()
-logging.info("Tabela 'preco_bitcoin' verificada/criada com sucesso.")
-
-# URL da API
-url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=brl"
-logging.info(f"Fazendo requisição para a API: {url}")
-
-try:
-    response = requests.get(url)
-    logging.info(f"Status da resposta: {response.status_code}")
-
-    if response.status_code == 200:
-        data = response.json()
-        preco = data["bitcoin"]["brl"]
-
-
-        logging.info(f"Preço do Bitcoin obtido: R$ {preco:,.2f} em {data_hora}")
-        logging.info("Inserindo dados no banco de dados...")
-
-        # Inserir no banco
-        cursor.execute(
-            "INSERT INTO preco_bitcoin (data_hora, preco_brl) VALUES (?, ?)",
-            (data_hora, preco)
-        )
-        conn.commit()
-        logging.info("Dados inseridos com sucesso no banco de dados.")
-
-        logging.info("Consultando histórico de preços...")
-         # Consulta todos os registros
-        cursor.execute("SELECT id, data_hora, preco_brl FROM preco_bitcoin ORDER BY id DESC")
-        registros = cursor.fetchall()
-
-        if registros:
-            print("\n=== Histórico de Preços do Bitcoin ===")
-            for registro in registros:
-                id, data_hora, preco = registro
-                print(f"ID: {id} | Data/Hora: {data_hora} | Preço: R$ {preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+
+from src.price_cache import PriceCache
+from src.rolling_parquet import BTC_TICK_SCHEMA, RollingParquetWriter
+from src.rollups import apply_retention, refresh_rollups
+from src.storage import connect, insert_btc_prices, latest_btc_prices
+
+def main():
+    """
+    Busca o preço atual do bitcoin, grava no SQLite e na pasta local em parquet.
+    """
+    data_hora = datetime.today()
+    preco = None
+
+    # Criar conexão com banco SQLite (WAL, pragmas e migrações em src/storage.py)
+    conn = connect()
+    logging.info("Tabela 'preco_bitcoin' verificada/criada com sucesso.")
+
+    # Requisição ao CoinGecko pelo PriceCache (sessão com timeout de PRICE_HTTP_TIMEOUT segundos)
+    logging.info("Consultando o preço do bitcoin no CoinGecko...")
+
+    try:
+        cotacao = PriceCache(heartbeat_interval=0).get("bitcoin", "brl")
+        logging.info(f"Status da consulta: {cotacao.status}")
+
+        if cotacao.status != "error":
+            preco = cotacao.price
+
+
+            logging.info(f"Preço do Bitcoin obtido: R$ {preco:,.2f} em {data_hora}")
+            logging.info("Inserindo dados no banco de dados...")
+
+            # Inserir no banco (data_hora gravada como epoch em segundos)
+            insert_btc_prices(conn, [(data_hora, preco)])
+            logging.info("Dados inseridos com sucesso no banco de dados.")
+
+            # Atualiza as agregações OHLC (1m/5m/1h/1d) e descarta ticks antigos já agregados
+            refresh_rollups(conn)
+            apply_retention(conn)
+
+            logging.info("Consultando histórico de preços...")
+            # Consulta só os registros mais recentes (índice em data_hora), não a tabela inteira
+            registros = list(latest_btc_prices(conn, limit=10).itertuples(index=False))
+
+            if registros:
+                print("\n=== Histórico de Preços do Bitcoin ===")
+                for registro in registros:
+                    id_registro, data_hora_registro, preco_registro = registro
+                    print(f"ID: {id_registro} | Data/Hora: {data_hora_registro} | Preço: R$ {preco_registro:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+            else:
+                print("Nenhum registro encontrado.")
         else:
-            print("Nenhum registro encontrado.")
-    else:
-        logging.error("Erro ao acessar CoinGecko - Código de status diferente de 200")
-
-except Exception as e:
-    logging.exception("Erro inesperado ao acessar a API ou salvar no banco.")
-
-# Upload do arquivo para a pasta local
-logging.info("Fazendo upload do arquivo parquet para a pasta local...")
-
-data_hora = datetime.today()
-
-df = pd.DataFrame({
-            "data_hora": [data_hora],
-            "preco_brl": [preco]
-        })
-buffer_parquet = BytesIO()
-df.to_parquet(buffer_parquet, index=False)
-
-parquet_destination = f"./parquet_arq/preco_bitcoin/ano={data_hora.year}/mes={data_hora.month:02d}/dia={data_hora.day:02d}.parquet"
-parquet_directory = os.path.dirname(parquet_destination)
-os.makedirs(parquet_directory, exist_ok=True)
-
-try:
-    buffer_parquet.seek(0)
-    with open(parquet_destination, "wb") as f:
-        f.write(buffer_parquet.getvalue())
-    logging.info("Upload para a pasta local concluído.")
-except Exception as e:
-    logging.error(f"Erro no upload para a pasta local: {e}")
-
-finally:
-    conn.close()
-    logging.info("Conexão com o banco de dados encerrada.")
+            logging.error("Erro ao acessar CoinGecko - preço não obtido")
+
+    except Exception as e:
+        logging.exception("Erro inesperado ao acessar a API ou salvar no banco.")
+
+    # Gravação do tick na pasta local: cada execução acrescenta um arquivo part-*.parquet na partição do dia
+    # (em vez de sobrescrever dia=DD.parquet com uma única linha) e os dias anteriores são consolidados
+    logging.info("Gravando o tick em parquet na pasta local...")
+
+    try:
+        with RollingParquetWriter("./parquet_arq/preco_bitcoin", BTC_TICK_SCHEMA) as writer:
+            writer.seal_pending(before=data_hora.date())
+            if preco is not None:
+                writer.write({"data_hora": data_hora, "preco_brl": float(preco)})
+        logging.info("Gravação na pasta local concluída.")
+    except Exception as e:
+        logging.error(f"Erro na gravação na pasta local: {e}")
+
+    finally:
+        conn.close()
+        logging.info("Conexão com o banco de dados encerrada.")
+
+
+if __name__ == "__main__":
+    # Configurar logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    main()
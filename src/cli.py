@@ -0,0 +1,67 @@
+import argparse
+import importlib
+import logging
+import sys
+from typing import NamedTuple
+
+# Single entry point for the scripts: python -m src <command> [args]. Only the chosen command's module is imported,
+# so `--help` and dispatch never pay for pandas, pyarrow, selenium or boto3.
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# --- Commands ---
+
+class Command(NamedTuple):
+    module: str
+    function: str
+    help: str
+    takes_argv: bool = True # False for scripts whose entry point parses no arguments
+
+COMMANDS = {
+    "etl": Command("src.etl", "main", "Scrape the IBOV page and upload the day's raw partition to S3."),
+    "schedule": Command("src.scheduler", "main", "Scrape every B3_TARGETS index concurrently.", takes_argv=False),
+    "scrape-selenium": Command("src.scrapping_b3", "executar_scraping",
+                               "Legacy pipeline into bucket-s3-b3 (with data_hora and an optional SQLite copy).",
+                               takes_argv=False),
+    "refine": Command("src.refine_job", "main", "Incremental 7-day top-N refinement of the raw data."),
+    "refine-worker": Command("src.refine_worker", "main", "Refine new raw days as their SQS notifications arrive."),
+    "compact": Command("src.compaction", "main", "Compact closed months of the raw dataset."),
+    "backfill": Command("src.upload_buckets", "main", "Upload local day partitions to the S3 raw layout."),
+    "firehose-create": Command("src.create_firehose_stream", "main", "Create the bitcoin Firehose delivery stream."),
+    "firehose-convert": Command("src.firehose_converter", "main", "Convert delivered Firehose JSON into Parquet."),
+    "ingest-btc": Command("src.ingest_strem_btc", "main", "Stream bitcoin prices to Firehose.", takes_argv=False),
+    "poll-prices": Command("src.price_poller", "main", "Poll CoinGecko prices into SQLite and Parquet.",
+                           takes_argv=False),
+    "btc-snapshot": Command("src.bitoin_coin_gecko_api", "main", "Store one bitcoin price tick.", takes_argv=False),
+    "query": Command("src.query", "main", "Run SQL over the raw/refined Parquet data and the SQLite tables."),
+    "benchmarks": Command("src.benchmarks", "main", "Run the offline benchmarks."),
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    width = max(map(len, COMMANDS))
+    listing = "\n".join(f"  {name:<{width}}  {command.help}" for name, command in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="python -m src",
+        description="ETL scripts of the B3 and bitcoin pipelines.",
+        epilog=f"commands:\n{listing}\n\nRun 'python -m src <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    command = COMMANDS[args.command]
+    if args.args and not command.takes_argv:
+        parser.error(f"'{args.command}' takes no arguments (configured through environment variables).")
+
+    # Modules only create loggers; logging is configured once here (or in each script's __main__ block)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    sys.argv[0] = f"{parser.prog} {args.command}" # Shown in the usage line of the command's own parser
+    entry_point = getattr(importlib.import_module(command.module), command.function)
+    result = entry_point(args.args) if command.takes_argv else entry_point()
+    return result if isinstance(result, int) else 0
@@ -0,0 +1,252 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from src.aws_clients import get_client
+from src.dataset import (MANIFEST_NAME, PREGAO_RAW_ROOT, concat_day_tables, date_range, load_manifest, manifest_path,
+                         month_key, partition_files, resolve_root)
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_COMPRESSION = os.getenv("COMPACTION_COMPRESSION", "zstd")
+COMPACTION_ROW_GROUP_SIZE = int(os.getenv("COMPACTION_ROW_GROUP_SIZE", 64_000)) # Rows; ~1 day of one code per group at scale
+COMPACTION_GRACE_SECONDS = float(os.getenv("COMPACTION_GRACE_SECONDS", 3600)) # Replaced daily files live this long for in-flight readers
+COMPACTION_LOCK_TIMEOUT = float(os.getenv("COMPACTION_LOCK_TIMEOUT", 300)) # Seconds to wait for another compaction
+COMPACTION_LOCK_TTL = float(os.getenv("COMPACTION_LOCK_TTL", 3600)) # Older locks are considered left by a crashed run
+
+LOCK_NAME = "_manifest.lock"
+# Compacted files live outside the ano=/mes= tree: the '_' prefix hides them from readers that list the root
+# without the manifest (Spark/Glue and pyarrow datasets skip '_' paths), which would otherwise read every row
+# twice while the replaced daily files wait for purge_retired
+COMPACTED_DIR = "_compacted"
+
+# --- Manifest ---
+
+def save_manifest(filesystem: pafs.FileSystem, root: str, manifest: dict) -> None:
+    """
+    Publishes a new manifest in one step: a single PUT on S3, a write + rename on local disk.
+    """
+    path = f"{root}/{MANIFEST_NAME}"
+    payload = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    if isinstance(filesystem, pafs.LocalFileSystem):
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with filesystem.open_output_stream(temporary) as stream:
+            stream.write(payload)
+        filesystem.move(temporary, path)
+    else:
+        with filesystem.open_output_stream(path) as stream:
+            stream.write(payload)
+
+def _relative(root: str, path: str) -> str:
+    return path[len(root) + 1:] if path.startswith(f"{root}/") else path
+
+# --- Manifest Lock ---
+
+def _try_lock(filesystem: pafs.FileSystem, lock_path: str) -> bool:
+    """
+    Creates the lock exclusively: O_EXCL on local disk, a conditional PUT (If-None-Match: *) on S3.
+    A lock older than COMPACTION_LOCK_TTL is removed first.
+    """
+    info = filesystem.get_file_info(lock_path)
+    if info.type == pafs.FileType.File and info.mtime is not None \
+            and time.time() - info.mtime.timestamp() > COMPACTION_LOCK_TTL:
+        logger.warning(f"Removing stale lock '{lock_path}'.")
+        filesystem.delete_file(lock_path)
+
+    owner = f"{os.getpid()}@{datetime.now().isoformat(timespec='seconds')}".encode("utf-8")
+    if isinstance(filesystem, pafs.LocalFileSystem):
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(owner)
+        return True
+
+    bucket, key = lock_path.split("/", 1)
+    s3_client = get_client("s3")
+    try:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=owner, IfNoneMatch="*")
+    except s3_client.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict"):
+            return False
+        raise
+    return True
+
+@contextlib.contextmanager
+def manifest_lock(filesystem: pafs.FileSystem, root: str, timeout: float = COMPACTION_LOCK_TIMEOUT):
+    """
+    Serializes the read-modify-write of the manifest, so concurrent compactions (or a purge) never drop
+    each other's entries.
+    """
+    lock_path = f"{root}/{LOCK_NAME}"
+    deadline = time.monotonic() + timeout
+    while not _try_lock(filesystem, lock_path):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Could not acquire '{lock_path}' within {timeout:.0f}s.")
+        time.sleep(1)
+    try:
+        yield
+    finally:
+        filesystem.delete_file(lock_path)
+
+# --- Compaction ---
+
+def month_days(year: int, month: int) -> list[date]:
+    first = date(year, month, 1)
+    last = date(year + month // 12, month % 12 + 1, 1)
+    return date_range(first, date.fromordinal(last.toordinal() - 1))
+
+def compact_month(year: int, month: int, root: str = PREGAO_RAW_ROOT, compression: str = COMPACTION_COMPRESSION,
+                  row_group_size: int = COMPACTION_ROW_GROUP_SIZE) -> dict | None:
+    """
+    Rewrites the daily files of a month into one file sorted by (cod, data).
+
+    The new file is written under a unique name first and only becomes visible when the manifest that
+    points to it is published, so readers see either the daily files or the compacted file, never both.
+    """
+    filesystem, path = resolve_root(root)
+    with manifest_lock(filesystem, path):
+        return _compact_month(filesystem, path, year, month, compression, row_group_size)
+
+def _compact_month(filesystem: pafs.FileSystem, path: str, year: int, month: int, compression: str,
+                   row_group_size: int) -> dict | None:
+    manifest = load_manifest(filesystem, path)
+    key = month_key(date(year, month, 1))
+    previous = manifest["months"].get(key)
+
+    # Daily files already merged into the current compacted file are only waiting for purge_retired
+    known = {manifest_path(path, file) for file in previous["replaces"]} if previous else set()
+    daily_files = []
+    tables = []
+    for day in month_days(year, month):
+        for info in partition_files(filesystem, path, day):
+            if info.path in known:
+                continue
+            daily_files.append(_relative(path, info.path))
+            table = pq.read_table(info.path, filesystem=filesystem, partitioning=None)
+            tables.append(table.append_column("data", pa.array([day] * table.num_rows, pa.date32())))
+
+    if previous:
+        if not daily_files:
+            logger.info(f"Month {key} is already compacted and has no new daily files.")
+            return previous
+        # Late daily files: merge them with the current compacted file
+        tables.insert(0, pq.read_table(f"{path}/{previous['file']}", filesystem=filesystem, partitioning=None))
+
+    if not tables:
+        logger.info(f"No daily files found for {key}.")
+        return None
+
+    table = concat_day_tables(tables) # Days written before and after `tipo` became a category differ in type
+    table = table.take(pc.sort_indices(table, sort_keys=[("cod", "ascending"), ("data", "ascending")]))
+
+    relative = f"{COMPACTED_DIR}/ano={year}/mes={month:02d}/compacted-{uuid.uuid4().hex[:12]}.parquet"
+    filesystem.create_dir(f"{path}/{relative.rsplit('/', 1)[0]}", recursive=True) # No-op on S3
+    pq.write_table(
+        table,
+        f"{path}/{relative}",
+        filesystem=filesystem,
+        compression=compression,
+        row_group_size=row_group_size,
+        use_dictionary=True,
+        write_statistics=True, # min/max per row group lets readers skip groups by cod and data
+    )
+
+    now = time.time()
+    entry = {
+        "file": relative,
+        "replaces": sorted(set(daily_files) | {_relative(path, file) for file in (previous["replaces"] if previous else [])}),
+        "rows": table.num_rows,
+        "compacted_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    manifest["months"][key] = entry
+    retired = [{"path": file, "retired_at": now} for file in daily_files]
+    if previous:
+        retired.append({"path": previous["file"], "retired_at": now})
+    manifest["retired"] = manifest.get("retired", []) + retired
+    save_manifest(filesystem, path, manifest)
+
+    logger.info(f"Compacted {len(daily_files)} daily file(s) of {key} into '{relative}' ({table.num_rows} rows).")
+    return entry
+
+def purge_retired(root: str = PREGAO_RAW_ROOT, grace_seconds: float = COMPACTION_GRACE_SECONDS) -> int:
+    """
+    Deletes replaced files once their grace period has passed. Returns how many were deleted.
+    """
+    filesystem, path = resolve_root(root)
+    with manifest_lock(filesystem, path):
+        manifest = load_manifest(filesystem, path)
+        return _purge_retired(filesystem, path, manifest, grace_seconds)
+
+def _purge_retired(filesystem: pafs.FileSystem, path: str, manifest: dict, grace_seconds: float) -> int:
+    now = time.time()
+    keep, deleted = [], 0
+    for item in manifest.get("retired", []):
+        if now - item["retired_at"] < grace_seconds:
+            keep.append(item)
+            continue
+        try:
+            filesystem.delete_file(manifest_path(path, item["path"]))
+        except FileNotFoundError:
+            pass
+        deleted += 1
+    if deleted:
+        manifest["retired"] = keep
+        save_manifest(filesystem, path, manifest)
+        logger.info(f"Deleted {deleted} retired file(s).")
+    return deleted
+
+def closed_months(filesystem: pafs.FileSystem, root: str, today: date) -> list[tuple[int, int]]:
+    """
+    Months with data that ended before the current month.
+    """
+    months = []
+    for year_info in filesystem.get_file_info(pafs.FileSelector(root, allow_not_found=True)):
+        if year_info.type != pafs.FileType.Directory or not year_info.base_name.startswith("ano="):
+            continue
+        year = int(year_info.base_name[4:])
+        for month_info in filesystem.get_file_info(pafs.FileSelector(year_info.path)):
+            if month_info.type == pafs.FileType.Directory and month_info.base_name.startswith("mes="):
+                month = int(month_info.base_name[4:])
+                if (year, month) < (today.year, today.month):
+                    months.append((year, month))
+    return sorted(months)
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compacts closed months of the raw B3 dataset.")
+    parser.add_argument("--root", default=PREGAO_RAW_ROOT, help="Local path or s3:// URI of the raw dataset.")
+    parser.add_argument("--month", help="Month to compact (YYYY-MM). Defaults to every closed month.")
+    parser.add_argument("--compression", default=COMPACTION_COMPRESSION, choices=["zstd", "snappy", "gzip", "none"])
+    parser.add_argument("--row-group-size", type=int, default=COMPACTION_ROW_GROUP_SIZE)
+    parser.add_argument("--grace-seconds", type=float, default=COMPACTION_GRACE_SECONDS)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.month:
+        months = [tuple(int(part) for part in args.month.split("-"))]
+    else:
+        filesystem, path = resolve_root(args.root)
+        months = closed_months(filesystem, path, date.today())
+
+    for year, month in months:
+        compact_month(year, month, args.root, args.compression, args.row_group_size)
+    purge_retired(args.root, args.grace_seconds)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
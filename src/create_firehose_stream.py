@@ -1,42 +1,143 @@
-import boto3
+import argparse
+import json
+import os
 import time
 
-# --- Configurações ---
-firehose_client = boto3.client('firehose', region_name='us-east-1')
+from src.aws_clients import get_client
 
+# --- Configurações ---
 # Nome que você deseja dar ao seu fluxo Firehose
 stream_name = 'ingest_bitcoin_stream'
 
 # Nome do seu bucket S3 onde os dados serão armazenados
 s3_bucket_name = 'nome-do-seu-bucket-s3'
 
-# ARN do papel do IAM que o Firehose irá assumir para escrever no S3
+# ARN do papel do IAM que o Firehose irá assumir para escrever no S3 (e ler o schema no Glue)
 # Certifique-se de que este papel exista e tenha as permissões corretas
 iam_role_arn = 'arn:aws:iam::123456789012:role/firehose_s3_delivery_role'
 
-# Prefixo de pasta dentro do bucket S3 (opcional)
-s3_prefix = 'dados-brutos/'
+# Prefixos dentro do bucket S3: dados particionados por moeda e data, erros separados por tipo
+s3_prefix = 'dados/coin=!{partitionKeyFromQuery:coin}/data=!{partitionKeyFromQuery:data}/'
+s3_error_prefix = 'erros/!{firehose:error-output-type}/data=!{timestamp:yyyy-MM-dd}/'
+
+# Formato de entrega: 'parquet' (conversão pelo schema do Glue), 'gzip' (JSON comprimido) ou 'none'
+delivery_format = os.getenv('FIREHOSE_FORMAT', 'parquet')
+buffer_size_mb = int(os.getenv('FIREHOSE_BUFFER_MB', 128)) # min 64 com particionamento dinâmico, max 128
+buffer_interval_seconds = int(os.getenv('FIREHOSE_BUFFER_SECONDS', 300)) # min 60, max 900
+
+# Tabela do Glue usada só como schema da conversão JSON -> Parquet
+glue_database = os.getenv('FIREHOSE_GLUE_DATABASE', 'default')
+glue_table = os.getenv('FIREHOSE_GLUE_TABLE', 'ingest_bitcoin_stream')
+
+# Campos enviados por src/ingest_strem_btc.py e src/price_poller.py (ver FirehoseProducer). O src/firehose_converter.py
+# grava as mesmas colunas nas mesmas partições dados/coin=/data=, então os dois conjuntos de arquivos são lidos juntos
+record_columns = [
+    {'Name': 'timestamp', 'Type': 'string'},
+    {'Name': 'coin', 'Type': 'string'},
+    {'Name': 'currency', 'Type': 'string'},
+    {'Name': 'price', 'Type': 'double'},
+    {'Name': 'last_updated_at', 'Type': 'bigint'},
+    {'Name': 'heartbeat', 'Type': 'boolean'},
+]
+
+
+# --- Configuração do destino ---
+def build_destination_config(delivery_format=delivery_format, size_mb=buffer_size_mb, interval_seconds=buffer_interval_seconds):
+    """
+    Monta a ExtendedS3DestinationConfiguration com particionamento dinâmico por moeda e data
+    (extraídas do próprio registro via JQ) e o formato de entrega escolhido.
+    """
+    # O particionamento dinâmico (sempre ligado aqui) exige buffer entre 64 e 128 MB, em qualquer formato
+    size_mb = min(max(size_mb, 64), 128)
+
+    config = {
+        'RoleARN': iam_role_arn,
+        'BucketARN': f'arn:aws:s3:::{s3_bucket_name}',
+        'Prefix': s3_prefix,
+        'ErrorOutputPrefix': s3_error_prefix,
+        'CompressionFormat': 'GZIP' if delivery_format == 'gzip' else 'UNCOMPRESSED', # O Parquet já é comprimido (SNAPPY)
+        'BufferingHints': {
+            'SizeInMBs': size_mb,
+            'IntervalInSeconds': interval_seconds
+        },
+        'DynamicPartitioningConfiguration': {
+            'Enabled': True,
+            'RetryOptions': {'DurationInSeconds': 300}
+        },
+        'ProcessingConfiguration': {
+            'Enabled': True,
+            'Processors': [
+                {
+                    'Type': 'MetadataExtraction',
+                    'Parameters': [
+                        # 'timestamp' chega como '2025-08-01 12:00:00'; os 10 primeiros caracteres são a data
+                        {'ParameterName': 'MetadataExtractionQuery', 'ParameterValue': '{coin: .coin, data: .timestamp[0:10]}'},
+                        {'ParameterName': 'JsonParsingEngine', 'ParameterValue': 'JQ-1.6'}
+                    ]
+                }
+            ]
+        }
+    }
+
+    if delivery_format == 'parquet':
+        config['DataFormatConversionConfiguration'] = {
+            'Enabled': True,
+            'SchemaConfiguration': {
+                'RoleARN': iam_role_arn,
+                'DatabaseName': glue_database,
+                'TableName': glue_table,
+                'Region': 'us-east-1',
+                'VersionId': 'LATEST'
+            },
+            'InputFormatConfiguration': {'Deserializer': {'OpenXJsonSerDe': {}}},
+            'OutputFormatConfiguration': {'Serializer': {'ParquetSerDe': {'Compression': 'SNAPPY'}}}
+        }
+    else:
+        # Sem conversão os registros são JSON; o produtor já termina cada um com '\n', mas garantimos aqui
+        config['ProcessingConfiguration']['Processors'].append({
+            'Type': 'AppendDelimiterToRecord',
+            'Parameters': [{'ParameterName': 'Delimiter', 'ParameterValue': '\\n'}]
+        })
+    return config
+
+
+def create_glue_schema_table():
+    """
+    Cria a tabela do Glue que descreve os registros (necessária para a conversão para Parquet).
+    """
+    glue_client = get_client('glue', 'us-east-1')
+    try:
+        glue_client.create_table(
+            DatabaseName=glue_database,
+            TableInput={
+                'Name': glue_table,
+                'TableType': 'EXTERNAL_TABLE',
+                'StorageDescriptor': {
+                    'Columns': record_columns,
+                    'Location': f's3://{s3_bucket_name}/dados/',
+                    'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                    'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                    'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}
+                },
+                'PartitionKeys': [{'Name': 'coin', 'Type': 'string'}, {'Name': 'data', 'Type': 'string'}]
+            }
+        )
+        print(f"Tabela de schema '{glue_database}.{glue_table}' criada.")
+    except glue_client.exceptions.AlreadyExistsException:
+        print(f"A tabela de schema '{glue_database}.{glue_table}' já existe.")
 
 
 # --- Criação do Fluxo Firehose ---
-def create_firehose_stream():
+def create_firehose_stream(destination_config=None):
     """
     Cria um novo fluxo de entrega do Kinesis Data Firehose.
     """
+    firehose_client = get_client('firehose', 'us-east-1') # Cacheado em src/aws_clients.py
     try:
         response = firehose_client.create_delivery_stream(
             DeliveryStreamName=stream_name,
             DeliveryStreamType='DirectPut',
-            S3DestinationConfiguration={
-                'RoleARN': iam_role_arn,
-                'BucketARN': f'arn:aws:s3:::{s3_bucket_name}',
-                'Prefix': s3_prefix,
-                'CompressionFormat': 'UNCOMPRESSED', # GZIP, SNAPPY, HADOOP_SNAPPY ou ZIP
-                'BufferingHints': {
-                    'SizeInMBs': 64,   # Tamanho do buffer em MBs (min: 1, max: 128)
-                    'IntervalInSeconds': 60 # Intervalo de tempo do buffer em segundos (min: 60, max: 900)
-                }
-            }
+            ExtendedS3DestinationConfiguration=destination_config or build_destination_config()
         )
         print(f"Iniciando a criação do fluxo '{stream_name}'...")
         return response
@@ -53,6 +154,7 @@ def wait_for_stream_active(stream_name_to_check):
     Espera até que o fluxo Firehose esteja no estado 'ACTIVE'.
     """
     print(f"Verificando o status do fluxo...")
+    firehose_client = get_client('firehose', 'us-east-1')
     while True:
         try:
             response = firehose_client.describe_delivery_stream(DeliveryStreamName=stream_name_to_check)
@@ -67,6 +169,20 @@ def wait_for_stream_active(stream_name_to_check):
             return False
 
 # --- Execução ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cria o fluxo Firehose do bitcoin.")
+    parser.add_argument('--format', choices=['parquet', 'gzip', 'none'], default=delivery_format)
+    parser.add_argument('--dry-run', action='store_true', help="Só imprime a configuração do destino.")
+    args = parser.parse_args(argv)
+
+    config = build_destination_config(args.format)
+    if args.dry_run:
+        print(json.dumps(config, indent=2, ensure_ascii=False))
+    else:
+        if args.format == 'parquet':
+            create_glue_schema_table()
+        create_firehose_stream(config)
+        wait_for_stream_active(stream_name)
+
 if __name__ == '__main__':
-    create_firehose_stream()
-    wait_for_stream_active(stream_name)
\ No newline at end of file
+    main()
@@ -0,0 +1,191 @@
+from __future__ import annotations # Imported by src/refine_job.py on Glue Python shell (3.9)
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+PREGAO_RAW_ROOT = os.getenv("PREGAO_RAW_ROOT", "raw/pregao_b3") # Local path or s3://bucket/raw
+DATASET_MAX_WORKERS = int(os.getenv("DATASET_MAX_WORKERS", 16))
+
+# --- Partition Helpers ---
+
+def resolve_root(uri: str) -> tuple[pafs.FileSystem, str]:
+    """
+    Returns the pyarrow filesystem and path for a local directory or an s3://bucket/prefix URI.
+    """
+    if "://" in uri:
+        return pafs.FileSystem.from_uri(uri)
+    return pafs.LocalFileSystem(), os.path.abspath(uri)
+
+def date_range(start: date, end: date) -> list[date]:
+    """
+    Every day from `start` to `end`, inclusive.
+    """
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+def partition_path(root: str, day: date) -> str:
+    return f"{root}/ano={day.year}/mes={day.month:02d}/dia={day.day:02d}"
+
+def partition_files(filesystem: pafs.FileSystem, root: str, day: date) -> list[pafs.FileInfo]:
+    """
+    Finds the Parquet files of one day without listing the whole dataset. Both layouts are supported:
+    '<root>/ano=/mes=/dia=DD.parquet' (local history) and '<root>/ano=/mes=/dia=DD/*.parquet' (S3 uploads).
+    """
+    day_path = partition_path(root, day)
+    file_info, dir_info = filesystem.get_file_info([f"{day_path}.parquet", day_path])
+
+    files = [file_info] if file_info.type == pafs.FileType.File else []
+    if dir_info.type == pafs.FileType.Directory:
+        selector = pafs.FileSelector(day_path, recursive=False)
+        files.extend(info for info in filesystem.get_file_info(selector)
+                     if info.type == pafs.FileType.File and info.path.endswith(".parquet"))
+    return files
+
+# --- Compaction Manifest ---
+
+MANIFEST_NAME = "_manifest.json"
+
+def month_key(day: date) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+def load_manifest(filesystem: pafs.FileSystem, root: str) -> dict:
+    """
+    Reads the compaction manifest written by src/compaction.py. Shape:
+    {"months": {"2025-08": {"file": "_compacted/ano=2025/mes=08/compacted-<id>.parquet", "replaces": [...], "rows": n}},
+     "retired": [{"path": "...", "retired_at": epoch}]}
+    Every path is relative to the dataset root, so the same tree can be read from another mount or bucket.
+    """
+    try:
+        with filesystem.open_input_stream(f"{root}/{MANIFEST_NAME}") as stream:
+            return json.loads(stream.read().decode("utf-8"))
+    except FileNotFoundError:
+        return {"months": {}, "retired": []}
+
+def manifest_path(root: str, path: str) -> str:
+    """
+    Resolves a manifest entry against `root`. Entries written before paths were stored relative are kept as-is.
+    """
+    return path if path.startswith(f"{root}/") else f"{root}/{path}"
+
+def day_sources(filesystem: pafs.FileSystem, root: str, day: date, manifest: dict) -> list[pafs.FileInfo]:
+    """
+    Files holding one day's rows: the compacted month file (if any) plus daily files it does not replace yet.
+    """
+    entry = manifest["months"].get(month_key(day))
+    files = partition_files(filesystem, root, day)
+    if entry is None:
+        return files
+    replaced = {manifest_path(root, file) for file in entry["replaces"]}
+    compacted = filesystem.get_file_info(f"{root}/{entry['file']}")
+    return [compacted] + [info for info in files if info.path not in replaced]
+
+# --- Reader ---
+
+def concat_day_tables(tables: list[pa.Table]) -> pa.Table:
+    """
+    Concatenates day tables written over time with slightly different schemas. Dictionary columns (e.g. `tipo`
+    from pandas categories) are decoded to their value type and the rest is unified with permissive promotion
+    (int32 -> int64, missing columns as nulls), so legacy and new days always merge into one schema.
+    """
+    decoded = []
+    for table in tables:
+        for index, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(index, field.name, pc.cast(table.column(index), field.type.value_type))
+        decoded.append(table)
+    return pa.concat_tables(decoded, promote_options="permissive")
+
+def _read_file(filesystem: pafs.FileSystem, info: pafs.FileInfo, start: date, end: date, compacted: bool,
+               columns: list[str] | None, codes: list[str] | None) -> pa.Table:
+    filters = [("cod", "in", codes)] if codes else []
+    if compacted:
+        # Compacted files carry the date as a column; row group statistics let pyarrow skip other days
+        filters += [("data", ">=", start), ("data", "<=", end)]
+        file_columns = None if columns is None else list(dict.fromkeys([*columns, "data"]))
+    else:
+        file_columns = columns
+    table = pq.read_table(info.path, filesystem=filesystem, columns=file_columns, filters=filters or None,
+                          partitioning=None)
+    if not compacted:
+        table = table.append_column("data", pa.array([start] * table.num_rows, pa.date32()))
+    return table
+
+def _read_month(filesystem: pafs.FileSystem, root: str, days: list[date], manifest: dict,
+                columns: list[str] | None, codes: list[str] | None) -> list[pa.Table]:
+    entry = manifest["months"].get(month_key(days[0]))
+    tables = []
+    if entry is not None:
+        compacted = filesystem.get_file_info(f"{root}/{entry['file']}")
+        tables.append(_read_file(filesystem, compacted, days[0], days[-1], True, columns, codes))
+    replaced = {manifest_path(root, file) for file in entry["replaces"]} if entry is not None else set()
+    for day in days:
+        for info in partition_files(filesystem, root, day):
+            if info.path not in replaced:
+                tables.append(_read_file(filesystem, info, day, day, False, columns, codes))
+    return tables
+
+def read_day_table(filesystem: pafs.FileSystem, root: str, day: date, columns: list[str] | None = None,
+                   codes: list[str] | None = None, manifest: dict | None = None) -> pa.Table | None:
+    """
+    Reads a single day, from its daily files or from the compacted month file.
+    """
+    manifest = manifest if manifest is not None else load_manifest(filesystem, root)
+    tables = _read_month(filesystem, root, [day], manifest, columns, codes)
+    return concat_day_tables(tables) if tables else None
+
+def read_pregao_table(start: date, end: date, codes: list[str] | None = None, columns: list[str] | None = None,
+                      root: str = PREGAO_RAW_ROOT, max_workers: int = DATASET_MAX_WORKERS) -> pa.Table:
+    """
+    Arrow version of read_pregao. Partitions are addressed directly from the dates (no prefix listing) and
+    read in parallel; column projection and the `cod` filter are pushed down to the Parquet reader.
+    Months rewritten by src/compaction.py are read from their compacted file, as listed in the manifest.
+    """
+    if end < start:
+        raise ValueError(f"End date {end} is before start date {start}.")
+    filesystem, path = resolve_root(root)
+    manifest = load_manifest(filesystem, path)
+    if columns is not None and codes and "cod" not in columns:
+        columns = [*columns, "cod"] # The filter column must be read; it is dropped again below
+        drop_cod = True
+    else:
+        drop_cod = False
+
+    # One task per compacted month, one per day elsewhere
+    tasks: list[list[date]] = []
+    for day in date_range(start, end):
+        if tasks and month_key(day) in manifest["months"] and month_key(tasks[-1][0]) == month_key(day):
+            tasks[-1].append(day)
+        else:
+            tasks.append([day])
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        tables = [table for batch in executor.map(
+            lambda days: _read_month(filesystem, path, days, manifest, columns, codes), tasks) for table in batch]
+
+    logger.info(f"Read {len(tables)} file(s) between {start} and {end} from '{root}'.")
+    if not tables:
+        return pa.table({"data": pa.array([], pa.date32())})
+    table = concat_day_tables(tables)
+    return table.drop_columns(["cod"]) if drop_cod else table
+
+def read_pregao(start: date, end: date, codes: list[str] | None = None, columns: list[str] | None = None,
+                root: str = PREGAO_RAW_ROOT, max_workers: int = DATASET_MAX_WORKERS) -> pd.DataFrame:
+    """
+    Loads the raw B3 history between `start` and `end` (inclusive) from local disk or S3 as a DataFrame,
+    with a `data` column holding each row's partition date.
+
+    Example: read_pregao(date(2025, 8, 1), date(2025, 8, 31), codes=["PETR4", "VALE3"], columns=["cod", "qtde_teorica"])
+    """
+    return read_pregao_table(start, end, codes, columns, root, max_workers).to_pandas()
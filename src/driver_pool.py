@@ -0,0 +1,153 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from selenium import webdriver
+
+from src.etl import get_chrome_driver
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", 2)) # Maximum number of live browsers
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", 20)) # Recycle a browser after this many scrapes
+DRIVER_ACQUIRE_TIMEOUT = float(os.getenv("DRIVER_ACQUIRE_TIMEOUT", 120))
+
+# --- Driver Pool ---
+
+class DriverPool:
+    """
+    Keeps up to `size` warm Chrome sessions and lends them to scrape calls.
+
+    A driver goes back to the pool after each use and is recycled once it reaches `max_uses`,
+    when the borrowing block raises, or when it no longer answers a health check.
+    """
+
+    def __init__(self, size: int = DRIVER_POOL_SIZE, max_uses: int = DRIVER_MAX_USES,
+                 factory: Callable[[], webdriver.Chrome] = get_chrome_driver):
+        if size < 1:
+            raise ValueError("Driver pool size must be at least 1.")
+        self.size = size
+        self.max_uses = max_uses
+        self._factory = factory
+        self._idle: queue.LifoQueue = queue.LifoQueue() # LIFO keeps the most recently used (warmest) browser in front
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._uses: dict[int, int] = {}
+        self._closed = False
+
+    def warm_up(self, count: int | None = None) -> None:
+        """
+        Starts browsers ahead of time so the first scrape does not pay the cold start.
+        """
+        count = min(count or self.size, self.size)
+        borrowed = []
+        try:
+            for _ in range(count):
+                borrowed.append(self._acquire(timeout=DRIVER_ACQUIRE_TIMEOUT))
+        finally:
+            for driver in borrowed:
+                self._release(driver, healthy=True, count_use=False)
+        logger.info(f"Driver pool warmed up with {len(borrowed)} browser(s).")
+
+    @contextmanager
+    def driver(self, timeout: float = DRIVER_ACQUIRE_TIMEOUT) -> Iterator[webdriver.Chrome]:
+        """
+        Borrows a driver for the duration of the `with` block.
+        """
+        driver = self._acquire(timeout)
+        healthy = False
+        try:
+            yield driver
+            healthy = True
+        finally:
+            self._release(driver, healthy=healthy)
+
+    def close(self) -> None:
+        """
+        Quits every idle browser. Drivers still borrowed are quit when they are returned.
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+        logger.info("Driver pool closed.")
+
+    def _acquire(self, timeout: float) -> webdriver.Chrome:
+        if self._closed:
+            raise RuntimeError("Driver pool is closed.")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No WebDriver available after {timeout} seconds.")
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self._factory()
+                    with self._lock:
+                        self._uses[id(driver)] = 0
+                    logger.info("Started a new browser for the driver pool.")
+                    return driver
+                if self._is_alive(driver):
+                    return driver
+                logger.warning("Discarding a pooled browser that stopped responding.")
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, driver: webdriver.Chrome, healthy: bool, count_use: bool = True) -> None:
+        try:
+            with self._lock:
+                uses = self._uses.get(id(driver), 0) + (1 if count_use else 0)
+                self._uses[id(driver)] = uses
+                closed = self._closed
+
+            if closed or not healthy or uses >= self.max_uses or not self._is_alive(driver):
+                logger.info(f"Recycling browser after {uses} use(s).")
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def _discard(self, driver: webdriver.Chrome) -> None:
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f"Ignoring error while quitting WebDriver: {e}")
+
+    @staticmethod
+    def _is_alive(driver: webdriver.Chrome) -> bool:
+        try:
+            driver.current_url # Cheap round trip to the browser
+            return True
+        except Exception:
+            return False
+
+# --- Shared Pool ---
+
+_pool: DriverPool | None = None
+_pool_lock = threading.Lock()
+
+def get_driver_pool() -> DriverPool:
+    """
+    Returns the process-wide driver pool, creating it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -7,21 +7,31 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from dotenv import load_dotenv
 
+from src.aws_clients import get_client, validate_bucket
+from src.extractors import extract_b3_data
+from src.metrics import profiled, stage
+from src.s3_paths import bucket_name, build_s3_path
+from src.s3_upload import write_parquet_to_s3
+from src.table_parser import extract_table_rows, rows_to_dataframe
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import boto3
 import botocore
+import argparse
+import functools
+import hashlib
 import io
 import logging
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # --- Configuration & Setup ---
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
     
@@ -30,26 +40,24 @@ data_hoje = datetime.today()
 s3_path = f"raw/ano={data_hoje.year}/mes={data_hoje.month:02d}/dia={data_hoje.day:02d}/b3_dados_brutos.parquet"
 
 # Environment variables (with defaults for local testing if not set)
-bucket_name = "bucket-fiap-b3"
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 B3_SCRAPE_URL = os.getenv("B3_SCRAPE_URL", "https://sistemaswebb3-listados.b3.com.br/indexPage/day/IBOV?language=pt-br")
 PAGINATION_CLICKS = int(os.getenv("PAGINATION_CLICKS", 5)) # Number of times to click next page
+UPLOAD_SKIP_UNCHANGED = os.getenv("UPLOAD_SKIP_UNCHANGED", "true").lower() == "true" # Skip the PUT (and the Glue trigger) when the partition already holds the same rows
+UPLOAD_DELTA = os.getenv("UPLOAD_DELTA", "false").lower() == "true" # Also publish the rows that differ from the previous partition
+UPLOAD_DELTA_PREFIX = os.getenv("UPLOAD_DELTA_PREFIX", "raw_delta") # Outside raw/: readers of full days never see deltas
+UPLOAD_DELTA_LOOKBACK_DAYS = int(os.getenv("UPLOAD_DELTA_LOOKBACK_DAYS", 7)) # How far back the previous partition is searched
+CONTENT_HASH_METADATA = "content-sha256" # Stored as x-amz-meta-content-sha256
 
 # --- S3 Client Initialization ---
 
 def get_s3_client(region_name: str) -> boto3.client:
     """
-    Initializes and returns an S3 client using environment variables for credentials.
+    Returns the shared S3 client (credentials from environment variables) after validating the bucket.
     """
     try:
-        s3_client = boto3.client(
-            "s3",
-            region_name=region_name,
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            aws_session_token=os.getenv("AWS_SESSION_TOKEN")
-        )
-        s3_client.head_bucket(Bucket=bucket_name) # Validate bucket access/existence
+        s3_client = get_client("s3", region_name)
+        validate_bucket(s3_client, bucket_name) # Validate bucket access/existence (memoized with a TTL)
         logger.info(f"Successfully initialized S3 client for bucket '{bucket_name}' in region '{region_name}'.")
         return s3_client
     except botocore.exceptions.NoCredentialsError:
@@ -70,6 +78,16 @@ def get_s3_client(region_name: str) -> boto3.client:
 
 # --- Selenium WebDriver Setup ---
 
+@functools.lru_cache(maxsize=1)
+def get_chromedriver_path() -> str:
+    """
+    Resolves the chromedriver binary once per process. CHROMEDRIVER_PATH skips webdriver-manager entirely.
+    """
+    with stage("chromedriver_install"):
+        driver_path = os.getenv("CHROMEDRIVER_PATH") or ChromeDriverManager().install()
+    logger.info(f"Using chromedriver binary at '{driver_path}'.")
+    return driver_path
+
 def get_chrome_driver() -> webdriver.Chrome:
     """
     Configures and returns a headless Chrome WebDriver.
@@ -84,7 +102,7 @@ def get_chrome_driver() -> webdriver.Chrome:
     chrome_options.add_experimental_option('excludeSwitches', ['enable-logging']) # Suppress console logging from Chrome
     
     try:
-        service = ChromeService(ChromeDriverManager().install())
+        service = ChromeService(get_chromedriver_path())
         driver = webdriver.Chrome(service=service, options=chrome_options)
         logger.info("Chrome WebDriver initialized in headless mode.")
         return driver
@@ -97,35 +115,37 @@ def get_chrome_driver() -> webdriver.Chrome:
 def scrape_b3_data(driver: webdriver.Chrome, url: str, pagination_clicks: int) -> pd.DataFrame | None:
     """
     Navigates to the B3 page, scrapes data across multiple pages, and returns a concatenated DataFrame.
+    The driver is borrowed: closing or recycling it is up to the caller (see src/driver_pool.py).
     """
     logger.info(f"Starting B3 scraping process from URL: {url}")
     dfs_list = []
     
     try:
-        driver.get(url)
-        wait = WebDriverWait(driver, 30) # Increased wait time for robustness
+        with stage("page_load"):
+            driver.get(url)
+            wait = WebDriverWait(driver, 30) # Increased wait time for robustness
 
-        logger.info("Page loaded. Waiting for table and pagination element...")
-        
-        # Wait for the table body to be present, and also the next pagination button
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "tbody tr")))
-        next_page_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "li.pagination-next")))
+            logger.info("Page loaded. Waiting for table and pagination element...")
+
+            # Wait for the table body to be present, and also the next pagination button
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "tbody tr")))
+            next_page_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "li.pagination-next")))
         
         for i in range(pagination_clicks):
             logger.info(f"Scraping page {i+1}...")
             # Wait for the table rows to be visible after each page load/click
             wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "tbody tr")))
             
-            html_content = driver.page_source
-            
-            # Using read_html with error handling
-            try:
-                df_pagina = pd.read_html(io.StringIO(html_content), match='Código', attrs={'class': 'table'})[0]
-                dfs_list.append(df_pagina)
-                logger.debug(f"Successfully scraped page {i+1}, found {len(df_pagina)} rows.")
-            except ValueError as e:
-                logger.warning(f"Could not find table on page {i+1}. Skipping. Error: {e}")
+            # Read only the table cells from the DOM instead of re-parsing driver.page_source
+            with stage("parse_page", page=i + 1) as metrics:
+                table = extract_table_rows(driver)
+                df_pagina = rows_to_dataframe(*table) if table is not None else None
+                metrics.rows = 0 if df_pagina is None else len(df_pagina)
+            if df_pagina is None:
+                logger.warning(f"Could not find table on page {i+1}. Skipping.")
                 break # Exit loop if table not found on a page
+            dfs_list.append(df_pagina)
+            logger.debug(f"Successfully scraped page {i+1}, found {len(df_pagina)} rows.")
 
             if i < pagination_clicks - 1: # Only try to click if not on the last iteration
                 # Re-locate the button to ensure it's fresh and clickable after page changes
@@ -136,9 +156,6 @@ def scrape_b3_data(driver: webdriver.Chrome, url: str, pagination_clicks: int) -
     except Exception as e:
         logger.error(f"An error occurred during scraping: {e}")
         return None
-    finally:
-        driver.quit() # Ensure driver is closed even if an error occurs
-        logger.info("WebDriver closed.")
 
     if dfs_list:
         df_concatenated = pd.concat(dfs_list, ignore_index=True)
@@ -150,69 +167,190 @@ def scrape_b3_data(driver: webdriver.Chrome, url: str, pagination_clicks: int) -
 
 # --- Data Transformation ---
 
+# Raw table headers -> output columns, and the dtype every output column is stored with
+B3_COLUMNS = {
+    "Código": "cod",
+    "Ação": "acao",
+    "Tipo": "tipo",
+    "Qtde. Teórica": "qtde_teorica",
+    "Part. (%)": "part_teorica_porc",
+}
+B3_SCHEMA = {
+    "cod": pd.StringDtype(),
+    "acao": pd.StringDtype(),
+    "tipo": "category",
+    "qtde_teorica": "int64",
+    "part_teorica_porc": "float64",
+}
+# Stored dtypes that differ from B3_SCHEMA: Parquet keeps `tipo` as plain string, as in the files written before it
+# became a category in memory, so old and new days of the same tree share one schema
+B3_PARQUET_SCHEMA = {**B3_SCHEMA, "tipo": pd.StringDtype()}
+# Footer rows rendered inside the B3 table
+B3_FOOTER_CODES = ["Redutor", "Quantidade Teórica Total"]
+
+def _parse_br_integer(values: pd.Series) -> pd.Series:
+    """
+    '476.976.044' -> 476976044. Values that are already numeric are passed through.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    # pyarrow kernels avoid the per-element Python work of str.replace + pd.to_numeric
+    digits = pc.replace_substring(pa.array(values.astype(str).to_numpy(), type=pa.string()), ".", "")
+    digits = pc.if_else(pc.utf8_is_digit(digits), digits, pa.scalar(None, pa.string()))
+    return pd.Series(pc.cast(digits, pa.int64()).to_numpy(zero_copy_only=False), index=values.index)
+
+def _parse_participation(values: pd.Series) -> pd.Series:
+    """
+    Returns the participation in percent: '0,495' -> 0.495. Extractors hand it over as the text shown on the
+    page; values that are already numeric are taken as percentages.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float64")
+    cleaned = values.astype(str).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+
 def transform_b3_data(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Cleans and transforms the raw B3 DataFrame.
+    Cleans the raw B3 DataFrame and returns it with the B3_SCHEMA columns and dtypes.
+    Footer rows are dropped with a single isin filter and every column is converted once.
     """
     logger.info("Starting data transformation.")
-    
-    # Make a copy to avoid SettingWithCopyWarning
-    df_transformed = df.copy()
+
+    missing = [column for column in B3_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Raw B3 DataFrame is missing columns: {', '.join(missing)}")
 
     # Cleaning unnecessary values
-    df_transformed = df_transformed[df_transformed["Código"] != "Redutor"]
-    df_transformed = df_transformed[df_transformed["Código"] != "Quantidade Teórica Total"]
-    
-    # Adjusting format of 'Qtde. Teórica'
-    # Use .loc to avoid SettingWithCopyWarning with chained assignments
-    if 'Qtde. Teórica' in df_transformed.columns:
-        df_transformed.loc[:, 'valor_limpo'] = df_transformed['Qtde. Teórica'].astype(str).str.replace('.', '', regex=False)
-        df_transformed.loc[:, 'Qtde. Teórica'] = pd.to_numeric(df_transformed["valor_limpo"], errors='coerce')
-        df_transformed.drop(columns=['valor_limpo'], inplace=True) # Drop the temporary column
-    else:
-        logger.warning("'Qtde. Teórica' column not found in DataFrame. Skipping numeric conversion.")
-
-    # Renaming columns
-    new_columns = {
-        "Código": "cod",
-        "Ação": "acao",
-        "Tipo": "tipo",
-        "Qtde. Teórica": "qtde_teorica",
-        "Part. (%)": "part_teorica_porc"
-    }
-    df_transformed = df_transformed.rename(columns=new_columns)
-    
+    keep = ~df["Código"].isin(B3_FOOTER_CODES)
+    if not keep.all():
+        df = df.loc[keep, list(B3_COLUMNS)]
+
+    qtde_teorica = _parse_br_integer(df["Qtde. Teórica"])
+    valid = qtde_teorica.notna()
+    if not valid.all():
+        logger.warning(f"Dropping {int((~valid).sum())} row(s) with a non-numeric 'Qtde. Teórica'.")
+        df, qtde_teorica = df.loc[valid], qtde_teorica[valid]
+
+    df_transformed = pd.DataFrame({
+        "cod": df["Código"].astype(B3_SCHEMA["cod"]),
+        "acao": df["Ação"].astype(B3_SCHEMA["acao"]),
+        "tipo": df["Tipo"].astype(B3_SCHEMA["tipo"]),
+        "qtde_teorica": qtde_teorica.astype(B3_SCHEMA["qtde_teorica"]),
+        "part_teorica_porc": _parse_participation(df["Part. (%)"]),
+    }).reset_index(drop=True)
+
     logger.info("Data transformation completed successfully.")
     logger.info(f"Total transformed rows: {len(df_transformed)}")
     return df_transformed
 
 # --- S3 Upload Logic ---
 
-def upload_dataframe_to_s3(s3_client: boto3.client, df: pd.DataFrame, bucket_name: str, prefix: str = "raw") -> None:
+def content_hash(df: pd.DataFrame) -> str:
+    """
+    Canonical SHA-256 of a transformed frame: independent of row order and of the source page layout,
+    so the same portfolio always hashes the same.
+    """
+    canonical = df[list(B3_SCHEMA)].astype(B3_SCHEMA).sort_values(list(B3_SCHEMA)).reset_index(drop=True)
+    digest = hashlib.sha256(",".join(canonical.columns).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(canonical, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def get_object_metadata(s3_client: boto3.client, bucket_name: str, key: str) -> dict[str, str] | None:
+    """
+    Returns the user metadata of an object, or None when it does not exist.
+    """
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=key).get("Metadata", {})
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def find_previous_partition(s3_client: boto3.client, bucket_name: str, prefix: str, partitions: dict[str, str] | None,
+                            date: datetime, lookback_days: int = UPLOAD_DELTA_LOOKBACK_DAYS) -> str | None:
+    """
+    Key of the most recent full partition before `date`, looking back at most `lookback_days` days.
     """
-    Uploads a DataFrame to S3 as a Parquet file with a partitioned path.
+    for offset in range(1, lookback_days + 1):
+        key = build_s3_path(prefix, partitions, date - timedelta(days=offset))
+        metadata = get_object_metadata(s3_client, bucket_name, key)
+        if metadata is not None and metadata.get("content-mode", "full") == "full":
+            return key
+    return None
+
+def delta_rows(df: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows of `df` that are not present, with identical values, in `previous`.
+    """
+    columns = list(B3_SCHEMA)
+    merged = df[columns].astype(B3_SCHEMA).merge(
+        previous[columns].astype(B3_SCHEMA).drop_duplicates(), on=columns, how="left", indicator=True
+    )
+    return merged.loc[merged["_merge"] == "left_only", columns].reset_index(drop=True)
+
+def upload_delta(s3_client: boto3.client, df: pd.DataFrame, bucket_name: str, prefix: str,
+                 partitions: dict[str, str] | None, date: datetime, delta_prefix: str = UPLOAD_DELTA_PREFIX) -> str | None:
+    """
+    Writes the rows of `df` that changed since the previous full partition to the delta path of `date`.
+    Returns its key, or None when there is no previous partition or no row changed.
+    """
+    previous_key = find_previous_partition(s3_client, bucket_name, prefix, partitions, date)
+    if previous_key is None:
+        return None
+    body = s3_client.get_object(Bucket=bucket_name, Key=previous_key)["Body"].read()
+    changed = delta_rows(df, pd.read_parquet(io.BytesIO(body)))
+    if changed.empty:
+        logger.info(f"No rows changed since s3://{bucket_name}/{previous_key}. No delta written.")
+        return None
+    delta_path = build_s3_path(delta_prefix, partitions, date)
+    metadata = {CONTENT_HASH_METADATA: content_hash(changed), "rows": str(len(changed)), "content-mode": "delta",
+                "delta-base": previous_key}
+    write_parquet_to_s3(s3_client, changed.astype(B3_PARQUET_SCHEMA), bucket_name, delta_path, Metadata=metadata)
+    logger.info(f"Wrote {len(changed)} of {len(df)} row(s) to s3://{bucket_name}/{delta_path} as a delta of '{previous_key}'.")
+    return delta_path
+
+def upload_dataframe_to_s3(s3_client: boto3.client, df: pd.DataFrame, bucket_name: str, prefix: str = "raw",
+                           partitions: dict[str, str] | None = None, skip_unchanged: bool = UPLOAD_SKIP_UNCHANGED,
+                           delta: bool = UPLOAD_DELTA, delta_prefix: str = UPLOAD_DELTA_PREFIX) -> str | None:
+    """
+    Uploads a DataFrame to S3 as a Parquet file with a partitioned path and returns the object key.
+
+    The canonical content hash is stored in the object metadata. With `skip_unchanged`, a partition that
+    already holds the same content is left untouched, so re-runs and retries do not fire the S3 -> Lambda
+    -> Glue chain again. The key always receives the full day, since refine_job, dataset.py and the Glue job
+    read it as such. With `delta`, the rows that changed since the previous partition are also written to
+    the same path under `delta_prefix` (metadata content-mode=delta, delta-base=<previous key>) for
+    incremental consumers.
     """
     if df.empty:
         logger.warning("DataFrame is empty. Skipping S3 upload.")
-        return
+        return None
 
-    logger.info(f"Initiating upload to S3 bucket: '{bucket_name}'...")
-    
     # Creating the partitioned data path in S3
-    data_hoje = datetime.today()
-    s3_path = f"{prefix}/ano={data_hoje.year}/mes={data_hoje.month:02d}/dia={data_hoje.day:02d}/b3_dados_brutos.parquet"
+    today = datetime.today()
+    s3_path = build_s3_path(prefix, partitions, today)
+    digest = content_hash(df)
+
+    if skip_unchanged:
+        existing = get_object_metadata(s3_client, bucket_name, s3_path)
+        if existing is not None and existing.get(CONTENT_HASH_METADATA) == digest:
+            logger.info(f"s3://{bucket_name}/{s3_path} already holds this content ({digest[:12]}). Skipping upload.")
+            return s3_path
 
-    # Converting DataFrame to Parquet in-memory
-    buffer_parquet = io.BytesIO()
-    df.to_parquet(buffer_parquet, index=False)
-    buffer_parquet.seek(0) # Reset buffer position to the beginning
+    if delta:
+        upload_delta(s3_client, df, bucket_name, prefix, partitions, today, delta_prefix)
 
-    # Uploading the file to the S3 bucket
+    metadata = {CONTENT_HASH_METADATA: digest, "rows": str(len(df)), "content-mode": "full"}
+    logger.info(f"Initiating upload to S3 bucket: '{bucket_name}'...")
+
+    # Streaming Parquet row groups to S3 (multipart for large frames, no full in-memory copy)
     try:
-        s3_client.put_object(
-            Bucket=bucket_name, Key=s3_path, Body=buffer_parquet.getvalue()
-        )
-        logger.info(f"Successfully uploaded data to s3://{bucket_name}/{s3_path}")
+        # Parquet encoding and the (multipart) PUT are streamed together, so they are measured as one stage
+        with stage("upload") as stage_metrics:
+            size = write_parquet_to_s3(s3_client, df.astype(B3_PARQUET_SCHEMA), bucket_name, s3_path, Metadata=metadata)
+            stage_metrics.rows, stage_metrics.bytes = len(df), size
+        logger.info(f"Successfully uploaded {size} bytes to s3://{bucket_name}/{s3_path}")
+        return s3_path
     except botocore.exceptions.ClientError as e:
         logger.error(f"S3 upload failed for '{s3_path}': {e}")
         raise
@@ -222,31 +360,37 @@ def upload_dataframe_to_s3(s3_client: boto3.client, df: pd.DataFrame, bucket_nam
 
 # --- Main Execution Flow ---
 
-def main():
+def main(argv: list[str] | None = None):
     """
     Main function to orchestrate the scraping, transformation, and upload process.
+    Each stage is measured by src/metrics.py; --profile also dumps a cProfile report of the run.
     """
+    parser = argparse.ArgumentParser(description="Scrapes the B3 IBOV portfolio and uploads it to S3.")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile/pstats report to PROFILE_DIR.")
+    args = parser.parse_args(argv)
+
     logger.info("Starting the full B3 data pipeline.")
     
     try:
-        # 1. Initialize S3 client
-        s3 = get_s3_client(AWS_REGION)
+        with profiled(args.profile, name="etl"), stage("pipeline"):
+            # 1. Initialize S3 client
+            with stage("s3_client"):
+                s3 = get_s3_client(AWS_REGION)
 
-        # 2. Get Chrome WebDriver
-        driver = get_chrome_driver()
-        
-        # 3. Execute Scraping
-        raw_df = scrape_b3_data(driver, B3_SCRAPE_URL, PAGINATION_CLICKS)
-        
-        if raw_df is None or raw_df.empty:
-            logger.warning("No data scraped. Exiting pipeline.")
-            return
+            # 2. Extract data (JSON endpoint first, Selenium as fallback)
+            raw_df = extract_b3_data(B3_SCRAPE_URL)
+
+            if raw_df is None or raw_df.empty:
+                logger.warning("No data scraped. Exiting pipeline.")
+                return
 
-        # 4. Transform Data
-        transformed_df = transform_b3_data(raw_df)
+            # 3. Transform Data
+            with stage("transform") as metrics:
+                transformed_df = transform_b3_data(raw_df)
+                metrics.rows = len(transformed_df)
 
-        # 5. Upload to S3
-        upload_dataframe_to_s3(s3, transformed_df, bucket_name, prefix="raw")
+            # 4. Upload to S3
+            upload_dataframe_to_s3(s3, transformed_df, bucket_name, prefix="raw")
 
         logger.info("B3 data pipeline completed successfully!")
 
@@ -254,4 +398,5 @@ def main():
         logger.critical(f"A critical error occurred in the B3 data pipeline: {e}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
     main()
\ No newline at end of file
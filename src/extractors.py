@@ -0,0 +1,167 @@
+import base64
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+
+from src.metrics import stage
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+B3_API_BASE_URL = os.getenv("B3_API_BASE_URL", "https://sistemaswebb3-listados.b3.com.br/indexProxy/indexCall")
+B3_API_PAGE_SIZE = int(os.getenv("B3_API_PAGE_SIZE", 120)) # Large enough to fetch IBOV in a single request
+B3_API_TIMEOUT = float(os.getenv("B3_API_TIMEOUT", 15))
+B3_API_MAX_WORKERS = int(os.getenv("B3_API_MAX_WORKERS", 4))
+B3_EXTRACTOR = os.getenv("B3_EXTRACTOR", "api") # Preferred backend: 'api' or 'selenium'
+B3_EXTRACTOR_FALLBACK = os.getenv("B3_EXTRACTOR_FALLBACK", "selenium") # Empty string disables the fallback
+
+# indexPage view -> indexProxy endpoint backing the table on that page
+PORTFOLIO_ENDPOINTS = {
+    "day": "GetPortfolioDay",
+    "theorical": "GetTheoricalPortfolio",
+}
+
+# JSON fields -> column headers rendered by the B3 table (what pd.read_html returns)
+RAW_COLUMNS = {
+    "cod": "Código",
+    "asset": "Ação",
+    "type": "Tipo",
+    "theoricalQty": "Qtde. Teórica",
+    "part": "Part. (%)",
+}
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/json",
+}
+
+# --- URL Helpers ---
+
+def parse_b3_url(url: str) -> tuple[str, str]:
+    """
+    Extracts the (index, view) pair from an indexPage URL, e.g. '.../indexPage/day/IBOV?language=pt-br' -> ('IBOV', 'day').
+    """
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    try:
+        position = parts.index("indexPage")
+        view, index = parts[position + 1], parts[position + 2]
+    except (ValueError, IndexError):
+        raise ValueError(f"Unrecognized B3 index page URL: {url}")
+    return index.upper(), view
+
+def build_portfolio_api_url(index: str, view: str, page_number: int = 1, page_size: int = B3_API_PAGE_SIZE, language: str = "pt-br") -> str:
+    """
+    Builds the indexProxy URL for one page of a portfolio. The query is sent as base64-encoded JSON in the path.
+    """
+    if view not in PORTFOLIO_ENDPOINTS:
+        raise ValueError(f"Unsupported B3 view '{view}'. Expected one of: {', '.join(PORTFOLIO_ENDPOINTS)}")
+
+    query = {"language": language, "pageNumber": page_number, "pageSize": page_size, "index": index}
+    if view == "day":
+        query["segment"] = "1"
+    encoded_query = base64.b64encode(json.dumps(query, separators=(",", ":")).encode("utf-8")).decode("ascii")
+    return f"{B3_API_BASE_URL}/{PORTFOLIO_ENDPOINTS[view]}/{encoded_query}"
+
+# --- API Extractor ---
+
+def fetch_portfolio_page(session: requests.Session, index: str, view: str, page_number: int, page_size: int) -> dict:
+    """
+    Fetches a single page of the portfolio and returns the decoded JSON payload.
+    """
+    api_url = build_portfolio_api_url(index, view, page_number, page_size)
+    response = session.get(api_url, timeout=B3_API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+def portfolio_json_to_dataframe(payloads: list[dict]) -> pd.DataFrame:
+    """
+    Converts portfolio API payloads into the raw DataFrame shape produced by the Selenium scraper.
+    """
+    records = [record for payload in payloads for record in payload.get("results") or []]
+    # Values are kept as the API sends them ('0,495'); transform_b3_data parses them like the page cells
+    return pd.DataFrame.from_records(records, columns=list(RAW_COLUMNS)).rename(columns=RAW_COLUMNS)
+
+def extract_b3_data_api(url: str, session: requests.Session | None = None, page_size: int = B3_API_PAGE_SIZE) -> pd.DataFrame | None:
+    """
+    Fetches the portfolio behind a B3 index page over plain HTTP, requesting any remaining pages in parallel.
+    """
+    index, view = parse_b3_url(url)
+    logger.info(f"Fetching B3 portfolio '{index}' ({view}) from the JSON endpoint.")
+    own_session = session is None
+    session = session or requests.Session()
+    session.headers.update(HTTP_HEADERS)
+
+    try:
+        first_page = fetch_portfolio_page(session, index, view, 1, page_size)
+        total_pages = int((first_page.get("page") or {}).get("totalPages") or 1)
+        payloads = [first_page]
+
+        if total_pages > 1:
+            with ThreadPoolExecutor(max_workers=min(B3_API_MAX_WORKERS, total_pages - 1)) as executor:
+                payloads.extend(executor.map(
+                    lambda page_number: fetch_portfolio_page(session, index, view, page_number, page_size),
+                    range(2, total_pages + 1),
+                ))
+    finally:
+        if own_session:
+            session.close()
+
+    df = portfolio_json_to_dataframe(payloads)
+    if df.empty:
+        logger.warning(f"The B3 API returned no rows for '{index}' ({view}).")
+        return None
+
+    logger.info(f"API extraction completed. Pages fetched: {len(payloads)}. Raw rows: {len(df)}")
+    return df
+
+# --- Selenium Extractor ---
+
+def extract_b3_data_selenium(url: str, pagination_clicks: int | None = None) -> pd.DataFrame | None:
+    """
+    Scrapes the page with a pooled headless Chrome. Kept as a fallback for when the JSON endpoint is unavailable.
+    """
+    from src.driver_pool import get_driver_pool
+    from src.etl import PAGINATION_CLICKS, scrape_b3_data
+
+    with get_driver_pool().driver() as driver:
+        return scrape_b3_data(driver, url, pagination_clicks or PAGINATION_CLICKS)
+
+# --- Backend Selection ---
+
+EXTRACTORS: dict[str, Callable[[str], pd.DataFrame | None]] = {
+    "api": extract_b3_data_api,
+    "selenium": extract_b3_data_selenium,
+}
+
+def extract_b3_data(url: str, backend: str = B3_EXTRACTOR, fallback: str | None = B3_EXTRACTOR_FALLBACK,
+                    cancelled: threading.Event | None = None) -> pd.DataFrame | None:
+    """
+    Extracts the raw B3 table using the chosen backend, switching to the fallback backend if it fails or returns nothing.
+    The fallback is skipped once `cancelled` is set (see src/scheduler.py), so an abandoned call never borrows a browser.
+    """
+    if backend not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor '{backend}'. Available: {', '.join(EXTRACTORS)}")
+
+    try:
+        with stage("extract", backend=backend) as metrics:
+            df = EXTRACTORS[backend](url)
+            metrics.rows = 0 if df is None else len(df)
+    except Exception as e:
+        logger.warning(f"Extractor '{backend}' failed: {e}")
+        df = None
+
+    if (df is None or df.empty) and fallback and fallback != backend:
+        if cancelled is not None and cancelled.is_set():
+            logger.info(f"Extraction was cancelled; not falling back to the '{fallback}' extractor.")
+            return None
+        logger.info(f"Falling back to the '{fallback}' extractor.")
+        return extract_b3_data(url, backend=fallback, fallback=None)
+    return df
@@ -0,0 +1,155 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+import boto3
+import pandas as pd
+
+from src.aws_clients import get_client
+from src.create_firehose_stream import record_columns
+from src.s3_upload import write_parquet_to_s3
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+FIREHOSE_RAW_PREFIX = os.getenv("FIREHOSE_RAW_PREFIX", "dados-brutos/") # Uncompressed JSON delivered before Parquet conversion
+FIREHOSE_PARQUET_PREFIX = os.getenv("FIREHOSE_PARQUET_PREFIX", "dados/")
+FIREHOSE_STATE_KEY = os.getenv("FIREHOSE_STATE_KEY", "dados/_state/converted_keys.json")
+
+# Same columns and types as the stream's Glue schema table, which converts the records it delivers into the
+# same dados/coin=/data= partitions: both file sets must read back as one table
+TICK_COLUMNS = [column["Name"] for column in record_columns]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S" # 'timestamp' is a string in the Glue table, as sent by the producers
+
+# --- Parsing ---
+
+def iter_json_records(payload: bytes):
+    """
+    Yields every JSON object of a delivered Firehose object: GZIP or plain, newline-delimited or concatenated
+    without any delimiter (what the stream wrote before records were newline-terminated).
+    """
+    if payload[:2] == b"\x1f\x8b":
+        payload = gzip.decompress(payload)
+    text = payload.decode("utf-8")
+    decoder = json.JSONDecoder()
+    position = 0
+    while True:
+        while position < len(text) and text[position] in " \r\n\t":
+            position += 1
+        if position >= len(text):
+            return
+        record, position = decoder.raw_decode(text, position)
+        yield record
+
+def normalize_record(record: dict) -> dict:
+    """
+    Maps both record shapes to one row: ingest_strem_btc.py ({'timestamp', 'coin', 'price', ...}) and the
+    price poller's firehose_record ({'timestamp', 'coin', 'currency', 'price', 'last_updated_at', 'fetched_at'}).
+    Records delivered before the poller sent 'timestamp' only carry 'fetched_at'.
+    """
+    return {
+        "timestamp": record.get("timestamp") or record.get("fetched_at"),
+        "coin": record.get("coin", "bitcoin"),
+        "currency": record.get("currency", "brl"),
+        "price": record.get("price"),
+        "last_updated_at": record.get("last_updated_at"),
+        "heartbeat": bool(record.get("heartbeat", False)),
+    }
+
+def records_to_frame(records: list[dict]) -> pd.DataFrame:
+    """
+    Rows in the TICK_COLUMNS layout, plus a parsed `data_hora` (naive UTC) used to partition and sort them.
+    """
+    df = pd.DataFrame([normalize_record(record) for record in records], columns=TICK_COLUMNS)
+    df["data_hora"] = pd.to_datetime(df["timestamp"], utc=True, format="mixed").dt.tz_localize(None)
+    df["timestamp"] = df["data_hora"].dt.strftime(TIMESTAMP_FORMAT)
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df["last_updated_at"] = pd.to_numeric(df["last_updated_at"], errors="coerce").astype("Int64")
+    return df.dropna(subset=["data_hora", "price"])
+
+# --- State ---
+
+def load_state(s3_client: boto3.client, bucket: str, key: str = FIREHOSE_STATE_KEY) -> set[str]:
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except s3_client.exceptions.NoSuchKey:
+        return set()
+    return set(json.loads(body)["converted"])
+
+def save_state(s3_client: boto3.client, bucket: str, converted: set[str], key: str = FIREHOSE_STATE_KEY) -> None:
+    body = json.dumps({"converted": sorted(converted), "updated_at": datetime.now().isoformat(timespec="seconds")})
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+
+# --- Conversion ---
+
+def list_raw_keys(s3_client: boto3.client, bucket: str, prefix: str) -> list[str]:
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(item["Key"] for item in page.get("Contents", []) if item["Size"] > 0)
+    return sorted(keys)
+
+def convert(s3_client: boto3.client, bucket: str, raw_prefix: str = FIREHOSE_RAW_PREFIX,
+            parquet_prefix: str = FIREHOSE_PARQUET_PREFIX, state_key: str = FIREHOSE_STATE_KEY,
+            delete_source: bool = False) -> dict[str, int]:
+    """
+    Compacts the raw JSON objects not converted yet into one Parquet file per (coin, data) partition:
+    <parquet_prefix>coin=<coin>/data=<YYYY-MM-DD>/part-<batch id>.parquet, the same layout the stream now
+    writes with dynamic partitioning. Converted keys are recorded in a state object, so re-runs only pick up
+    new deliveries.
+    """
+    converted = load_state(s3_client, bucket, state_key)
+    pending = [key for key in list_raw_keys(s3_client, bucket, raw_prefix) if key not in converted and key != state_key]
+    if not pending:
+        logger.info("No new raw objects to convert.")
+        return {"objects": 0, "records": 0, "files": 0}
+
+    records, broken = [], 0
+    for key in pending:
+        payload = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        try:
+            records.extend(iter_json_records(payload))
+        except (ValueError, UnicodeDecodeError) as e:
+            broken += 1
+            logger.warning(f"Could not parse '{key}': {e}")
+    df = records_to_frame(records)
+
+    batch_id = hashlib.sha1("\n".join(pending).encode("utf-8")).hexdigest()[:16] # Same input -> same file names
+    files = 0
+    df["data"] = df["data_hora"].dt.strftime("%Y-%m-%d")
+    for (coin, day), partition in df.groupby(["coin", "data"], sort=True):
+        key = f"{parquet_prefix}coin={coin}/data={day}/part-{batch_id}.parquet"
+        write_parquet_to_s3(s3_client, partition.sort_values("data_hora")[TICK_COLUMNS], bucket, key,
+                            compression="zstd")
+        files += 1
+
+    save_state(s3_client, bucket, converted | set(pending), state_key)
+    if delete_source:
+        for start in range(0, len(pending), 1000): # delete_objects takes at most 1000 keys
+            s3_client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in pending[start:start + 1000]]})
+
+    logger.info(f"Converted {len(pending)} object(s) ({len(df)} records, {broken} unreadable) into {files} Parquet file(s).")
+    return {"objects": len(pending), "records": len(df), "files": files}
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Converts delivered Firehose JSON objects into partitioned Parquet.")
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--raw-prefix", default=FIREHOSE_RAW_PREFIX)
+    parser.add_argument("--parquet-prefix", default=FIREHOSE_PARQUET_PREFIX)
+    parser.add_argument("--state-key", default=FIREHOSE_STATE_KEY)
+    parser.add_argument("--delete-source", action="store_true", help="Delete the raw objects once converted.")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    convert(get_client("s3", "us-east-1"), args.bucket, args.raw_prefix, args.parquet_prefix, args.state_key,
+            args.delete_source)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
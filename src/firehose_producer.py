@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+# Firehose PutRecordBatch limits
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+MAX_RECORD_BYTES = 1000 * 1024
+
+FIREHOSE_FLUSH_INTERVAL = float(os.getenv("FIREHOSE_FLUSH_INTERVAL", 5)) # Seconds a record may wait in the buffer
+FIREHOSE_MAX_BUFFERED_RECORDS = int(os.getenv("FIREHOSE_MAX_BUFFERED_RECORDS", 10_000)) # put() blocks beyond this
+FIREHOSE_MAX_RETRIES = int(os.getenv("FIREHOSE_MAX_RETRIES", 5))
+FIREHOSE_RETRY_BACKOFF = float(os.getenv("FIREHOSE_RETRY_BACKOFF", 0.2)) # Base delay, doubled on every retry
+
+# --- Producer ---
+
+class FirehoseProducer:
+    """
+    Buffers records in memory and ships them with put_record_batch from a background thread.
+
+    A flush happens when 500 records or 4 MiB are buffered, or when the oldest record has waited
+    `flush_interval` seconds. Only the entries reported as failed in a response are retried.
+    put() blocks once `max_buffered_records` are waiting, which is the backpressure signal.
+    """
+
+    def __init__(self, firehose_client, stream_name: str, flush_interval: float = FIREHOSE_FLUSH_INTERVAL,
+                 max_buffered_records: int = FIREHOSE_MAX_BUFFERED_RECORDS, max_retries: int = FIREHOSE_MAX_RETRIES):
+        self.firehose_client = firehose_client
+        self.stream_name = stream_name
+        self.flush_interval = flush_interval
+        self.max_buffered_records = max_buffered_records
+        self.max_retries = max_retries
+
+        self._buffer: deque[tuple[bytes, float]] = deque()
+        self._buffered_bytes = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._sending = False
+        self._flush_requested = False
+        self._stats = {
+            "records_put": 0,
+            "records_sent": 0,
+            "records_failed": 0,
+            "bytes_sent": 0,
+            "batches_sent": 0,
+            "retries": 0,
+            "batch_latency_total_s": 0.0,
+            "batch_latency_max_s": 0.0,
+            "record_latency_max_s": 0.0,
+        }
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"firehose-{stream_name}", daemon=True)
+        self._thread.start()
+
+    # --- Public API ---
+
+    def put(self, record: dict | str | bytes, timeout: float | None = None) -> None:
+        """
+        Queues a record. Dicts are serialized as one JSON line so delivered objects stay newline-delimited.
+        """
+        if isinstance(record, dict):
+            record = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        data = record.encode("utf-8") if isinstance(record, str) else record
+        if len(data) > MAX_RECORD_BYTES:
+            raise ValueError(f"Record of {len(data)} bytes exceeds the Firehose limit of {MAX_RECORD_BYTES} bytes.")
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("FirehoseProducer is closed.")
+            if not self._condition.wait_for(lambda: len(self._buffer) < self.max_buffered_records, timeout):
+                raise TimeoutError("Firehose buffer is full.")
+            self._buffer.append((data, time.monotonic()))
+            self._buffered_bytes += len(data)
+            self._stats["records_put"] += 1
+            if len(self._buffer) >= MAX_BATCH_RECORDS or self._buffered_bytes >= MAX_BATCH_BYTES:
+                self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> None:
+        """
+        Blocks until every record queued so far has been sent (or given up on).
+        """
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: not self._buffer and not self._sending, timeout)
+            self._flush_requested = False
+
+    def close(self, timeout: float | None = 30) -> None:
+        """
+        Flushes the remaining records and stops the background thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        """
+        Returns throughput and latency counters.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["buffered_records"] = len(self._buffer)
+        elapsed = time.monotonic() - self._started_at
+        stats["records_per_second"] = round(stats["records_sent"] / elapsed, 3) if elapsed else 0.0
+        stats["batch_latency_avg_s"] = round(stats["batch_latency_total_s"] / stats["batches_sent"], 4) if stats["batches_sent"] else 0.0
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+    # --- Background Flushing ---
+
+    def _batch_ready(self) -> bool:
+        if not self._buffer:
+            return False
+        if self._closed or self._flush_requested or len(self._buffer) >= MAX_BATCH_RECORDS or self._buffered_bytes >= MAX_BATCH_BYTES:
+            return True
+        return time.monotonic() - self._buffer[0][1] >= self.flush_interval
+
+    def _take_batch(self) -> list[tuple[bytes, float]]:
+        batch, size = [], 0
+        while self._buffer and len(batch) < MAX_BATCH_RECORDS and size + len(self._buffer[0][0]) <= MAX_BATCH_BYTES:
+            data, queued_at = self._buffer.popleft()
+            batch.append((data, queued_at))
+            size += len(data)
+        self._buffered_bytes -= size
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._batch_ready():
+                    if self._closed and not self._buffer:
+                        self._condition.notify_all()
+                        return
+                    wait_for = self.flush_interval
+                    if self._buffer:
+                        wait_for = max(self.flush_interval - (time.monotonic() - self._buffer[0][1]), 0)
+                    self._condition.wait(wait_for)
+                batch = self._take_batch()
+                self._sending = True
+                self._condition.notify_all() # Wake producers blocked on a full buffer
+
+            try:
+                self._send(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error while sending a Firehose batch: {e}")
+                with self._condition:
+                    self._stats["records_failed"] += len(batch)
+            finally:
+                with self._condition:
+                    self._sending = False
+                    self._condition.notify_all()
+
+    def _send(self, batch: list[tuple[bytes, float]]) -> None:
+        pending = batch
+        attempt = 0
+        started = time.monotonic()
+
+        while pending:
+            try:
+                response = self.firehose_client.put_record_batch(
+                    DeliveryStreamName=self.stream_name,
+                    Records=[{"Data": data} for data, _ in pending],
+                )
+                results = response.get("RequestResponses", [])
+                if not response.get("FailedPutCount", 0):
+                    delivered, failed = pending, []
+                elif len(results) == len(pending):
+                    delivered = [item for item, result in zip(pending, results) if not result.get("ErrorCode")]
+                    failed = [item for item, result in zip(pending, results) if result.get("ErrorCode")]
+                else:
+                    delivered, failed = [], pending # No per-record detail: retry the whole batch
+            except Exception as e:
+                logger.warning(f"put_record_batch call failed: {e}")
+                delivered, failed = [], pending
+
+            self._record_delivery(delivered)
+
+            if not failed:
+                break
+            if attempt >= self.max_retries:
+                logger.error(f"Giving up on {len(failed)} Firehose record(s) after {attempt} retries.")
+                with self._condition:
+                    self._stats["records_failed"] += len(failed)
+                break
+
+            attempt += 1
+            with self._condition:
+                self._stats["retries"] += 1
+            time.sleep(FIREHOSE_RETRY_BACKOFF * 2 ** (attempt - 1))
+            pending = failed
+
+        latency = time.monotonic() - started
+        with self._condition:
+            self._stats["batches_sent"] += 1
+            self._stats["batch_latency_total_s"] += latency
+            self._stats["batch_latency_max_s"] = max(self._stats["batch_latency_max_s"], latency)
+
+    def _record_delivery(self, delivered: list[tuple[bytes, float]]) -> None:
+        if not delivered:
+            return
+        now = time.monotonic()
+        with self._condition:
+            self._stats["records_sent"] += len(delivered)
+            self._stats["bytes_sent"] += sum(len(data) for data, _ in delivered)
+            self._stats["record_latency_max_s"] = max(
+                self._stats["record_latency_max_s"], max(now - queued_at for _, queued_at in delivered)
+            )
@@ -1,38 +1,29 @@
 import requests
 import os
 from datetime import datetime
-from bs4 import BeautifulSoup
-import boto3
-import json
 import time
 import logging
 
+from src.aws_clients import get_client
+from src.firehose_producer import FirehoseProducer
+from src.price_cache import PriceCache
+
 
 # CODIGO CRIADO PARA CONSEGUIR DADOS DE CRIPTO E ENVIAR PARA O FIREHOSE
 # O SCRAPE GOOGLE NAO ESTA FUNCIONANDO, PRECISA MUDAR O "FIND" DO BS4
 
 
-firehoseClient = boto3.client('firehose',
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
-                region_name='us-east-1',
-)
-
 coin = "bitcoin"
 
-def get_cripto_price(coin):
-    url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=brl"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-        return data[coin]["brl"]
-    else:
-        logging.error(f"Erro ao obter preço do {coin}: {response.status_code}")
-        return None
+# Sessao HTTP reaproveitada entre as chamadas (mantem a conexao aberta)
+session = requests.Session()
+
+# Cache na frente da API: evita reenviar ticks repetidos (mesmo last_updated_at) e respeita ETag/Cache-Control
+price_cache = PriceCache(session)
 
 def scrape_cripto_price(coin):
+    from bs4 import BeautifulSoup # Só este scraper usa o bs4; importado aqui para não pesar no início do script
+
     url = 'https://www.google.com/search?q=' + coin + 'price'
     response = requests.get(url)
     soup = BeautifulSoup(response.text, 'html.parser')
@@ -41,18 +32,38 @@ def scrape_cripto_price(coin):
     return texti
 
 
-while True:
-    now = datetime.now()
-    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
-    price = scrape_cripto_price(coin)
-    print(f"{timestamp} - Preço do {coin}: R$ {price}")
-    # send_to_firehose = firehoseClient.put_record(
-    #     DeliveryStreamName=f'ingest_{coin}_stream',
-    #     Record={
-    #         'Data': json.dumps({
-    #             'timestamp': timestamp,
-    #             'price': price
-    #         })
-    #     }
-    # )
-    time.sleep(1)
\ No newline at end of file
+def main():
+    # Cliente criado só quando a ingestão começa, não ao importar o módulo
+    producer = FirehoseProducer(get_client('firehose', 'us-east-1'), f'ingest_{coin}_stream')
+    ultimo_log = time.monotonic()
+    try:
+        while True:
+            now = datetime.now()
+            timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+            cotacao = price_cache.get(coin)
+            print(f"{timestamp} - Preço do {coin}: R$ {cotacao.price} ({cotacao.status})")
+            if cotacao.emit:
+                # Os registros sao agrupados e enviados em lote pelo produtor, sem travar o loop
+                producer.put({
+                    'timestamp': timestamp,
+                    'coin': coin,
+                    'currency': 'brl',
+                    'price': cotacao.price,
+                    'last_updated_at': cotacao.last_updated_at,
+                    'heartbeat': cotacao.heartbeat
+                })
+            if time.monotonic() - ultimo_log >= 60:
+                logging.info(f"Firehose: {producer.stats()}")
+                logging.info(f"Cache: {price_cache.stats} (hit ratio {price_cache.hit_ratio():.0%})")
+                ultimo_log = time.monotonic()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("Encerrando a ingestão...")
+    finally:
+        producer.close()
+        logging.info(f"Firehose: {producer.stats()}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
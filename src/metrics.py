@@ -0,0 +1,199 @@
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+try:
+    import resource # Unix only; peak RSS is reported as None elsewhere
+except ImportError:
+    resource = None
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+METRICS_SINKS = os.getenv("METRICS_SINKS", "log") # Comma-separated: log, emf, file
+METRICS_FILE = os.getenv("METRICS_FILE", "metrics/stages.jsonl")
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "B3ETL")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+RUN_ID = uuid.uuid4().hex[:12] # Groups the stages of one process run
+
+# --- Records ---
+
+@dataclass
+class StageMetrics:
+    """
+    Measurements of one pipeline stage. `rows` and `bytes` are filled in by the instrumented code.
+    """
+    stage: str
+    run_id: str = RUN_ID
+    status: str = "ok"
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    peak_rss_mb: float | None = None
+    rows: int | None = None
+    bytes: int | None = None
+    error: str | None = None
+    dimensions: dict[str, str] = field(default_factory=dict)
+    timestamp: str = ""
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 2) # bytes on macOS, KiB on Linux
+
+# --- Sinks ---
+
+class LogSink:
+    """
+    One structured JSON log line per stage.
+    """
+
+    def emit(self, metrics: StageMetrics) -> None:
+        logger.info(json.dumps({"metric": "stage", **asdict(metrics)}, ensure_ascii=False))
+
+class EmfSink:
+    """
+    CloudWatch Embedded Metric Format on stdout: Lambda (and the CloudWatch agent) turn these lines into metrics
+    without any PutMetricData call.
+    """
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, stream=None):
+        self.namespace = namespace
+        self.stream = stream or sys.stdout
+
+    def emit(self, metrics: StageMetrics) -> None:
+        values = {"WallTime": metrics.wall_ms, "CpuTime": metrics.cpu_ms, "PeakRss": metrics.peak_rss_mb,
+                  "Rows": metrics.rows, "Bytes": metrics.bytes}
+        units = {"WallTime": "Milliseconds", "CpuTime": "Milliseconds", "PeakRss": "Megabytes",
+                 "Rows": "Count", "Bytes": "Bytes"}
+        present = {name: value for name, value in values.items() if value is not None}
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [["Stage", *metrics.dimensions]],
+                    "Metrics": [{"Name": name, "Unit": units[name]} for name in present],
+                }],
+            },
+            "Stage": metrics.stage,
+            "RunId": metrics.run_id,
+            "Status": metrics.status,
+            **metrics.dimensions,
+            **present,
+        }
+        print(json.dumps(document, ensure_ascii=False), file=self.stream, flush=True)
+
+class FileSink:
+    """
+    Appends one JSON line per stage to a local file (used by tests and benchmarks).
+    """
+
+    def __init__(self, path: str = METRICS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, metrics: StageMetrics) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(asdict(metrics), ensure_ascii=False) + "\n")
+
+SINK_FACTORIES = {"log": LogSink, "emf": EmfSink, "file": FileSink}
+
+def build_sinks(spec: str = METRICS_SINKS) -> list:
+    return [SINK_FACTORIES[name.strip()]() for name in spec.split(",") if name.strip()]
+
+_sinks = build_sinks()
+
+def configure(sinks: list) -> None:
+    """
+    Replaces the active sinks, e.g. configure([FileSink("/tmp/metrics.jsonl")]) in a test.
+    """
+    global _sinks
+    _sinks = list(sinks)
+
+# --- Instrumentation ---
+
+@contextlib.contextmanager
+def stage(name: str, **dimensions: str):
+    """
+    Measures a block and emits its StageMetrics to every sink, also when the block raises.
+
+        with stage("transform") as metrics:
+            df = transform_b3_data(raw_df)
+            metrics.rows = len(df)
+    """
+    metrics = StageMetrics(stage=name, dimensions={key: str(value) for key, value in dimensions.items()})
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics.status = "error"
+        metrics.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        metrics.wall_ms = round((time.perf_counter() - wall_start) * 1000, 3)
+        metrics.cpu_ms = round((time.process_time() - cpu_start) * 1000, 3)
+        metrics.peak_rss_mb = _peak_rss_mb()
+        metrics.timestamp = datetime.now().isoformat(timespec="milliseconds")
+        for sink in _sinks:
+            try:
+                sink.emit(metrics)
+            except Exception as e:
+                logger.warning(f"Metrics sink {type(sink).__name__} failed: {e}")
+
+def timed(name: str | None = None, **dimensions: str):
+    """
+    Decorator version of stage(). Rows are taken from the return value when it has a length.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name or function.__name__, **dimensions) as metrics:
+                result = function(*args, **kwargs)
+                if hasattr(result, "__len__") and not isinstance(result, (str, bytes)):
+                    metrics.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+
+# --- Profiling ---
+
+@contextlib.contextmanager
+def profiled(enabled: bool, name: str = "etl", output_dir: str = PROFILE_DIR, top: int = 40):
+    """
+    Runs the block under cProfile when `enabled` and writes <output_dir>/<name>-<run_id>.prof (for snakeviz or
+    pstats) plus a .txt report of the `top` functions by cumulative time.
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, f"{name}-{RUN_ID}")
+        profiler.dump_stats(f"{base}.prof")
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+        with open(f"{base}.txt", "w", encoding="utf-8") as file:
+            file.write(report.getvalue())
+        logger.info(f"Profile written to '{base}.prof' and '{base}.txt'.")
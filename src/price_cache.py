@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_SIMPLE_PRICE_URL = os.getenv("COINGECKO_SIMPLE_PRICE_URL", "https://api.coingecko.com/api/v3/simple/price")
+PRICE_HEARTBEAT_INTERVAL = float(os.getenv("PRICE_HEARTBEAT_INTERVAL", 60)) # Seconds between heartbeats for unchanged prices; 0 disables them
+PRICE_HTTP_TIMEOUT = float(os.getenv("PRICE_HTTP_TIMEOUT", 10))
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+# --- Cache ---
+
+@dataclass
+class PriceLookup:
+    """
+    Result of a cached price lookup.
+
+    status is 'new' (price or last_updated_at changed), 'duplicate' (fetched again, same tick),
+    'not_modified' (server answered 304), 'cached' (still fresh by Cache-Control, no request sent) or
+    'error' (request failed; price is the last cached one, if any, and is never emitted).
+    emit says whether the caller should ship the tick, and heartbeat marks a periodic re-emit of an unchanged one.
+    """
+    coin: str
+    currency: str
+    price: float | None
+    last_updated_at: int | None
+    status: str
+    emit: bool
+    heartbeat: bool = False
+
+@dataclass
+class _Entry:
+    price: float
+    last_updated_at: int | None
+    etag: str | None = None
+    fresh_until: float = 0.0
+    last_emitted: float = 0.0
+
+class PriceCache:
+    """
+    Remembers the last payload per (coin, currency) in front of the CoinGecko simple/price endpoint.
+
+    Sends If-None-Match when the server provided an ETag, skips the request entirely while the
+    Cache-Control max-age is still valid, and suppresses ticks whose last_updated_at and price did
+    not change, emitting a heartbeat every `heartbeat_interval` seconds instead.
+    """
+
+    def __init__(self, session: requests.Session | None = None, heartbeat_interval: float = PRICE_HEARTBEAT_INTERVAL,
+                 url: str = COINGECKO_SIMPLE_PRICE_URL):
+        self.session = session or requests.Session()
+        self.heartbeat_interval = heartbeat_interval
+        self.url = url
+        self._entries: dict[tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "not_modified": 0, "duplicates": 0, "heartbeats": 0, "emitted": 0,
+                      "errors": 0}
+
+    def get(self, coin: str, currency: str = "brl") -> PriceLookup:
+        key = (coin, currency)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and now < entry.fresh_until:
+            self._count("hits")
+            return self._finish(key, entry, "cached", now)
+
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+        self._count("requests")
+        try:
+            response = self.session.get(
+                self.url,
+                params={"ids": coin, "vs_currencies": currency, "include_last_updated_at": "true"},
+                headers=headers,
+                timeout=PRICE_HTTP_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            logger.error(f"Erro ao obter preço do {coin}: {e}")
+            return self._error(coin, currency, entry)
+        fresh_until = now + self._max_age(response)
+
+        if response.status_code == 304 and entry is not None:
+            self._count("hits")
+            self._count("not_modified")
+            entry.fresh_until = fresh_until
+            return self._finish(key, entry, "not_modified", now)
+
+        if response.status_code != 200:
+            logger.error(f"Erro ao obter preço do {coin}: {response.status_code}")
+            return self._error(coin, currency, entry)
+
+        try:
+            values = response.json().get(coin, {})
+        except ValueError as e:
+            logger.error(f"Resposta inválida para o preço do {coin}: {e}")
+            return self._error(coin, currency, entry)
+        price, last_updated_at = values.get(currency), values.get("last_updated_at")
+        if price is None:
+            return self._error(coin, currency, entry)
+
+        if entry is not None and entry.price == price and entry.last_updated_at == last_updated_at:
+            self._count("hits")
+            self._count("duplicates")
+            entry.etag = response.headers.get("ETag") or entry.etag
+            entry.fresh_until = fresh_until
+            return self._finish(key, entry, "duplicate", now)
+
+        self._count("misses")
+        new_entry = _Entry(float(price), last_updated_at, response.headers.get("ETag"), fresh_until)
+        with self._lock:
+            self._entries[key] = new_entry
+        return self._finish(key, new_entry, "new", now)
+
+    def _finish(self, key: tuple[str, str], entry: _Entry, status: str, now: float) -> PriceLookup:
+        emit = status == "new"
+        heartbeat = False
+        if not emit and self.heartbeat_interval and now - entry.last_emitted >= self.heartbeat_interval:
+            emit = heartbeat = True
+            self._count("heartbeats")
+        if emit:
+            entry.last_emitted = now
+            self._count("emitted")
+        return PriceLookup(key[0], key[1], entry.price, entry.last_updated_at, status, emit, heartbeat)
+
+    def _error(self, coin: str, currency: str, entry: _Entry | None) -> PriceLookup:
+        """
+        Failed lookup: keeps serving the last cached price (if any) without emitting it again.
+        """
+        self._count("errors")
+        if entry is None:
+            return PriceLookup(coin, currency, None, None, "error", emit=False)
+        return PriceLookup(coin, currency, entry.price, entry.last_updated_at, "error", emit=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _max_age(response: requests.Response) -> float:
+        cache_control = response.headers.get("Cache-Control", "")
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            return 0.0
+        match = _MAX_AGE.search(cache_control)
+        return float(match.group(1)) if match else 0.0
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
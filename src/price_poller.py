@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Protocol
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.storage import SQLITE_DB_PATH, connect, insert_crypto_prices
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+PRICE_COINS = os.getenv("PRICE_COINS", "bitcoin,ethereum,solana")
+PRICE_CURRENCIES = os.getenv("PRICE_CURRENCIES", "brl,usd")
+PRICE_POLL_INTERVAL = float(os.getenv("PRICE_POLL_INTERVAL", 10)) # Seconds between polls when not rate limited
+PRICE_MAX_INTERVAL = float(os.getenv("PRICE_MAX_INTERVAL", 300))
+PRICE_IDS_PER_REQUEST = int(os.getenv("PRICE_IDS_PER_REQUEST", 100)) # Keeps the query string well under URL limits
+PRICE_HTTP_TIMEOUT = float(os.getenv("PRICE_HTTP_TIMEOUT", 10))
+PRICE_MAX_CONCURRENT_REQUESTS = int(os.getenv("PRICE_MAX_CONCURRENT_REQUESTS", 4))
+
+# --- Records ---
+
+@dataclass(frozen=True)
+class PriceTick:
+    """
+    One price observation for a coin in a currency.
+    """
+    coin: str
+    currency: str
+    price: float
+    last_updated_at: int | None # Epoch seconds reported by CoinGecko
+    fetched_at: datetime
+
+def parse_price_payload(payload: dict, currencies: list[str], fetched_at: datetime) -> list[PriceTick]:
+    """
+    Turns a simple/price response ({'bitcoin': {'brl': 1.0, 'last_updated_at': 1}}) into ticks.
+    """
+    ticks = []
+    for coin, values in payload.items():
+        last_updated_at = values.get("last_updated_at")
+        for currency in currencies:
+            price = values.get(currency)
+            if price is not None:
+                ticks.append(PriceTick(coin, currency, float(price), last_updated_at, fetched_at))
+    return ticks
+
+def chunk_ids(coins: list[str], size: int = PRICE_IDS_PER_REQUEST) -> list[list[str]]:
+    """
+    Splits the coin ids into as few simple/price requests as the API allows.
+    """
+    return [coins[start:start + size] for start in range(0, len(coins), size)]
+
+# --- Sinks ---
+
+class PriceSink(Protocol):
+    """
+    Destination for polled ticks. write() is called from a worker thread, never from the event loop.
+    """
+
+    def write(self, ticks: list[PriceTick]) -> None: ...
+
+    def close(self) -> None: ...
+
+class SQLiteSink:
+    """
+    Appends ticks to the precos_cripto table (see storage.MIGRATIONS) in one transaction per poll.
+    """
+
+    def __init__(self, db_path: str = SQLITE_DB_PATH):
+        self.conn = connect(db_path) # WAL: dashboards can read while the poller writes
+
+    def write(self, ticks: list[PriceTick]) -> None:
+        insert_crypto_prices(self.conn, [(t.coin, t.currency, t.price, t.last_updated_at, t.fetched_at) for t in ticks])
+
+    def close(self) -> None:
+        self.conn.close()
+
+class ParquetSink:
+    """
+    Writes each poll as a part file inside the day partition: <root>/ano=/mes=/dia=/part-<epoch ms>.parquet.
+    """
+
+    def __init__(self, root: str = "parquet_arq/precos_cripto"):
+        self.root = root
+
+    def write(self, ticks: list[PriceTick]) -> None:
+        fetched_at = ticks[0].fetched_at
+        directory = os.path.join(self.root, f"ano={fetched_at.year}", f"mes={fetched_at.month:02d}", f"dia={fetched_at.day:02d}")
+        os.makedirs(directory, exist_ok=True)
+        pd.DataFrame([asdict(tick) for tick in ticks]).to_parquet(
+            os.path.join(directory, f"part-{int(fetched_at.timestamp() * 1000)}.parquet"), index=False
+        )
+
+    def close(self) -> None:
+        pass
+
+def firehose_record(tick: PriceTick) -> dict:
+    """
+    Serializes a tick for the delivery stream. 'timestamp' ('YYYY-MM-DD HH:MM:SS', UTC) is the field the stream's
+    JQ partition key (.timestamp[0:10]) and Glue schema expect, the same one src/ingest_strem_btc.py sends.
+    """
+    record = asdict(tick)
+    record["fetched_at"] = tick.fetched_at.isoformat()
+    record["timestamp"] = tick.fetched_at.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+class FirehoseSink:
+    """
+    Forwards ticks to a FirehoseProducer, which batches them in the background.
+    """
+
+    def __init__(self, producer):
+        self.producer = producer
+
+    def write(self, ticks: list[PriceTick]) -> None:
+        for tick in ticks:
+            self.producer.put(firehose_record(tick))
+
+    def close(self) -> None:
+        self.producer.close()
+
+# --- Poller ---
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float | None):
+        super().__init__(f"Rate limited (Retry-After: {retry_after})")
+        self.retry_after = retry_after
+
+class PricePoller:
+    """
+    Polls CoinGecko's simple/price for a basket of coins and currencies.
+
+    Ids are batched into as few requests as possible, requests share one pooled HTTP session and run
+    concurrently, and the polling interval backs off on HTTP 429 (honouring Retry-After) and recovers
+    gradually after successful polls.
+    """
+
+    def __init__(self, coins: list[str], currencies: list[str], sinks: list[PriceSink],
+                 interval: float = PRICE_POLL_INTERVAL, max_interval: float = PRICE_MAX_INTERVAL,
+                 session: requests.Session | None = None, base_url: str = COINGECKO_API_URL):
+        self.coins = coins
+        self.currencies = currencies
+        self.sinks = sinks
+        self.base_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self.base_url = base_url.rstrip("/")
+        self.session = session or self._build_session()
+        self.stats = {"polls": 0, "requests": 0, "ticks": 0, "rate_limited": 0, "errors": 0}
+        self._semaphore = asyncio.Semaphore(PRICE_MAX_CONCURRENT_REQUESTS)
+
+    @staticmethod
+    def _build_session() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PRICE_MAX_CONCURRENT_REQUESTS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept": "application/json"})
+        return session
+
+    def _get(self, ids: list[str]) -> dict:
+        response = self.session.get(
+            f"{self.base_url}/simple/price",
+            params={"ids": ",".join(ids), "vs_currencies": ",".join(self.currencies), "include_last_updated_at": "true"},
+            timeout=PRICE_HTTP_TIMEOUT,
+        )
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise RateLimited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch(self, ids: list[str]) -> dict:
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            return await asyncio.to_thread(self._get, ids)
+
+    async def poll_once(self) -> list[PriceTick]:
+        """
+        Fetches every coin once, pushes the ticks to the sinks and adapts the interval.
+        """
+        fetched_at = datetime.now(timezone.utc)
+        results = await asyncio.gather(*(self._fetch(ids) for ids in chunk_ids(self.coins)), return_exceptions=True)
+        self.stats["polls"] += 1
+
+        ticks, rate_limits = [], []
+        for result in results:
+            if isinstance(result, RateLimited):
+                rate_limits.append(result)
+            elif isinstance(result, Exception):
+                self.stats["errors"] += 1
+                logger.warning(f"Price request failed: {result}")
+            else:
+                ticks.extend(parse_price_payload(result, self.currencies, fetched_at))
+
+        if rate_limits:
+            self.stats["rate_limited"] += 1
+            retry_after = max((limit.retry_after or 0) for limit in rate_limits)
+            self.interval = min(max(self.interval * 2, retry_after), self.max_interval)
+            logger.warning(f"Rate limited by CoinGecko. Polling every {self.interval:.1f}s.")
+        elif self.interval > self.base_interval:
+            self.interval = max(self.interval * 0.8, self.base_interval)
+
+        if ticks:
+            self.stats["ticks"] += len(ticks)
+            await asyncio.gather(*(asyncio.to_thread(sink.write, ticks) for sink in self.sinks))
+        return ticks
+
+    async def run(self, iterations: int | None = None) -> None:
+        """
+        Polls until cancelled (or `iterations` polls), keeping a steady cadence regardless of request latency.
+        """
+        count = 0
+        try:
+            while iterations is None or count < iterations:
+                started = time.monotonic()
+                await self.poll_once()
+                count += 1
+                if iterations is None or count < iterations:
+                    await asyncio.sleep(max(self.interval - (time.monotonic() - started), 0))
+        finally:
+            for sink in self.sinks:
+                sink.close()
+            self.session.close()
+
+# --- Main Execution Flow ---
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    coins = [coin.strip() for coin in PRICE_COINS.split(",") if coin.strip()]
+    currencies = [currency.strip() for currency in PRICE_CURRENCIES.split(",") if currency.strip()]
+    poller = PricePoller(coins, currencies, sinks=[SQLiteSink(), ParquetSink()])
+    logger.info(f"Polling {len(coins)} coin(s) in {len(currencies)} currency(ies) every {poller.interval}s.")
+    try:
+        asyncio.run(poller.run())
+    except KeyboardInterrupt:
+        logger.info(f"Poller stopped. Stats: {poller.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from src.dataset import PREGAO_RAW_ROOT, date_range, day_sources, load_manifest, read_pregao_table, resolve_root
+from src.refine_job import REFINE_OUTPUT_ROOT, TOTAL_COLUMN
+from src.storage import SQLITE_DB_PATH
+
+# Ad-hoc SQL over the raw and refined Parquet trees and the local SQLite tables, without Athena or Glue
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+QUERY_RAW_ROOT = os.getenv("QUERY_RAW_ROOT", PREGAO_RAW_ROOT)
+QUERY_REFINED_ROOT = os.getenv("QUERY_REFINED_ROOT", REFINE_OUTPUT_ROOT)
+QUERY_SQLITE_PATH = os.getenv("QUERY_SQLITE_PATH", SQLITE_DB_PATH)
+QUERY_DEFAULT_DAYS = int(os.getenv("QUERY_DEFAULT_DAYS", 30)) # Days of raw data exposed when no --start is given
+QUERY_CACHE_ENTRIES = int(os.getenv("QUERY_CACHE_ENTRIES", 64))
+QUERY_CACHE_MB = float(os.getenv("QUERY_CACHE_MB", 256))
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR", "") # Optional on-disk tier shared by CLI runs, e.g. .query_cache
+
+RAW_VIEW = "raw_pregao"
+REFINED_VIEW = "refined"
+SQLITE_SCHEMA = "local"
+
+# --- Result Cache ---
+
+class ResultCache:
+    """
+    LRU of query results, bounded by entry count and by memory. With `directory`, results are also kept as
+    <key>.parquet files (evicted oldest-used first), so separate CLI runs share them.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_ENTRIES, max_mb: float = QUERY_CACHE_MB,
+                 directory: str | None = QUERY_CACHE_DIR or None):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 2**20)
+        self.directory = directory
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._entries: OrderedDict[str, tuple[pd.DataFrame, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0].copy()
+        if self.directory and os.path.exists(self._path(key)):
+            result = pd.read_parquet(self._path(key))
+            os.utime(self._path(key)) # Marks it as recently used for the disk eviction
+            self.stats["disk_hits"] += 1
+            self._remember(key, result)
+            return result.copy()
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result: pd.DataFrame) -> None:
+        self._remember(key, result)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{self._path(key)}.tmp"
+            result.to_parquet(temporary, index=False)
+            os.replace(temporary, self._path(key))
+            self._evict_disk()
+
+    def _remember(self, key: str, result: pd.DataFrame) -> None:
+        size = int(result.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return # Larger than the whole cache: recomputing is the only option
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats["evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".parquet")]
+        for path in sorted(files, key=os.path.getmtime)[:max(len(files) - self.max_entries, 0)]:
+            os.remove(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+# --- SQL Helpers ---
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+COUNT_STAR_PATTERN = re.compile(r"count\s*\(\s*\*\s*\)", re.IGNORECASE)
+
+def referenced_names(sql: str) -> set[str]:
+    return {name.lower() for name in IDENTIFIER_PATTERN.findall(sql)}
+
+def projected_columns(sql: str, available: list[str]) -> list[str] | None:
+    """
+    Columns of a Parquet view that the query can touch: every available column named in the SQL, or None
+    (all of them) when the query selects '*'. Over-selecting is harmless; it only costs reading time.
+    """
+    if "*" in COUNT_STAR_PATTERN.sub("", sql):
+        return None
+    names = referenced_names(sql)
+    return [column for column in available if column.lower() in names]
+
+SELECT_PATTERN = re.compile(r"\bselect\b", re.IGNORECASE)
+STRING_LITERAL_PATTERN = re.compile(r"'[^']*'")
+WHERE_PATTERN = re.compile(r"\bwhere\b(.*?)(?:\bgroup\s+by\b|\border\s+by\b|\blimit\b|$)", re.IGNORECASE | re.DOTALL)
+UNSAFE_WHERE_PATTERN = re.compile(r"\b(?:or|not|join|union|except|intersect)\b|\(", re.IGNORECASE)
+IN_LIST_PATTERN = re.compile(r"\bin\s*\(\s*''(?:\s*,\s*'')*\s*\)", re.IGNORECASE)
+ISO_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+CONJUNCT_PATTERN = re.compile(
+    r"(?:^|\band\b)\s*(?:\w+\.)?(?P<column>\w+)\s*(?:"
+    r"(?P<op><=|>=|<>|!=|=|<|>)\s*'(?P<value>[^']*)'"
+    r"|\bin\s*\((?P<values>\s*'[^']*'(?:\s*,\s*'[^']*')*\s*)\)"
+    r"|\bbetween\s*'(?P<low>[^']*)'\s*and\s*'(?P<high>[^']*)')"
+    r"\s*(?=\band\b|$)", re.IGNORECASE | re.DOTALL)
+
+def pushdown_predicates(sql: str, view: str) -> list[tuple[str, str, list[str]]]:
+    """
+    Top-level WHERE conjuncts of a single-SELECT query over `view` that compare a column with string
+    literals: (column, op, values), with op one of =, <, <=, >, >=, in, between. They are implied by the
+    query, so filtering the loaded rows by them does not change the result; SQLite still evaluates the
+    whole WHERE. Anything that could make a conjunct conditional (OR, NOT, parentheses, joins, subqueries)
+    disables the pushdown.
+    """
+    sql = sql.strip().rstrip(";")
+    # Keywords inside string literals do not count: match on a copy with the literals blanked (same offsets)
+    masked = STRING_LITERAL_PATTERN.sub(lambda literal: "'" + "_" * (len(literal.group()) - 2) + "'", sql)
+    single_table = rf"\bfrom\s+{view}(?:\s+(?:as\s+)?(?!where\b|group\b|order\b|limit\b)\w+)?\s*(?:\b(?:where|group|order|limit)\b|$)"
+    if len(SELECT_PATTERN.findall(masked)) != 1 or not re.search(single_table, masked, re.IGNORECASE):
+        return []
+    match = WHERE_PATTERN.search(masked)
+    if match is None:
+        return []
+    where = sql[match.start(1):match.end(1)].strip()
+    if UNSAFE_WHERE_PATTERN.search(IN_LIST_PATTERN.sub("", STRING_LITERAL_PATTERN.sub("''", where))):
+        return []
+    predicates = []
+    for conjunct in CONJUNCT_PATTERN.finditer(where):
+        column = conjunct.group("column").lower()
+        if conjunct.group("values") is not None:
+            predicates.append((column, "in", re.findall(r"'([^']*)'", conjunct.group("values"))))
+        elif conjunct.group("low") is not None:
+            predicates.append((column, "between", [conjunct.group("low"), conjunct.group("high")]))
+        elif conjunct.group("op") in ("<>", "!="):
+            continue
+        else:
+            predicates.append((column, conjunct.group("op"), [conjunct.group("value")]))
+    return predicates
+
+def raw_pushdown(sql: str, start: date, end: date) -> tuple[date, date, list[str] | None]:
+    """
+    Narrows the raw read from the query itself: `data` comparisons with ISO dates shrink [start, end] (only
+    those partitions are listed and read) and `cod` equalities become the `codes` filter of read_pregao_table.
+    """
+    codes = None
+    for column, op, values in pushdown_predicates(sql, RAW_VIEW):
+        if column == "cod" and op in ("=", "in"):
+            codes = sorted(set(values) if codes is None else set(codes) & set(values))
+        elif column == "data":
+            if not all(ISO_DATE_PATTERN.fullmatch(value) for value in values):
+                continue # Not a plain YYYY-MM-DD literal: its text comparison does not follow date order
+            try:
+                days = [date.fromisoformat(value) for value in values]
+            except ValueError:
+                continue
+            if op in ("=", ">=", "between"):
+                start = max(start, days[0])
+            if op in ("=", "<=", "between"):
+                end = min(end, days[-1])
+            if op == ">":
+                start = max(start, days[0] + timedelta(days=1))
+            if op == "<":
+                end = min(end, days[0] - timedelta(days=1))
+    return start, end, codes
+
+def refined_pushdown(sql: str) -> ds.Expression | None:
+    """
+    Equalities on the refined partition columns (acao, created_at) and on cod, as a dataset filter.
+    """
+    expression = None
+    for column, op, values in pushdown_predicates(sql, REFINED_VIEW):
+        if column not in ("acao", "created_at", "cod") or op not in ("=", "in"):
+            continue
+        condition = ds.field(column).isin(values)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def _arrow_to_sqlite_frame(table: pa.Table) -> pd.DataFrame:
+    """
+    SQLite has no date type: dates and timestamps become ISO strings, which compare and sort correctly.
+    """
+    for index, column in enumerate(table.schema):
+        if pa.types.is_date(column.type):
+            table = table.set_column(index, column.name, table.column(index).cast(pa.string()))
+        elif pa.types.is_timestamp(column.type):
+            table = table.set_column(index, column.name, pc.strftime(table.column(index), "%Y-%m-%d %H:%M:%S"))
+    return table.to_pandas()
+
+def _file_stamp(info: pafs.FileInfo) -> str:
+    mtime = info.mtime_ns if info.mtime_ns is not None else 0
+    return f"{info.path}|{info.size}|{mtime}"
+
+# --- Query Engine ---
+
+class QueryEngine:
+    """
+    Runs SQLite SQL over three sources, loaded per query and only when the SQL names them:
+    - raw_pregao: the raw B3 days between `start` and `end` (partitions addressed from the dates, only the
+      referenced columns read, compacted months honoured), with a `data` column;
+    - refined: the refined top-N tree, with its acao/created_at partitions as columns (created_at filtered
+      to the same range);
+    - the tables of the local SQLite database, as local.<table> or by their own name.
+
+    Simple WHERE conjuncts (`cod`/`acao` equalities and IN lists, `data` ranges) are pushed into the Parquet
+    read; the rows that pass are copied into an in-memory SQLite database, which evaluates the full query.
+
+    Results are cached under the SQL text, the range and a fingerprint of the inputs (paths, sizes and
+    modification times), so a repeated query is answered from the cache until new data lands.
+    """
+
+    def __init__(self, raw_root: str = QUERY_RAW_ROOT, refined_root: str = QUERY_REFINED_ROOT,
+                 sqlite_path: str = QUERY_SQLITE_PATH, cache: ResultCache | None = None):
+        self.raw_root = raw_root
+        self.refined_root = refined_root
+        self.sqlite_path = sqlite_path
+        self.cache = cache if cache is not None else ResultCache()
+
+    # --- Inputs & Fingerprint ---
+
+    def _raw_files(self, start: date, end: date) -> list[pafs.FileInfo]:
+        filesystem, path = resolve_root(self.raw_root)
+        manifest = load_manifest(filesystem, path)
+        files = {info.path: info for day in date_range(start, end)
+                 for info in day_sources(filesystem, path, day, manifest)}
+        return list(files.values())
+
+    def _refined_files(self) -> list[pafs.FileInfo]:
+        filesystem, path = resolve_root(self.refined_root)
+        selector = pafs.FileSelector(path, recursive=True, allow_not_found=True)
+        return [info for info in filesystem.get_file_info(selector)
+                if info.type == pafs.FileType.File and info.path.endswith(".parquet")]
+
+    def _sqlite_tables(self) -> list[str]:
+        if not os.path.exists(self.sqlite_path):
+            return []
+        with sqlite3.connect(f"file:{self.sqlite_path}?mode=ro", uri=True) as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+    def fingerprint(self, sql: str, start: date, end: date) -> tuple[str, dict]:
+        """
+        Cache key of a query and the inputs it needs: {"raw": [...], "refined": [...], "sqlite": [...]}.
+        """
+        names = referenced_names(sql)
+        inputs, stamps = {}, [sql.strip(), start.isoformat(), end.isoformat()]
+        if RAW_VIEW in names:
+            raw_start, raw_end, _ = raw_pushdown(sql, start, end)
+            inputs["raw"] = self._raw_files(raw_start, raw_end) if raw_start <= raw_end else []
+            stamps += sorted(map(_file_stamp, inputs["raw"]))
+        if REFINED_VIEW in names:
+            inputs["refined"] = self._refined_files()
+            stamps += sorted(map(_file_stamp, inputs["refined"]))
+        tables = self._sqlite_tables()
+        if SQLITE_SCHEMA in names or names & {table.lower() for table in tables}:
+            inputs["sqlite"] = tables
+            for path in (self.sqlite_path, f"{self.sqlite_path}-wal"): # Committed WAL pages change the data too
+                if os.path.exists(path):
+                    stat = os.stat(path)
+                    stamps.append(f"{path}|{stat.st_size}|{stat.st_mtime_ns}")
+        return hashlib.sha256("\n".join(stamps).encode("utf-8")).hexdigest(), inputs
+
+    # --- Views ---
+
+    def _load_raw(self, conn: sqlite3.Connection, sql: str, start: date, end: date, files: list[pafs.FileInfo]) -> int:
+        if not files:
+            # No partition in the (possibly narrowed) range: same columns as the raw files, so the query still resolves them
+            conn.execute(f"CREATE TEMP TABLE {RAW_VIEW} (cod TEXT, acao TEXT, tipo TEXT, qtde_teorica INTEGER, "
+                         f"part_teorica_porc REAL, data TEXT)")
+            return 0
+        filesystem, _ = resolve_root(self.raw_root)
+        available = [name for name in pq.read_schema(files[0].path, filesystem=filesystem).names if name != "data"]
+        columns = projected_columns(sql, available)
+        start, end, codes = raw_pushdown(sql, start, end)
+        table = read_pregao_table(start, end, codes=codes, columns=columns, root=self.raw_root)
+        _arrow_to_sqlite_frame(table).to_sql(RAW_VIEW, conn, index=False)
+        return table.num_rows
+
+    def _load_refined(self, conn: sqlite3.Connection, sql: str, start: date, end: date,
+                      files: list[pafs.FileInfo]) -> int:
+        if not files:
+            # Missing or empty tree: same columns as src/refine_job.py writes, so the query still resolves them
+            conn.execute(f"CREATE TEMP TABLE {REFINED_VIEW} (cod TEXT, acao TEXT, {TOTAL_COLUMN} INTEGER, created_at TEXT)")
+            return 0
+        filesystem, path = resolve_root(self.refined_root)
+        partitioning = ds.partitioning(pa.schema([("acao", pa.string()), ("created_at", pa.string())]), flavor="hive")
+        dataset = ds.dataset(path, filesystem=filesystem, format="parquet", partitioning=partitioning)
+        created_at = ds.field("created_at")
+        expression = (created_at >= start.isoformat()) & (created_at <= end.isoformat()) # Prunes created_at= dirs
+        pushed = refined_pushdown(sql)
+        table = dataset.to_table(
+            columns=projected_columns(sql, dataset.schema.names),
+            filter=expression if pushed is None else expression & pushed,
+        )
+        _arrow_to_sqlite_frame(table).to_sql(REFINED_VIEW, conn, index=False)
+        return table.num_rows
+
+    def _attach_sqlite(self, conn: sqlite3.Connection, tables: list[str]) -> None:
+        conn.execute(f"ATTACH DATABASE ? AS {SQLITE_SCHEMA}", (f"file:{self.sqlite_path}?mode=ro",))
+        for table in tables:
+            conn.execute(f'CREATE TEMP VIEW "{table}" AS SELECT * FROM {SQLITE_SCHEMA}."{table}"')
+
+    # --- Execution ---
+
+    def query(self, sql: str, start: date | None = None, end: date | None = None, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Runs `sql` and returns the result. Raw and refined data are limited to [start, end]; the default is
+        the last QUERY_DEFAULT_DAYS days up to today.
+        """
+        end = end or date.today()
+        start = start or end - timedelta(days=QUERY_DEFAULT_DAYS - 1)
+        if end < start:
+            raise ValueError(f"End date {end} is before start date {start}.")
+
+        key, inputs = self.fingerprint(sql, start, end)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info(f"Cache hit ({len(cached)} rows).")
+                return cached
+
+        started = time.perf_counter()
+        conn = sqlite3.connect("file::memory:", uri=True)
+        try:
+            loaded = {}
+            if "raw" in inputs:
+                loaded[RAW_VIEW] = self._load_raw(conn, sql, start, end, inputs["raw"])
+            if "refined" in inputs:
+                loaded[REFINED_VIEW] = self._load_refined(conn, sql, start, end, inputs["refined"])
+            if "sqlite" in inputs:
+                self._attach_sqlite(conn, inputs["sqlite"])
+            result = pd.read_sql_query(sql, conn)
+        finally:
+            conn.close()
+
+        logger.info(f"Query ran in {(time.perf_counter() - started) * 1000:.1f} ms "
+                    f"(Parquet rows loaded: {loaded}): {len(result)} row(s).")
+        if use_cache:
+            self.cache.put(key, result)
+        return result
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=f"Runs SQL over the raw ({RAW_VIEW}) and refined ({REFINED_VIEW}) Parquet data and the SQLite tables.")
+    parser.add_argument("sql", nargs="?", help="Query text; read from stdin when omitted.")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day of raw/refined data (YYYY-MM-DD).")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day of raw/refined data (default: today).")
+    parser.add_argument("--raw-root", default=QUERY_RAW_ROOT, help="Local path or s3:// URI of the raw dataset.")
+    parser.add_argument("--refined-root", default=QUERY_REFINED_ROOT, help="Local path or s3:// URI of the refined dataset.")
+    parser.add_argument("--sqlite-path", default=QUERY_SQLITE_PATH)
+    parser.add_argument("--cache-dir", default=QUERY_CACHE_DIR or None, help="Keep results on disk across runs.")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", help="Write the result to a .csv or .parquet file instead of printing it.")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    engine = QueryEngine(args.raw_root, args.refined_root, args.sqlite_path, ResultCache(directory=args.cache_dir))
+    result = engine.query(args.sql or sys.stdin.read(), args.start, args.end, use_cache=not args.no_cache)
+    if args.output and args.output.endswith(".parquet"):
+        result.to_parquet(args.output, index=False)
+    elif args.output:
+        result.to_csv(args.output, index=False)
+    else:
+        print(result.to_string(index=False))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
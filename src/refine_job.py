@@ -0,0 +1,197 @@
+from __future__ import annotations # Glue Python shell runs 3.9: annotations must not be evaluated
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+try:
+    from src.dataset import day_sources, load_manifest, read_day_table, resolve_root
+except ImportError: # Glue Python shell: dataset.py is shipped next to the script through --extra-py-files
+    from dataset import day_sources, load_manifest, read_day_table, resolve_root
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+REFINE_RAW_ROOT = os.getenv("REFINE_RAW_ROOT", "raw/pregao_b3")
+REFINE_OUTPUT_ROOT = os.getenv("REFINE_OUTPUT_ROOT", "refined")
+REFINE_STATE_ROOT = os.getenv("REFINE_STATE_ROOT", "refined_state")
+REFINE_WINDOW_DAYS = int(os.getenv("REFINE_WINDOW_DAYS", 7))
+REFINE_TOP_N = int(os.getenv("REFINE_TOP_N", 5))
+
+RAW_COLUMNS = ["cod", "acao", "qtde_teorica"]
+TOTAL_COLUMN = "total_qtde_teorica_dos_ultimos_7_dias" # Column name kept from the Glue SQL node
+DAILY_SUMS_SCHEMA = pa.schema([("cod", pa.string()), ("acao", pa.string()), ("qtde_teorica", pa.int64())])
+
+# --- Window Helpers ---
+
+def window_dates(run_date: date, window_days: int = REFINE_WINDOW_DAYS) -> list[date]:
+    """
+    Days covered by the window. Mirrors the Glue SQL: BETWEEN DATE_SUB(CURRENT_DATE(), 7) AND CURRENT_DATE().
+    """
+    return [run_date - timedelta(days=offset) for offset in range(window_days, -1, -1)]
+
+def fingerprint(files: list[pafs.FileInfo]) -> str:
+    """
+    Identifies the exact input of a day (paths, sizes, modification times), so unchanged days are not recomputed.
+    """
+    digest = hashlib.sha256()
+    for info in sorted(files, key=lambda item: item.path):
+        mtime = info.mtime_ns if info.mtime_ns is not None else 0
+        digest.update(f"{info.path}|{info.size}|{mtime}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+# --- Incremental Daily Sums ---
+
+def compute_daily_sums(filesystem: pafs.FileSystem, root: str, day: date, manifest: dict) -> pa.Table:
+    """
+    Aggregates qtde_teorica by (cod, acao) for one day, reading only the needed columns.
+    """
+    table = read_day_table(filesystem, root, day, columns=RAW_COLUMNS, manifest=manifest)
+    if table is None or table.num_rows == 0:
+        return DAILY_SUMS_SCHEMA.empty_table()
+    table = table.select(RAW_COLUMNS).cast(DAILY_SUMS_SCHEMA)
+    grouped = table.group_by(["cod", "acao"]).aggregate([("qtde_teorica", "sum")])
+    return grouped.rename_columns(["cod", "acao", "qtde_teorica"]).cast(DAILY_SUMS_SCHEMA)
+
+def load_or_compute_day(raw_fs: pafs.FileSystem, raw_root: str, state_fs: pafs.FileSystem, state_root: str,
+                        day: date, manifest: dict) -> pa.Table:
+    """
+    Returns the per-day partial sums, reusing the stored ones when the day's raw files did not change.
+    """
+    files = day_sources(raw_fs, raw_root, day, manifest)
+    day_fingerprint = fingerprint(files)
+    state_path = f"{state_root}/daily_sums/data={day.isoformat()}.parquet"
+
+    if state_fs.get_file_info(state_path).type == pafs.FileType.File:
+        stored = pq.read_table(state_path, filesystem=state_fs)
+        if (stored.schema.metadata or {}).get(b"fingerprint") == day_fingerprint.encode("utf-8"):
+            return stored.replace_schema_metadata(None)
+
+    daily = compute_daily_sums(raw_fs, raw_root, day, manifest)
+    state_fs.create_dir(f"{state_root}/daily_sums", recursive=True)
+    pq.write_table(daily.replace_schema_metadata({"fingerprint": day_fingerprint}), state_path, filesystem=state_fs)
+    logger.info(f"Computed partial sums for {day} from {len(files)} file(s): {daily.num_rows} row(s).")
+    return daily
+
+def prune_state(state_fs: pafs.FileSystem, state_root: str, oldest_day: date) -> None:
+    """
+    Deletes partial sums that fell out of the window.
+    """
+    selector = pafs.FileSelector(f"{state_root}/daily_sums", allow_not_found=True)
+    for info in state_fs.get_file_info(selector):
+        name = info.base_name
+        if name.startswith("data=") and name.endswith(".parquet") and name[5:15] < oldest_day.isoformat():
+            state_fs.delete_file(info.path)
+
+# --- Top-N Window ---
+
+def top_n_window(daily_tables: list[pa.Table], top_n: int = REFINE_TOP_N) -> pa.Table:
+    """
+    Sums the daily partials over the window and keeps the `top_n` largest totals.
+    """
+    combined = pa.concat_tables(daily_tables) if daily_tables else DAILY_SUMS_SCHEMA.empty_table()
+    totals = combined.group_by(["cod", "acao"]).aggregate([("qtde_teorica", "sum")])
+    totals = totals.rename_columns(["cod", "acao", TOTAL_COLUMN])
+    order = pc.sort_indices(totals, sort_keys=[(TOTAL_COLUMN, "descending"), ("cod", "ascending")])
+    return totals.take(order[:top_n])
+
+def delete_refined_day(output_fs: pafs.FileSystem, output_root: str, run_date: date) -> int:
+    """
+    Deletes every acao=*/created_at=<run_date> slice, so companies that left the top-N are not kept from an
+    earlier run of the same day. Returns the number of slices deleted.
+    """
+    selector = pafs.FileSelector(output_root, allow_not_found=True)
+    deleted = 0
+    for info in output_fs.get_file_info(selector):
+        if info.type != pafs.FileType.Directory or not info.base_name.startswith("acao="):
+            continue
+        day_path = f"{info.path}/created_at={run_date.isoformat()}"
+        if output_fs.get_file_info(day_path).type == pafs.FileType.Directory:
+            output_fs.delete_dir(day_path)
+            deleted += 1
+    return deleted
+
+def write_refined(table: pa.Table, output_fs: pafs.FileSystem, output_root: str, run_date: date) -> None:
+    """
+    Writes the refined layout of the Glue sink: snappy Parquet partitioned by acao and created_at.
+    Re-running a day replaces all of its partitions.
+    """
+    deleted = delete_refined_day(output_fs, output_root, run_date)
+    if deleted:
+        logger.info(f"Deleted {deleted} refined partition(s) of {run_date} before rewriting it.")
+    table = table.append_column("created_at", pa.array([run_date.isoformat()] * table.num_rows, pa.string()))
+    ds.write_dataset(
+        table,
+        output_root,
+        filesystem=output_fs,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("acao", pa.string()), ("created_at", pa.string())]), flavor="hive"),
+        basename_template=f"part-{run_date.isoformat()}-{{i}}.snappy.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="snappy"),
+        existing_data_behavior="overwrite_or_ignore", # The day's slices were deleted above
+    )
+
+# --- Main Execution Flow ---
+
+def run(run_date: date, raw_root: str = REFINE_RAW_ROOT, output_root: str = REFINE_OUTPUT_ROOT,
+        state_root: str = REFINE_STATE_ROOT, window_days: int = REFINE_WINDOW_DAYS, top_n: int = REFINE_TOP_N) -> pa.Table:
+    """
+    Refines the window ending at `run_date` and returns the top-N table that was written.
+    """
+    raw_fs, raw_path = resolve_root(raw_root)
+    state_fs, state_path = resolve_root(state_root)
+    output_fs, output_path = resolve_root(output_root)
+
+    days = window_dates(run_date, window_days)
+    manifest = load_manifest(raw_fs, raw_path)
+    daily_tables = [load_or_compute_day(raw_fs, raw_path, state_fs, state_path, day, manifest) for day in days]
+    prune_state(state_fs, state_path, days[0])
+
+    result = top_n_window(daily_tables, top_n)
+    if result.num_rows == 0:
+        logger.warning(f"No raw data between {days[0]} and {days[-1]}. Nothing written.")
+        return result
+
+    write_refined(result, output_fs, output_path, run_date)
+    logger.info(f"Wrote top {result.num_rows} for {days[0]}..{days[-1]} to '{output_root}'.")
+    return result
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Incremental 7-day top-N refinement of the B3 raw data.")
+    parser.add_argument("--run-date", help="Last day of the window (YYYY-MM-DD). Defaults to each day of --partitions, or today.")
+    parser.add_argument("--partitions", default="", help="Comma-separated days that changed, as sent by src/trigger_glue.py.")
+    parser.add_argument("--raw-root", default=REFINE_RAW_ROOT, help="Local path or s3:// URI of the raw dataset.")
+    parser.add_argument("--output-root", default=REFINE_OUTPUT_ROOT, help="Local path or s3:// URI of the refined dataset.")
+    parser.add_argument("--state-root", default=REFINE_STATE_ROOT, help="Where the per-day partial sums are kept.")
+    parser.add_argument("--window-days", type=int, default=REFINE_WINDOW_DAYS)
+    parser.add_argument("--top-n", type=int, default=REFINE_TOP_N)
+    # Glue Python shell jobs append their own arguments (--job-bookmark-option, ...), so unknown ones are ignored
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    partitions = sorted(set(filter(None, (part.strip() for part in args.partitions.split(",")))))
+    if partitions:
+        # Only changed days have a new fingerprint, so only their partial sums are recomputed
+        logger.info(f"Triggered by {len(partitions)} changed partition(s): {', '.join(partitions)}.")
+    # Every changed day gets its own created_at partition, not only the latest one of the batch
+    run_dates = [args.run_date] if args.run_date else partitions or [date.today().isoformat()]
+    for run_date in run_dates:
+        result = run(datetime.strptime(run_date, "%Y-%m-%d").date(), args.raw_root, args.output_root,
+                     args.state_root, args.window_days, args.top_n)
+        print(result.to_pandas())
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
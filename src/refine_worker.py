@@ -0,0 +1,267 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import boto3
+
+from src.aws_clients import AWS_REGION, get_client
+from src.dataset import load_manifest, resolve_root
+from src.metrics import stage
+from src.refine_job import (REFINE_OUTPUT_ROOT, REFINE_RAW_ROOT, REFINE_STATE_ROOT, REFINE_TOP_N, REFINE_WINDOW_DAYS,
+                            load_or_compute_day, run)
+from src.trigger_glue import partitions_from_key
+
+# Consumes the S3 notifications queued by src/sqs.py and refines new raw days in-process, without a Glue run
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+REFINE_QUEUE_URL = os.getenv("REFINE_QUEUE_URL", "")
+REFINE_WORKER_MAX_WORKERS = int(os.getenv("REFINE_WORKER_MAX_WORKERS", 8))
+REFINE_WAIT_SECONDS = int(os.getenv("REFINE_WAIT_SECONDS", 20)) # Long polling; 20 is the SQS maximum
+REFINE_VISIBILITY_TIMEOUT = int(os.getenv("REFINE_VISIBILITY_TIMEOUT", 60)) # Extended while a batch is still running
+REFINE_RECEIVE_BACKOFF_MAX = float(os.getenv("REFINE_RECEIVE_BACKOFF_MAX", 60)) # Seconds between retries once SQS keeps failing
+
+SQS_BATCH_LIMIT = 10 # Max entries of receive_message, delete_message_batch and change_message_visibility_batch
+
+# --- Messages ---
+
+def message_partitions(message: dict) -> set[str]:
+    """
+    Days referenced by one SQS message: an S3 notification (see src/sqs.py) or a follow-up
+    {"partitions": [...]} sent by src/trigger_glue.py. s3:TestEvent and unrelated keys give an empty set.
+    """
+    try:
+        body = json.loads(message["Body"])
+    except json.JSONDecodeError:
+        logger.warning(f"Message {message['MessageId']} is not JSON; dropping it.")
+        return set()
+    if "partitions" in body:
+        return set(body["partitions"])
+    partitions = set()
+    for record in body.get("Records", []):
+        partition = partitions_from_key(record.get("s3", {}).get("object", {}).get("key", ""))
+        if partition:
+            partitions.add(partition)
+    return partitions
+
+def _chunks(items: list, size: int = SQS_BATCH_LIMIT):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class VisibilityExtender:
+    """
+    Keeps the messages of the running batch invisible: every `timeout / 2` seconds their visibility is reset to
+    `timeout`, so slow days are not redelivered to another worker while still being processed.
+    """
+
+    def __init__(self, sqs_client: boto3.client, queue_url: str, messages: list[dict], timeout: int):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.messages = messages
+        self.timeout = timeout
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="visibility-extender", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(max(self.timeout / 2, 1)):
+            for chunk in _chunks(self.messages):
+                entries = [{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"],
+                            "VisibilityTimeout": self.timeout} for index, message in enumerate(chunk)]
+                try:
+                    self.sqs_client.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+                except Exception as e:
+                    logger.warning(f"Could not extend the visibility of {len(entries)} message(s): {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+def lambda_consumers(lambda_client: boto3.client, queue_url: str) -> list[str]:
+    """
+    Functions whose enabled event source mapping reads the queue. SQS hands each message to one consumer
+    only, so a Lambda on the same queue would take days away from the worker (and vice versa).
+    """
+    queue_arn = get_client("sqs", AWS_REGION).get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    functions = []
+    for page in lambda_client.get_paginator("list_event_source_mappings").paginate(EventSourceArn=queue_arn):
+        functions.extend(mapping["FunctionArn"] for mapping in page["EventSourceMappings"]
+                         if mapping["State"] not in ("Disabled", "Disabling"))
+    return functions
+
+# --- Worker ---
+
+class RefineWorker:
+    """
+    Long-polls the queue, recomputes the partial sums of every referenced day on a thread pool, refreshes the
+    top-N window ending at each of them and deletes the handled messages in batches. A message whose
+    days failed is left alone and comes back after the visibility timeout; the window is then refreshed by
+    the retry, which reuses the partial sums already stored for the other days.
+    """
+
+    def __init__(self, sqs_client: boto3.client, queue_url: str, raw_root: str = REFINE_RAW_ROOT,
+                 output_root: str = REFINE_OUTPUT_ROOT, state_root: str = REFINE_STATE_ROOT,
+                 window_days: int = REFINE_WINDOW_DAYS, top_n: int = REFINE_TOP_N,
+                 max_workers: int = REFINE_WORKER_MAX_WORKERS, wait_seconds: int = REFINE_WAIT_SECONDS,
+                 visibility_timeout: int = REFINE_VISIBILITY_TIMEOUT,
+                 receive_backoff_max: float = REFINE_RECEIVE_BACKOFF_MAX):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.raw_root = raw_root
+        self.output_root = output_root
+        self.state_root = state_root
+        self.window_days = window_days
+        self.top_n = top_n
+        self.wait_seconds = wait_seconds
+        self.visibility_timeout = visibility_timeout
+        self.receive_backoff_max = receive_backoff_max
+        self.stats = {"batches": 0, "messages": 0, "deleted": 0, "failed_days": 0, "refreshes": 0, "receive_errors": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="refine")
+        self._stop = threading.Event()
+
+    def stop(self, *_) -> None:
+        logger.info("Stopping after the current batch...")
+        self._stop.set()
+
+    def receive(self) -> list[dict]:
+        response = self.sqs_client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=SQS_BATCH_LIMIT,
+            WaitTimeSeconds=self.wait_seconds,
+            VisibilityTimeout=self.visibility_timeout,
+        )
+        return response.get("Messages", [])
+
+    def delete(self, messages: list[dict]) -> int:
+        deleted = 0
+        for chunk in _chunks(messages):
+            entries = [{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]} for index, message in enumerate(chunk)]
+            response = self.sqs_client.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            deleted += len(response.get("Successful", []))
+            for failure in response.get("Failed", []):
+                logger.warning(f"Could not delete message {chunk[int(failure['Id'])]['MessageId']}: {failure.get('Message')}")
+        return deleted
+
+    def refresh_days(self, days: list[str]) -> set[str]:
+        """
+        Recomputes the partial sums of `days` concurrently. Returns the days that failed.
+        """
+        raw_fs, raw_path = resolve_root(self.raw_root)
+        state_fs, state_path = resolve_root(self.state_root)
+        manifest = load_manifest(raw_fs, raw_path)
+        futures = {day: self._executor.submit(load_or_compute_day, raw_fs, raw_path, state_fs, state_path,
+                                              date.fromisoformat(day), manifest) for day in days}
+        failed = set()
+        for day, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed.add(day)
+                logger.error(f"Failed to refresh {day}: {e}")
+        return failed
+
+    def process(self, messages: list[dict]) -> int:
+        """
+        Handles one received batch. Returns the number of deleted messages.
+        """
+        partitions = {message["MessageId"]: message_partitions(message) for message in messages}
+        days = sorted(set().union(*partitions.values()))
+        with stage("refine_batch", worker="sqs") as metrics, \
+                VisibilityExtender(self.sqs_client, self.queue_url, messages, self.visibility_timeout):
+            metrics.rows = len(messages)
+            failed = self.refresh_days(days) if days else set()
+            if days and not failed:
+                # The changed days' partial sums are already stored, so each run() only reads the state back
+                for day in days:
+                    run(date.fromisoformat(day), self.raw_root, self.output_root, self.state_root,
+                        self.window_days, self.top_n)
+                self.stats["refreshes"] += len(days)
+
+        done = [message for message in messages if not partitions[message["MessageId"]] & failed]
+        deleted = self.delete(done) if done else 0
+        self.stats["batches"] += 1
+        self.stats["messages"] += len(messages)
+        self.stats["deleted"] += deleted
+        self.stats["failed_days"] += len(failed)
+        logger.info(f"Batch of {len(messages)} message(s): {len(days)} day(s), {len(failed)} failed, {deleted} deleted.")
+        return deleted
+
+    def run_forever(self, max_batches: int | None = None) -> dict[str, int]:
+        """
+        Polls until stop() is called (SIGTERM/SIGINT in main) or `max_batches` non-empty batches were handled.
+        """
+        failures = 0
+        try:
+            while not self._stop.is_set() and (max_batches is None or self.stats["batches"] < max_batches):
+                try:
+                    messages = self.receive()
+                except Exception as e:
+                    # Throttling, expired credentials or a network blip must not kill the worker
+                    failures += 1
+                    self.stats["receive_errors"] += 1
+                    delay = min(2 ** (failures - 1), self.receive_backoff_max)
+                    logger.error(f"Could not receive messages ({failures} in a row): {e}. Retrying in {delay:.0f}s.")
+                    self._stop.wait(delay)
+                    continue
+                failures = 0
+                if not messages:
+                    continue
+                try:
+                    self.process(messages)
+                except Exception as e:
+                    # Nothing was deleted: the batch is redelivered once its visibility timeout expires
+                    logger.error(f"Batch failed at {datetime.now().isoformat(timespec='seconds')}: {e}")
+        finally:
+            self._executor.shutdown(wait=True)
+        logger.info(f"Worker stopped. Stats: {self.stats}")
+        return self.stats
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Refines new raw B3 days as their S3 notifications arrive on SQS.")
+    parser.add_argument("--queue-url", default=REFINE_QUEUE_URL, required=not REFINE_QUEUE_URL)
+    parser.add_argument("--raw-root", default=REFINE_RAW_ROOT, help="Local path or s3:// URI of the raw dataset.")
+    parser.add_argument("--output-root", default=REFINE_OUTPUT_ROOT, help="Local path or s3:// URI of the refined dataset.")
+    parser.add_argument("--state-root", default=REFINE_STATE_ROOT, help="Where the per-day partial sums are kept.")
+    parser.add_argument("--window-days", type=int, default=REFINE_WINDOW_DAYS)
+    parser.add_argument("--top-n", type=int, default=REFINE_TOP_N)
+    parser.add_argument("--max-workers", type=int, default=REFINE_WORKER_MAX_WORKERS)
+    parser.add_argument("--visibility-timeout", type=int, default=REFINE_VISIBILITY_TIMEOUT)
+    parser.add_argument("--max-batches", type=int, help="Exit after this many batches (default: run until stopped).")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    try:
+        consumers = lambda_consumers(get_client("lambda", AWS_REGION), args.queue_url)
+    except Exception as e:
+        consumers = []
+        logger.warning(f"Could not check the queue for Lambda consumers: {e}")
+    if consumers:
+        logger.error(f"The queue is already consumed by {', '.join(consumers)}. Use a separate queue or run "
+                     f"'REFINE_CONSUMER=worker python -m src.sqs' to disable the Lambda mapping first.")
+        return 1
+
+    worker = RefineWorker(get_client("sqs", AWS_REGION), args.queue_url, args.raw_root, args.output_root,
+                          args.state_root, args.window_days, args.top_n, args.max_workers,
+                          visibility_timeout=args.visibility_timeout)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run_forever(args.max_batches)
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+ROLLING_FLUSH_ROWS = int(os.getenv("ROLLING_FLUSH_ROWS", 1_000)) # Buffered rows that trigger a part file
+ROLLING_FLUSH_SECONDS = float(os.getenv("ROLLING_FLUSH_SECONDS", 60)) # Oldest buffered row age that triggers a part file
+ROLLING_COMPRESSION = os.getenv("ROLLING_COMPRESSION", "snappy")
+
+SEALED_FILE = "sealed.parquet"
+BTC_TICK_SCHEMA = pa.schema([("data_hora", pa.timestamp("us")), ("preco_brl", pa.float64())])
+
+# --- Writer ---
+
+class RollingParquetWriter:
+    """
+    Appends records to day partitions as immutable part files: <root>/ano=/mes=/dia=DD/part-<ms>-<id>.parquet.
+
+    Records are buffered and flushed when `max_rows` are buffered or the oldest one is `max_seconds` old,
+    so a poll never rewrites an existing file. When a record of a new day arrives (or a later run starts),
+    the previous day is sealed: its parts, plus a legacy <root>/ano=/mes=/dia=DD.parquet if present, are
+    merged into dia=DD/sealed.parquet sorted by time. Files are written under a temporary name and renamed,
+    so readers never see a partial file.
+    """
+
+    def __init__(self, root: str, schema: pa.Schema, timestamp_column: str = "data_hora",
+                 max_rows: int = ROLLING_FLUSH_ROWS, max_seconds: float = ROLLING_FLUSH_SECONDS,
+                 compression: str = ROLLING_COMPRESSION):
+        self.root = root
+        self.schema = schema
+        self.timestamp_column = timestamp_column
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.compression = compression
+        self.stats = {"records": 0, "parts": 0, "sealed_days": 0}
+        self._buffer: list[dict] = []
+        self._buffer_started = 0.0
+        self._day: date | None = None
+
+    # --- Paths ---
+
+    def day_path(self, day: date) -> str:
+        return os.path.join(self.root, f"ano={day.year}", f"mes={day.month:02d}", f"dia={day.day:02d}")
+
+    def _write_atomic(self, table: pa.Table, path: str) -> None:
+        temporary = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp") # Hidden: skipped by readers
+        pq.write_table(table, temporary, compression=self.compression)
+        os.replace(temporary, path)
+
+    # --- Buffering ---
+
+    def write(self, record: dict) -> None:
+        timestamp = record[self.timestamp_column]
+        day = timestamp.date() if isinstance(timestamp, datetime) else datetime.fromtimestamp(timestamp).date()
+        if self._day is not None and day != self._day:
+            self.flush()
+            self.seal(self._day)
+        self._day = day
+
+        if not self._buffer:
+            self._buffer_started = time.monotonic()
+        self._buffer.append(record)
+        self.stats["records"] += 1
+        if len(self._buffer) >= self.max_rows or time.monotonic() - self._buffer_started >= self.max_seconds:
+            self.flush()
+
+    def flush(self) -> str | None:
+        """
+        Writes the buffered records as a new part file of the current day. Returns its path.
+        """
+        if not self._buffer:
+            return None
+        directory = self.day_path(self._day)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet")
+        self._write_atomic(pa.Table.from_pylist(self._buffer, schema=self.schema), path)
+        logger.debug(f"Flushed {len(self._buffer)} record(s) to '{path}'.")
+        self._buffer = []
+        self.stats["parts"] += 1
+        return path
+
+    # --- Sealing ---
+
+    def seal(self, day: date) -> str | None:
+        """
+        Merges every file of `day` into dia=DD/sealed.parquet and removes the merged files.
+        """
+        directory = self.day_path(day)
+        legacy = f"{directory}.parquet"
+        sources = [legacy] if os.path.isfile(legacy) else []
+        if os.path.isdir(directory):
+            sources += sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                              if name.endswith(".parquet"))
+        if not sources or sources == [os.path.join(directory, SEALED_FILE)]:
+            return None
+
+        tables = [pq.read_table(source, partitioning=None).select(self.schema.names).cast(self.schema) for source in sources]
+        table = pa.concat_tables(tables)
+        table = table.sort_by(self.timestamp_column)
+        os.makedirs(directory, exist_ok=True)
+        sealed = os.path.join(directory, SEALED_FILE)
+        self._write_atomic(table, sealed)
+        for source in sources:
+            if source != sealed:
+                os.remove(source)
+        self.stats["sealed_days"] += 1
+        logger.info(f"Sealed {day}: {len(sources)} file(s) -> '{sealed}' ({table.num_rows} rows).")
+        return sealed
+
+    def seal_pending(self, before: date) -> list[str]:
+        """
+        Seals every day before `before` that still has part files, e.g. left by a process that stopped mid-day.
+        """
+        sealed = []
+        for year_dir in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            for month_dir in sorted(os.listdir(os.path.join(self.root, year_dir))):
+                month_path = os.path.join(self.root, year_dir, month_dir)
+                for entry in sorted(os.listdir(month_path)):
+                    if not entry.startswith("dia="):
+                        continue
+                    day = date(int(year_dir[4:]), int(month_dir[4:]), int(entry[4:6]))
+                    directory = os.path.join(month_path, entry[:6])
+                    has_parts = os.path.isdir(directory) and any(
+                        name.startswith("part-") for name in os.listdir(directory))
+                    if day < before and has_parts:
+                        path = self.seal(day)
+                        if path:
+                            sealed.append(path)
+        return sealed
+
+    def close(self) -> None:
+        """
+        Flushes the buffer. The current day stays open: a later run keeps appending parts to it.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
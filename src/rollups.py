@@ -0,0 +1,222 @@
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.storage import connect, from_epoch, to_epoch, transaction
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+# Resolution name -> bucket width in seconds, finest first
+RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3_600, "1d": 86_400}
+# Days each level is kept; None keeps it forever. Raw ticks are only dropped once they were rolled up.
+RETENTION_DAYS = {
+    "raw": float(os.getenv("ROLLUP_RAW_RETENTION_DAYS", 7)),
+    "1m": float(os.getenv("ROLLUP_1M_RETENTION_DAYS", 30)),
+    "5m": float(os.getenv("ROLLUP_5M_RETENTION_DAYS", 180)),
+    "1h": float(os.getenv("ROLLUP_1H_RETENTION_DAYS", 730)),
+    "1d": None,
+}
+ROLLUP_SOURCE = "preco_bitcoin"
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", 100_000)) # Raw ticks read per incremental step
+
+OHLC_COLUMNS = ["bucket", "open", "high", "low", "close", "sum", "count", "first_ts", "last_ts"]
+
+# --- Aggregation ---
+
+def aggregate_ticks(timestamps: np.ndarray, prices: np.ndarray, width: int) -> pd.DataFrame:
+    """
+    Buckets ticks (epoch seconds, price) into `width`-second intervals with NumPy reductions:
+    one sort and one reduceat per aggregate, no Python loop over rows.
+    """
+    if len(timestamps) == 0:
+        return pd.DataFrame(columns=OHLC_COLUMNS)
+    order = np.lexsort((np.arange(len(timestamps)), timestamps)) # Stable by time, then arrival
+    timestamps, prices = timestamps[order], prices[order]
+    buckets = timestamps - timestamps % width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    return pd.DataFrame({
+        "bucket": buckets[starts],
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends],
+        "sum": np.add.reduceat(prices, starts),
+        "count": np.diff(np.r_[starts, len(buckets)]),
+        "first_ts": timestamps[starts],
+        "last_ts": timestamps[ends],
+    })
+
+def resample_ticks(ticks: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    Batch version for tick frames with `data_hora` (datetime) and `preco_brl` columns, e.g. the Parquet files
+    under parquet_arq/preco_bitcoin. Returns OHLC, mean and count per bucket.
+    """
+    series = ticks.set_index(pd.DatetimeIndex(ticks["data_hora"]))["preco_brl"].sort_index()
+    resampled = series.resample(f"{RESOLUTIONS[resolution]}s")
+    frame = resampled.ohlc()
+    frame["mean"] = resampled.mean()
+    frame["count"] = resampled.count()
+    return frame[frame["count"] > 0]
+
+# --- Incremental Maintenance ---
+
+UPSERT_SQL = """
+    INSERT INTO preco_bitcoin_ohlc (resolution, bucket, open, high, low, close, sum, count, first_ts, last_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (resolution, bucket) DO UPDATE SET
+        open = CASE WHEN excluded.first_ts < first_ts THEN excluded.open ELSE open END,
+        high = max(high, excluded.high),
+        low = min(low, excluded.low),
+        close = CASE WHEN excluded.last_ts >= last_ts THEN excluded.close ELSE close END,
+        sum = sum + excluded.sum,
+        count = count + excluded.count,
+        first_ts = min(first_ts, excluded.first_ts),
+        last_ts = max(last_ts, excluded.last_ts)
+"""
+
+def _watermark(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT last_id FROM rollup_state WHERE source = ?", (ROLLUP_SOURCE,)).fetchone()
+    return row[0] if row else 0
+
+def refresh_rollups(conn: sqlite3.Connection, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """
+    Folds the ticks inserted since the last call into every resolution. Each batch and its watermark
+    (the last rolled-up id) are committed together, so a crash never counts a tick twice.
+    Returns how many ticks were rolled up.
+    """
+    total = 0
+    while True:
+        with transaction(conn):
+            last_id = _watermark(conn)
+            rows = conn.execute(
+                "SELECT id, data_hora, preco_brl FROM preco_bitcoin WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                return total
+            ids, timestamps, prices = (np.array(column) for column in zip(*rows))
+            timestamps, prices = timestamps.astype("int64"), prices.astype("float64")
+            for resolution, width in RESOLUTIONS.items():
+                aggregates = aggregate_ticks(timestamps, prices, width)
+                conn.executemany(UPSERT_SQL, [(resolution, *row) for row in aggregates.itertuples(index=False)])
+            conn.execute(
+                "INSERT INTO rollup_state (source, last_id) VALUES (?, ?) "
+                "ON CONFLICT (source) DO UPDATE SET last_id = excluded.last_id",
+                (ROLLUP_SOURCE, int(ids.max())),
+            )
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+def rebuild_rollups(conn: sqlite3.Connection) -> int:
+    """
+    Recomputes every resolution from the raw ticks still stored (vectorized, one pass per resolution).
+    Buckets whose raw ticks were already dropped by the retention policy are kept as they are.
+    """
+    ticks = pd.read_sql_query("SELECT id, data_hora, preco_brl FROM preco_bitcoin", conn)
+    if ticks.empty:
+        return 0
+    timestamps = ticks["data_hora"].to_numpy("int64")
+    prices = ticks["preco_brl"].to_numpy("float64")
+    with transaction(conn):
+        for resolution, width in RESOLUTIONS.items():
+            first_bucket = int(timestamps.min() - timestamps.min() % width)
+            stored = conn.execute(
+                "SELECT first_ts FROM preco_bitcoin_ohlc WHERE resolution = ? AND bucket = ?", (resolution, first_bucket)
+            ).fetchone()
+            if stored and stored[0] < timestamps.min():
+                first_bucket += width # Part of this bucket's ticks are gone: keep the stored row
+            conn.execute("DELETE FROM preco_bitcoin_ohlc WHERE resolution = ? AND bucket >= ?", (resolution, first_bucket))
+            keep = timestamps >= first_bucket
+            aggregates = aggregate_ticks(timestamps[keep], prices[keep], width)
+            conn.executemany(UPSERT_SQL, [(resolution, *row) for row in aggregates.itertuples(index=False)])
+        conn.execute(
+            "INSERT INTO rollup_state (source, last_id) VALUES (?, ?) "
+            "ON CONFLICT (source) DO UPDATE SET last_id = excluded.last_id",
+            (ROLLUP_SOURCE, int(ticks["id"].max())),
+        )
+    logger.info(f"Rebuilt rollups from {len(ticks)} raw tick(s).")
+    return len(ticks)
+
+def apply_retention(conn: sqlite3.Connection, now: float | None = None) -> dict[str, int]:
+    """
+    Deletes raw ticks and rollup buckets older than their retention. Raw ticks above the watermark
+    (not rolled up yet) are never deleted.
+    """
+    now = now if now is not None else time.time()
+    deleted = {}
+    with transaction(conn):
+        if RETENTION_DAYS["raw"] is not None:
+            cutoff = int(now - RETENTION_DAYS["raw"] * 86_400)
+            cursor = conn.execute("DELETE FROM preco_bitcoin WHERE data_hora < ? AND id <= ?", (cutoff, _watermark(conn)))
+            deleted["raw"] = cursor.rowcount
+        for resolution in RESOLUTIONS:
+            if RETENTION_DAYS[resolution] is None:
+                continue
+            cutoff = int(now - RETENTION_DAYS[resolution] * 86_400)
+            cursor = conn.execute("DELETE FROM preco_bitcoin_ohlc WHERE resolution = ? AND bucket < ?", (resolution, cutoff))
+            deleted[resolution] = cursor.rowcount
+    if any(deleted.values()):
+        logger.info(f"Retention deleted: {deleted}")
+    return deleted
+
+# --- Queries ---
+
+def pick_resolution(start: float, step: int, now: float | None = None) -> str | None:
+    """
+    The coarsest stored resolution that divides `step` and is still retained back to `start`.
+    None means only the raw ticks can answer.
+    """
+    now = now if now is not None else time.time()
+    for resolution, width in reversed(RESOLUTIONS.items()):
+        retention = RETENTION_DAYS[resolution]
+        retained = retention is None or start >= now - retention * 86_400
+        if width <= step and step % width == 0 and retained:
+            return resolution
+    return None
+
+def query_ohlc(conn: sqlite3.Connection, start: datetime, end: datetime, step: int = 3_600) -> pd.DataFrame:
+    """
+    OHLC, mean and count every `step` seconds between `start` and `end`, read from the coarsest rollup that
+    answers the query (re-aggregated when `step` is a multiple of it).
+    """
+    start_epoch, end_epoch = to_epoch(start), to_epoch(end)
+    resolution = pick_resolution(start_epoch, step)
+    if resolution is None:
+        ticks = pd.read_sql_query(
+            "SELECT data_hora, preco_brl FROM preco_bitcoin WHERE data_hora >= ? AND data_hora <= ?",
+            conn, params=(start_epoch, end_epoch),
+        )
+        rollup = aggregate_ticks(ticks["data_hora"].to_numpy("int64"), ticks["preco_brl"].to_numpy("float64"), step)
+    else:
+        rollup = pd.read_sql_query(
+            f"SELECT {', '.join(OHLC_COLUMNS)} FROM preco_bitcoin_ohlc "
+            "WHERE resolution = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+            conn, params=(resolution, start_epoch - start_epoch % RESOLUTIONS[resolution], end_epoch),
+        )
+        if RESOLUTIONS[resolution] != step and not rollup.empty:
+            rollup["bucket"] = rollup["bucket"] - rollup["bucket"] % step
+            rollup = rollup.groupby("bucket", as_index=False, sort=True).agg(
+                open=("open", "first"), high=("high", "max"), low=("low", "min"), close=("close", "last"),
+                sum=("sum", "sum"), count=("count", "sum"), first_ts=("first_ts", "min"), last_ts=("last_ts", "max"),
+            )
+    rollup = rollup.assign(mean=rollup["sum"] / rollup["count"], resolution=resolution or "raw")
+    rollup["bucket"] = from_epoch(rollup["bucket"])
+    return rollup.drop(columns=["sum", "first_ts", "last_ts"]).reset_index(drop=True)
+
+# --- Main Execution Flow ---
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    connection = connect()
+    logger.info(f"Rolled up {refresh_rollups(connection)} new tick(s).")
+    apply_retention(connection)
+    connection.close()
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+# Key layout of the raw B3 partitions in S3, shared by the ETL upload and the backfill. Kept free of
+# third-party imports so that importing it never pulls in selenium, pandas or boto3.
+
+# --- Configuration & Setup ---
+
+bucket_name = "bucket-fiap-b3"
+RAW_FILENAME = "b3_dados_brutos.parquet"
+
+# --- Partition Keys ---
+
+def build_s3_path(prefix: str = "raw", partitions: dict[str, str] | None = None, date: datetime | None = None,
+                  filename: str = RAW_FILENAME) -> str:
+    """
+    Builds the Hive-style key of a daily partition, optionally nested under extra partitions (e.g. indice=IBOV/visao=day).
+    """
+    date = date or datetime.today()
+    extra = "".join(f"/{key}={value}" for key, value in (partitions or {}).items())
+    return f"{prefix}{extra}/ano={date.year}/mes={date.month:02d}/dia={date.day:02d}/{filename}"
@@ -0,0 +1,150 @@
+import io
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import boto3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024 # S3 rejects multipart parts smaller than 5 MiB (except the last one)
+S3_PART_SIZE_MB = int(os.getenv("S3_PART_SIZE_MB", 8))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 4)) # Parts uploaded in parallel (memory ~ part size x concurrency)
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", 100_000))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "snappy")
+
+# --- Streaming Multipart Writer ---
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    Write-only file object that streams bytes to S3.
+
+    Data is buffered until a part is full and then sent with upload_part on a thread pool, so at most
+    `max_concurrency` parts are held in memory. Objects smaller than one part are sent with a single
+    put_object on close. Any error aborts the multipart upload so no orphan parts are left behind.
+    """
+
+    def __init__(self, s3_client: boto3.client, bucket: str, key: str, part_size_mb: int = S3_PART_SIZE_MB,
+                 max_concurrency: int = S3_MAX_CONCURRENCY, **put_kwargs):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size_mb * 1024 * 1024, MIN_PART_SIZE)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.put_kwargs = put_kwargs # Extra put_object/create_multipart_upload arguments, e.g. Metadata
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id: str | None = None
+        self._futures: list[Future] = []
+        self._executor: ThreadPoolExecutor | None = None
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed S3MultipartWriter.")
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit_part(part)
+        return len(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.put_kwargs)
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+                logger.debug(f"Completed multipart upload of {len(parts)} part(s) to s3://{self.bucket}/{self.key}")
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            if self._executor:
+                self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self) -> None:
+        """
+        Cancels the multipart upload, discarding every part sent so far.
+        """
+        if self._upload_id is None:
+            return
+        for future in self._futures:
+            future.cancel()
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            logger.warning(f"Aborted multipart upload to s3://{self.bucket}/{self.key}")
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload '{self._upload_id}': {e}")
+        finally:
+            self._upload_id = None
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.abort()
+            self._buffer = bytearray()
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            super().close()
+            return False
+        self.close()
+        return False
+
+    def _submit_part(self, part: bytes) -> None:
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.put_kwargs)
+            self._upload_id = response["UploadId"]
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3-part")
+
+        # Backpressure: wait for the oldest in-flight part before buffering more than max_concurrency parts
+        in_flight = [future for future in self._futures if not future.done()]
+        if len(in_flight) >= self.max_concurrency:
+            in_flight[0].result()
+
+        part_number = len(self._futures) + 1
+        self._futures.append(self._executor.submit(self._upload_part, part_number, part))
+
+    def _upload_part(self, part_number: int, part: bytes) -> dict:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=part_number, Body=part,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+# --- Parquet Upload ---
+
+def write_parquet_to_s3(s3_client: boto3.client, df: pd.DataFrame, bucket: str, key: str,
+                        row_group_size: int = PARQUET_ROW_GROUP_SIZE, compression: str = PARQUET_COMPRESSION,
+                        part_size_mb: int = S3_PART_SIZE_MB, max_concurrency: int = S3_MAX_CONCURRENCY,
+                        **put_kwargs) -> int:
+    """
+    Encodes the DataFrame row group by row group straight into a multipart upload and returns the object size.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with S3MultipartWriter(s3_client, bucket, key, part_size_mb, max_concurrency, **put_kwargs) as sink:
+        with pq.ParquetWriter(sink, table.schema, compression=compression) as writer:
+            for batch in table.to_batches(max_chunksize=row_group_size):
+                writer.write_table(pa.Table.from_batches([batch], schema=table.schema), row_group_size=row_group_size)
+        size = sink.bytes_written
+    return size
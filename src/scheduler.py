@@ -0,0 +1,213 @@
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import boto3
+
+from src.etl import AWS_REGION, bucket_name, get_s3_client, transform_b3_data, upload_dataframe_to_s3
+from src.extractors import extract_b3_data
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+B3_INDEX_PAGE_URL = "https://sistemaswebb3-listados.b3.com.br/indexPage/{view}/{index}?language=pt-br"
+B3_TARGETS = os.getenv("B3_TARGETS", "IBOV:day,IBXX:day,IBRA:day,SMLL:day,IDIV:day,IBOV:theorical")
+B3_TARGETS_PREFIX = os.getenv("B3_TARGETS_PREFIX", "raw_indices") # Kept apart from raw/, which the Glue job reads as IBOV only
+SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", 4))
+SCHEDULER_TARGET_TIMEOUT = float(os.getenv("SCHEDULER_TARGET_TIMEOUT", 120)) # Seconds per attempt
+SCHEDULER_MAX_RETRIES = int(os.getenv("SCHEDULER_MAX_RETRIES", 2))
+SCHEDULER_RETRY_BACKOFF = float(os.getenv("SCHEDULER_RETRY_BACKOFF", 2)) # Base delay, doubled on every retry
+
+# --- Targets ---
+
+@dataclass(frozen=True)
+class ScrapeTarget:
+    """
+    One B3 index page to scrape, e.g. ScrapeTarget('IBOV', 'day').
+    """
+    index: str
+    view: str = "day"
+
+    @property
+    def url(self) -> str:
+        return B3_INDEX_PAGE_URL.format(index=self.index, view=self.view)
+
+    @property
+    def partitions(self) -> dict[str, str]:
+        return {"indice": self.index, "visao": self.view}
+
+    def __str__(self) -> str:
+        return f"{self.index}:{self.view}"
+
+@dataclass
+class TargetResult:
+    """
+    Outcome of a target after all of its attempts.
+    """
+    target: ScrapeTarget
+    status: str = "pending" # 'success', 'empty', 'failed' or 'timeout'
+    rows: int = 0
+    latency_s: float = 0.0
+    attempts: int = 0
+    s3_key: str | None = None
+    error: str | None = None
+
+def parse_targets(spec: str) -> list[ScrapeTarget]:
+    """
+    Parses 'IBOV:day,SMLL,IBOV:theorical' into targets. The view defaults to 'day'.
+    """
+    targets = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        index, _, view = item.partition(":")
+        targets.append(ScrapeTarget(index.strip().upper(), view.strip() or "day"))
+    return list(dict.fromkeys(targets)) # Drop duplicates, keep order
+
+# --- Worker ---
+
+class AttemptCancelled(Exception):
+    """
+    Raised inside an attempt the scheduler abandoned after its timeout, so it never uploads over its retry.
+    """
+
+def _check_cancelled(target: ScrapeTarget, cancelled: threading.Event | None, step: str) -> None:
+    if cancelled is not None and cancelled.is_set():
+        logger.info(f"Abandoned attempt for {target} stopped before {step}.")
+        raise AttemptCancelled(f"Attempt for {target} was abandoned before {step}.")
+
+def process_target(target: ScrapeTarget, s3_client: boto3.client, bucket: str, prefix: str,
+                   cancelled: threading.Event | None = None) -> TargetResult:
+    """
+    Extracts, transforms and uploads a single target. Exceptions propagate so the scheduler can retry.
+    `cancelled` is set by the scheduler when the attempt times out; it is checked between steps, so an
+    abandoned attempt skips the extractor fallback (and its browser) and never reaches the upload.
+    """
+    result = TargetResult(target)
+    _check_cancelled(target, cancelled, "extraction")
+    raw_df = extract_b3_data(target.url, cancelled=cancelled)
+    if raw_df is None or raw_df.empty:
+        result.status = "empty"
+        return result
+
+    transformed_df = transform_b3_data(raw_df)
+    result.rows = len(transformed_df)
+    _check_cancelled(target, cancelled, "upload")
+    result.s3_key = upload_dataframe_to_s3(s3_client, transformed_df, bucket, prefix=prefix, partitions=target.partitions)
+    result.status = "success"
+    return result
+
+# --- Scheduler ---
+
+def run_targets(targets: list[ScrapeTarget], s3_client: boto3.client, bucket: str = bucket_name,
+                prefix: str = B3_TARGETS_PREFIX, max_workers: int = SCHEDULER_MAX_WORKERS,
+                timeout: float = SCHEDULER_TARGET_TIMEOUT, max_retries: int = SCHEDULER_MAX_RETRIES) -> list[TargetResult]:
+    """
+    Runs the targets concurrently on a bounded thread pool.
+
+    Each attempt gets `timeout` seconds from the moment a worker picks it up, and failed or timed-out
+    attempts are retried up to `max_retries` times with exponential backoff. A timed-out attempt is
+    signalled through its cancellation event, so it stops at its next check and never uploads over the
+    retry. A failing target never stops the others; its error is reported in its TargetResult.
+    """
+    results = {target: TargetResult(target) for target in targets}
+    started_at: dict[tuple[ScrapeTarget, int], float] = {}
+    first_started_at: dict[ScrapeTarget, float] = {}
+    cancel_events: dict[tuple[ScrapeTarget, int], threading.Event] = {}
+    lock = threading.Lock()
+
+    def attempt(target: ScrapeTarget, number: int, cancelled: threading.Event) -> TargetResult:
+        if number > 1:
+            time.sleep(SCHEDULER_RETRY_BACKOFF * 2 ** (number - 2))
+        with lock:
+            started_at[(target, number)] = time.monotonic()
+            first_started_at.setdefault(target, started_at[(target, number)])
+        return process_target(target, s3_client, bucket, prefix, cancelled)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="b3-scrape")
+    pending: dict[Future, ScrapeTarget] = {}
+
+    def submit(target: ScrapeTarget) -> None:
+        results[target].attempts += 1
+        cancelled = cancel_events[(target, results[target].attempts)] = threading.Event()
+        future = executor.submit(attempt, target, results[target].attempts, cancelled)
+        pending[future] = target
+
+    try:
+        for target in targets:
+            submit(target)
+
+        while pending:
+            done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+
+            for future in list(pending):
+                target = pending[future]
+                result = results[target]
+                with lock:
+                    started = started_at.get((target, result.attempts))
+
+                if future in done:
+                    del pending[future]
+                    try:
+                        outcome = future.result()
+                        result.status, result.rows, result.s3_key, result.error = outcome.status, outcome.rows, outcome.s3_key, None
+                    except Exception as e:
+                        result.status, result.error = "failed", str(e)
+                        logger.warning(f"Target {target} failed on attempt {result.attempts}: {e}")
+                elif started is not None and now - started > timeout:
+                    # Threads cannot be interrupted: the attempt is told to stop and its result is ignored
+                    del pending[future]
+                    cancel_events[(target, result.attempts)].set()
+                    future.cancel()
+                    result.status, result.error = "timeout", f"Attempt exceeded {timeout} seconds."
+                    logger.warning(f"Target {target} timed out on attempt {result.attempts}.")
+                else:
+                    continue
+
+                if result.status in ("failed", "timeout") and result.attempts <= max_retries:
+                    logger.info(f"Retrying target {target} (attempt {result.attempts + 1}).")
+                    submit(target)
+                else:
+                    with lock:
+                        result.latency_s = round(now - first_started_at.get(target, now), 3)
+    finally:
+        for cancelled in cancel_events.values(): # Attempts still running when the batch ends must not upload
+            cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return list(results.values())
+
+def log_report(results: list[TargetResult]) -> None:
+    """
+    Logs latency and row counts per target.
+    """
+    for result in results:
+        message = (f"{str(result.target):<16} status={result.status:<8} rows={result.rows:<4} "
+                   f"latency={result.latency_s:.2f}s attempts={result.attempts}")
+        if result.error:
+            message += f" error={result.error}"
+        (logger.info if result.status == "success" else logger.warning)(message)
+
+    succeeded = sum(result.status == "success" for result in results)
+    logger.info(f"Batch finished: {succeeded}/{len(results)} targets succeeded, {sum(r.rows for r in results)} rows uploaded.")
+
+# --- Main Execution Flow ---
+
+def main() -> int:
+    """
+    Scrapes every target in B3_TARGETS and uploads each one to its own partition.
+    """
+    targets = parse_targets(B3_TARGETS)
+    logger.info(f"Starting scheduled scraping of {len(targets)} target(s): {', '.join(map(str, targets))}")
+    s3 = get_s3_client(AWS_REGION)
+    results = run_targets(targets, s3)
+    log_report(results)
+    return 0 if all(result.status == "success" for result in results) else 1
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -1,5 +1,7 @@
-import boto3
 import json
+import os
+
+from src.aws_clients import get_client
 
 # SOMENTE ESQUELETO, ESTA IMCOMPLETO
 # Este script cria um trigger no S3 que envia notificações para uma fila SQS quando novos objetos são criados.
@@ -9,79 +11,130 @@ import json
 S3_BUCKET_NAME = "seu-nome-do-bucket"
 SQS_QUEUE_NAME = "seu-nome-da-fila-sqs"
 REGION_NAME = "us-east-1"  # Por exemplo
+LAMBDA_FUNCTION_NAME = "trigger_glue"
+# Quem consome a fila: 'lambda' (src/trigger_glue.py dispara o Glue) ou 'worker' (src/refine_worker.py).
+# Os dois nunca leem a mesma fila: cada mensagem seria entregue a só um deles e o outro perderia o dia.
+REFINE_CONSUMER = os.environ.get("REFINE_CONSUMER", "lambda")
+RAW_PREFIX = "raw/" # Só os uploads diários da base raw disparam o refinamento (raw_delta/, refined/ etc. não)
+RAW_SUFFIX = ".parquet"
+
+def main():
+    # Inicializar os clientes Boto3
+    s3_client = get_client("s3", REGION_NAME)
+    sqs_client = get_client("sqs", REGION_NAME)
+
+    # --- Passo 1: Obter a URL e o ARN da fila SQS ---
+    try:
+        response = sqs_client.get_queue_url(QueueName=SQS_QUEUE_NAME)
+        sqs_queue_url = response["QueueUrl"]
+
+        response = sqs_client.get_queue_attributes(
+            QueueUrl=sqs_queue_url, AttributeNames=["QueueArn"]
+        )
+        sqs_queue_arn = response["Attributes"]["QueueArn"]
+        print(f"ARN da fila SQS: {sqs_queue_arn}")
+
+    except Exception as e:
+        print(f"Erro ao obter informações da fila SQS: {e}")
+        return
+
+
+    # --- Passo 2: Definir a política de acesso da fila SQS ---
+    # A política permite que o S3 envie mensagens para esta fila
+    sqs_policy = {
+        "Version": "2012-10-17",
+        "Id": "SQS-S3-Policy",
+        "Statement": [
+            {
+                "Sid": "Allow-S3-to-send-messages",
+                "Effect": "Allow",
+                "Principal": {"Service": "s3.amazonaws.com"},
+                "Action": "sqs:SendMessage",
+                "Resource": sqs_queue_arn,
+                "Condition": {
+                    "ArnEquals": {"aws:SourceArn": f"arn:aws:s3:::{S3_BUCKET_NAME}"}
+                },
+            }
+        ],
+    }
+
+    try:
+        sqs_client.set_queue_attributes(
+            QueueUrl=sqs_queue_url, Attributes={"Policy": json.dumps(sqs_policy)}
+        )
+        print("Política da fila SQS atualizada com sucesso.")
+
+    except Exception as e:
+        print(f"Erro ao definir a política da fila SQS: {e}")
+        return
+
+
+    # --- Passo 3: Configurar a notificação de evento no S3 ---
+    # Esta configuração diz ao S3 para enviar uma notificação para a fila SQS
+    # sempre que um objeto Parquet for criado em raw/. Sem o filtro, as próprias saídas do refinamento
+    # (refined/, refined_state/) gerariam novas notificações.
+    s3_notification_config = {
+        "QueueConfigurations": [
+            {
+                "Id": "S3-to-SQS-Notification",
+                "QueueArn": sqs_queue_arn,
+                "Events": ["s3:ObjectCreated:*"],
+                "Filter": {
+                    "Key": {
+                        "FilterRules": [
+                            {"Name": "prefix", "Value": RAW_PREFIX},
+                            {"Name": "suffix", "Value": RAW_SUFFIX},
+                        ]
+                    }
+                },
+            }
+        ]
+    }
+
+    try:
+        s3_client.put_bucket_notification_configuration(
+            Bucket=S3_BUCKET_NAME,
+            NotificationConfiguration=s3_notification_config,
+        )
+        print(
+            "Configuração de notificação do S3 atualizada com sucesso. O trigger foi criado!"
+        )
+
+    except Exception as e:
+        print(f"Erro ao configurar a notificação do S3: {e}")
+        return
+
+    # --- Passo 4: Ligar a fila SQS ao consumidor escolhido ---
+    lambda_client = get_client("lambda", REGION_NAME)
+
+    if REFINE_CONSUMER == "worker":
+        # O worker faz long polling na fila: desliga as ligações com a Lambda para não disputar as mensagens
+        try:
+            mappings = lambda_client.list_event_source_mappings(EventSourceArn=sqs_queue_arn)["EventSourceMappings"]
+            for mapping in mappings:
+                if mapping["State"] not in ("Disabled", "Disabling"):
+                    lambda_client.update_event_source_mapping(UUID=mapping["UUID"], Enabled=False)
+                    print(f"Ligação {mapping['UUID']} da fila com a Lambda desativada.")
+            print(f"Fila pronta para o worker: python -m src.refine_worker --queue-url {sqs_queue_url}")
+        except Exception as e:
+            print(f"Erro ao desligar a fila SQS da Lambda: {e}")
+        return
+
+    # A Lambda (src/trigger_glue.py) recebe as notificações em lotes: uploads que chegam dentro da janela
+    # viram uma única execução do Glue Job. ReportBatchItemFailures permite devolver mensagens à fila.
+    try:
+        lambda_client.create_event_source_mapping(
+            EventSourceArn=sqs_queue_arn,
+            FunctionName=LAMBDA_FUNCTION_NAME,
+            BatchSize=100,
+            MaximumBatchingWindowInSeconds=60,
+            FunctionResponseTypes=["ReportBatchItemFailures"],
+        )
+        print("Fila SQS ligada à Lambda do Glue com sucesso.")
+
+    except Exception as e:
+        print(f"Erro ao ligar a fila SQS à Lambda: {e}")
+
 
-# Inicializar os clientes Boto3
-s3_client = boto3.client("s3", region_name=REGION_NAME)
-sqs_client = boto3.client("sqs", region_name=REGION_NAME)
-
-# --- Passo 1: Obter a URL e o ARN da fila SQS ---
-try:
-    response = sqs_client.get_queue_url(QueueName=SQS_QUEUE_NAME)
-    sqs_queue_url = response["QueueUrl"]
-
-    response = sqs_client.get_queue_attributes(
-        QueueUrl=sqs_queue_url, AttributeNames=["QueueArn"]
-    )
-    sqs_queue_arn = response["Attributes"]["QueueArn"]
-    print(f"ARN da fila SQS: {sqs_queue_arn}")
-
-except Exception as e:
-    print(f"Erro ao obter informações da fila SQS: {e}")
-    exit()
-
-
-# --- Passo 2: Definir a política de acesso da fila SQS ---
-# A política permite que o S3 envie mensagens para esta fila
-sqs_policy = {
-    "Version": "2012-10-17",
-    "Id": "SQS-S3-Policy",
-    "Statement": [
-        {
-            "Sid": "Allow-S3-to-send-messages",
-            "Effect": "Allow",
-            "Principal": {"Service": "s3.amazonaws.com"},
-            "Action": "sqs:SendMessage",
-            "Resource": sqs_queue_arn,
-            "Condition": {
-                "ArnEquals": {"aws:SourceArn": f"arn:aws:s3:::{S3_BUCKET_NAME}"}
-            },
-        }
-    ],
-}
-
-try:
-    sqs_client.set_queue_attributes(
-        QueueUrl=sqs_queue_url, Attributes={"Policy": json.dumps(sqs_policy)}
-    )
-    print("Política da fila SQS atualizada com sucesso.")
-
-except Exception as e:
-    print(f"Erro ao definir a política da fila SQS: {e}")
-    exit()
-
-
-# --- Passo 3: Configurar a notificação de evento no S3 ---
-# Esta configuração diz ao S3 para enviar uma notificação para a fila SQS
-# sempre que um objeto for criado.
-s3_notification_config = {
-    "QueueConfigurations": [
-        {
-            "Id": "S3-to-SQS-Notification",
-            "QueueArn": sqs_queue_arn,
-            "Events": ["s3:ObjectCreated:*"],
-        }
-    ]
-}
-
-try:
-    s3_client.put_bucket_notification_configuration(
-        Bucket=S3_BUCKET_NAME,
-        NotificationConfiguration=s3_notification_config,
-    )
-    print(
-        "Configuração de notificação do S3 atualizada com sucesso. O trigger foi criado!"
-    )
-
-except Exception as e:
-    print(f"Erro ao configurar a notificação do S3: {e}")
-    exit()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
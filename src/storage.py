@@ -0,0 +1,313 @@
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "aws_etl_projeto2_fiap.db")
+SQLITE_PAGE_SIZE = int(os.getenv("SQLITE_PAGE_SIZE", 500)) # Rows per page of the range queries
+
+PRAGMAS = {
+    "journal_mode": "WAL", # Readers never block the writer (and vice versa)
+    "synchronous": "NORMAL", # Safe with WAL; fsync only at checkpoints
+    "temp_store": "MEMORY",
+    "cache_size": -32_000, # KiB (negative) -> ~32 MB page cache
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5_000, # ms to wait for a lock instead of failing with 'database is locked'
+}
+
+# --- Timestamps ---
+
+def to_epoch(value: datetime | str | float | int | None = None) -> int:
+    """
+    Epoch seconds (UTC) of a timestamp. Naive datetimes and strings are local time, like datetime.today().
+    """
+    if value is None:
+        return int(time.time())
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+def from_epoch(seconds: pd.Series) -> pd.Series:
+    """
+    Converts an epoch column back to timezone-aware UTC datetimes.
+    """
+    return pd.to_datetime(seconds, unit="s", utc=True)
+
+# --- Migrations ---
+
+def _rebuild_with_epoch(conn: sqlite3.Connection, table: str, columns: str, copy_columns: str,
+                        local_time: bool = True) -> None:
+    """
+    Recreates `table` with data_hora as INTEGER epoch seconds, converting the TEXT values written so far.
+    `local_time` is False when the stored values carry their own UTC offset ('...+00:00').
+    """
+    modifier = ", 'utc'" if local_time else ""
+    conn.execute(f"CREATE TABLE {table}_new ({columns})")
+    conn.execute(
+        f"INSERT INTO {table}_new (id, {copy_columns}, data_hora) "
+        f"SELECT id, {copy_columns}, CAST(strftime('%s', data_hora{modifier}) AS INTEGER) FROM {table}"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+PREGAO_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cod TEXT NOT NULL,
+    acao TEXT,
+    tipo TEXT,
+    qtde_teorica INTEGER,
+    part_percent REAL,
+    data_hora INTEGER NOT NULL
+"""
+PRECO_BITCOIN_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_hora INTEGER NOT NULL,
+    preco_brl REAL
+"""
+PRECOS_CRIPTO_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    coin TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    price REAL,
+    last_updated_at INTEGER,
+    data_hora INTEGER NOT NULL
+"""
+
+def _migration_1(conn: sqlite3.Connection) -> None:
+    # Tables as created by scrapping_b3.py and bitoin_coin_gecko_api.py before this module existed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pregao_b3 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod TEXT, acao TEXT, tipo TEXT, qtde_teorica BIGINT, part_percent REAL, data_hora TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS preco_bitcoin (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, data_hora TEXT, preco_brl REAL
+        )
+    """)
+
+def _migration_2(conn: sqlite3.Connection) -> None:
+    _rebuild_with_epoch(conn, "pregao_b3", PREGAO_COLUMNS, "cod, acao, tipo, qtde_teorica, part_percent")
+    _rebuild_with_epoch(conn, "preco_bitcoin", PRECO_BITCOIN_COLUMNS, "preco_brl")
+
+def _migration_3(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pregao_b3_cod_data_hora ON pregao_b3 (cod, data_hora)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pregao_b3_data_hora ON pregao_b3 (data_hora)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_preco_bitcoin_data_hora ON preco_bitcoin (data_hora)")
+
+def _migration_4(conn: sqlite3.Connection) -> None:
+    # OHLC rollups of preco_bitcoin maintained by src/rollups.py; bucket is the epoch second the interval starts at
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS preco_bitcoin_ohlc (
+            resolution TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            open REAL, high REAL, low REAL, close REAL,
+            sum REAL NOT NULL,
+            count INTEGER NOT NULL,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            PRIMARY KEY (resolution, bucket)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_state (source TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+
+def _migration_5(conn: sqlite3.Connection) -> None:
+    # Ticks of src/price_poller.py; its SQLiteSink used to create the table itself with data_hora as ISO TEXT (UTC)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'precos_cripto'").fetchone()
+    if exists:
+        _rebuild_with_epoch(conn, "precos_cripto", PRECOS_CRIPTO_COLUMNS, "coin, currency, price, last_updated_at",
+                            local_time=False)
+    else:
+        conn.execute(f"CREATE TABLE precos_cripto ({PRECOS_CRIPTO_COLUMNS})")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_precos_cripto_coin_data_hora ON precos_cripto (coin, currency, data_hora)")
+
+# (version, description, function). Append only: the applied version is kept in PRAGMA user_version.
+MIGRATIONS = [
+    (1, "legacy pregao_b3 and preco_bitcoin tables", _migration_1),
+    (2, "data_hora as epoch seconds (UTC)", _migration_2),
+    (3, "indexes on (cod, data_hora) and (data_hora)", _migration_3),
+    (4, "preco_bitcoin_ohlc rollups and rollup_state watermark", _migration_4),
+    (5, "precos_cripto with data_hora as epoch seconds", _migration_5),
+]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Applies the pending migrations, each in its own transaction, and returns the resulting schema version.
+    """
+    current = schema_version(conn)
+    for version, description, function in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            function(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            logger.error(f"Migration {version} ({description}) failed.")
+            raise
+        logger.info(f"Applied migration {version}: {description}.")
+        current = version
+    return current
+
+# --- Connection ---
+
+def connect(db_path: str = SQLITE_DB_PATH, run_migrations: bool = True) -> sqlite3.Connection:
+    """
+    Opens the database with WAL and the tuned pragmas, migrated to the latest schema.
+    Transactions are explicit (isolation_level=None): use `with transaction(conn):` for writes.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if run_migrations:
+        migrate(conn)
+    return conn
+
+class transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT, rolled back on error. One transaction per batch keeps bulk loads fast.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+# --- Writes ---
+
+def bulk_load_pregao(conn: sqlite3.Connection, df: pd.DataFrame, data_hora: datetime | None = None) -> int:
+    """
+    Inserts a transformed B3 frame (etl.B3_SCHEMA columns) in a single transaction. Returns the row count.
+    """
+    epoch = to_epoch(data_hora)
+    rows = zip(
+        df["cod"].astype(str),
+        df["acao"].astype(str),
+        df["tipo"].astype(str),
+        df["qtde_teorica"].astype("int64").tolist(),
+        df["part_teorica_porc"].astype("float64").tolist(),
+        [epoch] * len(df),
+    )
+    with transaction(conn):
+        conn.executemany(
+            "INSERT INTO pregao_b3 (cod, acao, tipo, qtde_teorica, part_percent, data_hora) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    logger.info(f"Inserted {len(df)} row(s) into pregao_b3.")
+    return len(df)
+
+def insert_btc_prices(conn: sqlite3.Connection, prices: list[tuple[datetime | float, float]]) -> int:
+    """
+    Inserts (timestamp, preco_brl) pairs in a single transaction.
+    """
+    with transaction(conn):
+        conn.executemany(
+            "INSERT INTO preco_bitcoin (data_hora, preco_brl) VALUES (?, ?)",
+            [(to_epoch(timestamp), float(price)) for timestamp, price in prices],
+        )
+    return len(prices)
+
+def insert_crypto_prices(conn: sqlite3.Connection,
+                         prices: list[tuple[str, str, float, int | None, datetime | float]]) -> int:
+    """
+    Inserts (coin, currency, price, last_updated_at, timestamp) rows into precos_cripto in a single transaction.
+    """
+    with transaction(conn):
+        conn.executemany(
+            "INSERT INTO precos_cripto (coin, currency, price, last_updated_at, data_hora) VALUES (?, ?, ?, ?, ?)",
+            [(coin, currency, float(price), last_updated_at, to_epoch(timestamp))
+             for coin, currency, price, last_updated_at, timestamp in prices],
+        )
+    return len(prices)
+
+# --- Range Queries ---
+
+def _paginate(conn: sqlite3.Connection, sql: str, params: list, columns: list[str],
+              page_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Keyset pagination on (data_hora, id): every page is an index range scan, never an OFFSET skip.
+    """
+    last = (-1, -1)
+    while True:
+        rows = conn.execute(sql, [*params, *last, page_size]).fetchall()
+        if not rows:
+            return
+        page = pd.DataFrame(rows, columns=columns)
+        page["data_hora"] = from_epoch(page["data_hora"])
+        yield page
+        if len(rows) < page_size:
+            return
+        last = (rows[-1][columns.index("data_hora")], rows[-1][columns.index("id")])
+
+def iter_btc_history(conn: sqlite3.Connection, days: float = 7, until: datetime | None = None,
+                     page_size: int = SQLITE_PAGE_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Bitcoin prices of the last `days` days, oldest first, one page at a time.
+    """
+    end = until or datetime.now()
+    sql = """
+        SELECT id, data_hora, preco_brl FROM preco_bitcoin
+        WHERE data_hora >= ? AND data_hora <= ? AND (data_hora, id) > (?, ?)
+        ORDER BY data_hora, id LIMIT ?
+    """
+    params = [to_epoch(end - timedelta(days=days)), to_epoch(end)]
+    return _paginate(conn, sql, params, ["id", "data_hora", "preco_brl"], page_size)
+
+def iter_pregao_history(conn: sqlite3.Connection, cod: str | None = None, days: float = 30,
+                        until: datetime | None = None, page_size: int = SQLITE_PAGE_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Portfolio rows of the last `days` days, for one code (idx_pregao_b3_cod_data_hora) or all of them
+    (idx_pregao_b3_data_hora), oldest first, one page at a time.
+    """
+    end = until or datetime.now()
+    where = "cod = ? AND " if cod else ""
+    sql = f"""
+        SELECT id, cod, acao, tipo, qtde_teorica, part_percent, data_hora FROM pregao_b3
+        WHERE {where}data_hora >= ? AND data_hora <= ? AND (data_hora, id) > (?, ?)
+        ORDER BY data_hora, id LIMIT ?
+    """
+    params = ([cod] if cod else []) + [to_epoch(end - timedelta(days=days)), to_epoch(end)]
+    columns = ["id", "cod", "acao", "tipo", "qtde_teorica", "part_percent", "data_hora"]
+    return _paginate(conn, sql, params, columns, page_size)
+
+def latest_btc_prices(conn: sqlite3.Connection, limit: int = 10) -> pd.DataFrame:
+    """
+    The `limit` most recent prices, newest first (reads the tail of idx_preco_bitcoin_data_hora).
+    """
+    rows = conn.execute(
+        "SELECT id, data_hora, preco_brl FROM preco_bitcoin ORDER BY data_hora DESC, id DESC LIMIT ?", (limit,)
+    ).fetchall()
+    df = pd.DataFrame(rows, columns=["id", "data_hora", "preco_brl"])
+    df["data_hora"] = from_epoch(df["data_hora"])
+    return df
+
+# --- Main Execution Flow ---
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    connection = connect()
+    logger.info(f"'{SQLITE_DB_PATH}' is at schema version {schema_version(connection)}.")
+    print(latest_btc_prices(connection))
+    connection.close()
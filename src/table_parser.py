@@ -0,0 +1,86 @@
+import logging
+
+import lxml.html
+import pandas as pd
+
+# --- Configuration & Setup ---
+
+logger = logging.getLogger(__name__)
+
+# Column headers of the B3 portfolio table and the dtype each one is built with.
+# The numbers stay as the text shown on the page ('476.976.044', '0,495'); transform_b3_data owns their
+# locale-aware conversion.
+RAW_DTYPES = {
+    "Código": "object",
+    "Ação": "object",
+    "Tipo": "object",
+    "Qtde. Teórica": "object",
+    "Part. (%)": "object",
+}
+
+# Returns [headers, rows] for the first table with a 'Código' header, reading only the header and tbody cells
+TABLE_ROWS_SCRIPT = """
+const tables = document.querySelectorAll('table.table');
+for (const table of tables) {
+    const headers = Array.from(table.querySelectorAll('thead th'), th => th.textContent.trim());
+    if (!headers.includes('Código')) { continue; }
+    const rows = Array.from(table.querySelectorAll('tbody tr'),
+        tr => Array.from(tr.querySelectorAll('td'), td => td.textContent.trim()));
+    return [headers, rows];
+}
+return null;
+"""
+
+# --- Table Extraction ---
+
+def extract_table_rows(driver) -> tuple[list[str], list[list[str]]] | None:
+    """
+    Pulls the header and body cell text of the B3 table in a single execute_script round trip.
+    """
+    result = driver.execute_script(TABLE_ROWS_SCRIPT)
+    if not result:
+        return None
+    headers, rows = result
+    return headers, rows
+
+def parse_table_html(html: str, match: str = "Código") -> tuple[list[str], list[list[str]]] | None:
+    """
+    Parses only the <table> fragment that contains `match`, instead of the whole page.
+    """
+    position = html.find(match)
+    if position == -1:
+        return None
+    start = html.rfind("<table", 0, position)
+    end = html.find("</table>", position)
+    if start == -1 or end == -1:
+        return None
+
+    table = lxml.html.fragment_fromstring(html[start:end + len("</table>")])
+    headers = [th.text_content().strip() for th in table.iterfind(".//thead//th")]
+    rows = [
+        [td.text_content().strip() for td in tr.iterfind("td")]
+        for tr in table.iterfind(".//tbody/tr")
+    ]
+    return headers, rows
+
+# --- DataFrame Construction ---
+
+def rows_to_dataframe(headers: list[str], rows: list[list[str]]) -> pd.DataFrame:
+    """
+    Builds the raw B3 DataFrame column by column with explicit dtypes.
+    """
+    rows = [row for row in rows if len(row) == len(headers)] # Drops placeholder rows such as 'no data'
+    columns = list(zip(*rows)) if rows else [()] * len(headers)
+
+    data = {header: pd.Series(values, dtype=RAW_DTYPES.get(header, "object"), name=header)
+            for header, values in zip(headers, columns)}
+    return pd.DataFrame(data, columns=headers)
+
+def read_b3_table(html: str) -> pd.DataFrame | None:
+    """
+    Fast replacement for pd.read_html(html, match='Código', attrs={'class': 'table'}, thousands=None)[0]: cells stay text.
+    """
+    parsed = parse_table_html(html)
+    if parsed is None:
+        return None
+    return rows_to_dataframe(*parsed)
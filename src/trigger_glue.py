@@ -1,29 +1,110 @@
-import boto3
+import json
 import os
+import re
 import sys
+from urllib.parse import unquote_plus
+
+from src.aws_clients import get_client
+
+# Partição diária dentro da chave do objeto: .../ano=2025/mes=08/dia=02/...
+PARTITION_PATTERN = re.compile(r"ano=(\d{4})/mes=(\d{2})/dia=(\d{2})")
+GLUE_FOLLOW_UP_DELAY_SECONDS = int(os.environ.get("GLUE_FOLLOW_UP_DELAY_SECONDS", 300)) # Máximo do SQS: 900
+
+def partitions_from_key(key: str) -> str | None:
+    """
+    'raw/ano=2025/mes=08/dia=02/b3_dados_brutos.parquet' -> '2025-08-02'.
+    """
+    match = PARTITION_PATTERN.search(unquote_plus(key))
+    return "-".join(match.groups()) if match else None
+
+def collect_partitions(event: dict) -> tuple[set[str], list[str]]:
+    """
+    Reúne as partições afetadas por um evento, que pode ser:
+    - um lote do SQS com notificações do S3 no corpo (ver src/sqs.py);
+    - uma mensagem de follow-up enviada por este handler ({"partitions": [...]});
+    - uma notificação direta do S3 (gatilho antigo).
+    Retorna as partições e os messageIds do SQS presentes no lote.
+    """
+    partitions, message_ids = set(), []
+    for record in event.get("Records", []):
+        if record.get("eventSource") == "aws:sqs":
+            message_ids.append(record["messageId"])
+            body = json.loads(record["body"])
+            if "partitions" in body:
+                partitions.update(body["partitions"])
+                continue
+            s3_records = body.get("Records", []) # s3:TestEvent não tem Records
+        else:
+            s3_records = [record]
+        for s3_record in s3_records:
+            key = s3_record.get("s3", {}).get("object", {}).get("key", "")
+            partition = partitions_from_key(key)
+            if partition:
+                partitions.add(partition)
+    return partitions, message_ids
+
+def queue_follow_up(partitions: list[str]) -> bool:
+    """
+    Reenfileira as partições em uma única mensagem atrasada, para que uma nova execução as processe
+    quando o job atual terminar. Retorna False se a fila não estiver configurada.
+    """
+    queue_url = os.environ.get("GLUE_TRIGGER_QUEUE_URL")
+    if not queue_url:
+        return False
+    get_client('sqs').send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps({"partitions": partitions}),
+        DelaySeconds=min(GLUE_FOLLOW_UP_DELAY_SECONDS, 900),
+    )
+    return True
 
 def lambda_handler(event, context):
+    """
+    Inicia uma única execução do Glue Job por lote de eventos, com as partições afetadas em '--partitions'.
+
+    Com a fila SQS como origem (BatchSize e MaximumBatchingWindowInSeconds na event source mapping),
+    rajadas de uploads viram um único lote e, portanto, uma única execução. Se o job já estiver rodando,
+    as partições são reenfileiradas para uma execução seguinte em vez de descartadas.
+    """
     glue_job_name = os.environ.get('ETL_glue_pregao_B3')
 
     if not glue_job_name:
         print("ERRO: A variável de ambiente 'ETL_glue_pregao_B3' não foi definida.")
         sys.exit(1) # Encerra a função com falha
 
-    client = boto3.client('glue')
+    partitions, message_ids = collect_partitions(event)
+    if not partitions:
+        print("Nenhuma partição no evento. Nada a fazer.")
+        return {'statusCode': 200, 'body': "Nenhuma partição afetada.", 'batchItemFailures': []}
+
+    partition_list = sorted(partitions)
+    client = get_client('glue') # Cached, reused by warm Lambda containers
 
     try:
-        response = client.start_job_run(JobName=glue_job_name)
-        print(f"Sucesso! Iniciado o Glue Job '{glue_job_name}'. JobRunId: {response['JobRunId']}")
+        response = client.start_job_run(JobName=glue_job_name, Arguments={'--partitions': ",".join(partition_list)})
+        print(f"Sucesso! Iniciado o Glue Job '{glue_job_name}' para {len(partition_list)} partição(ões). "
+              f"JobRunId: {response['JobRunId']}")
         return {
             'statusCode': 200,
-            'body': f"Job {glue_job_name} iniciado com sucesso."
+            'body': f"Job {glue_job_name} iniciado com sucesso.",
+            'batchItemFailures': [],
         }
     except client.exceptions.ConcurrentRunsExceededException:
-        print(f"AVISO: O job '{glue_job_name}' já está em execução.")
+        if queue_follow_up(partition_list):
+            print(f"AVISO: O job '{glue_job_name}' já está em execução. "
+                  f"{len(partition_list)} partição(ões) reenfileirada(s) para a próxima execução.")
+            return {
+                'statusCode': 200,
+                'body': f"Job {glue_job_name} já estava em execução. Partições reenfileiradas.",
+                'batchItemFailures': [],
+            }
+        # Sem fila de follow-up: devolve as mensagens ao SQS (requer ReportBatchItemFailures)
+        print(f"AVISO: O job '{glue_job_name}' já está em execução. As mensagens voltarão para a fila.")
         return {
-            'statusCode': 200, # Retorna sucesso para não reprocessar o gatilho
-            'body': f"Job {glue_job_name} já estava em execução."
+            'statusCode': 200,
+            'body': f"Job {glue_job_name} já estava em execução.",
+            'batchItemFailures': [{'itemIdentifier': message_id} for message_id in message_ids],
         }
     except Exception as e:
         print(f"Erro ao iniciar o Glue Job: {e}")
-        raise e
\ No newline at end of file
+        raise e
@@ -1,40 +1,255 @@
+import argparse
+import glob
+import hashlib
+import io
+import json
+import logging
 import os
-from datetime import datetime
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, datetime
+
 import boto3
-from io import BytesIO
-import pandas as pd
-import logging
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 
+from src.aws_clients import AWS_REGION, get_client
+from src.dataset import concat_day_tables, load_manifest, manifest_path, read_day_table, resolve_root
+from src.s3_paths import bucket_name, build_s3_path
+
+# Backfill of the days collected locally (while we had no AWS Lab access) into the S3 raw layout
 
-# Criando codigo para upload os dados de datas antigas para o S3 enquanto estavamos sem acesso ao AWS Lab
-# SOMENTE ESQUELETO, ESTA IMCOMPLETO
+# --- Configuration & Setup ---
 
-# Carregar variáveis de ambiente
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
-data_hoje = datetime.today()
-caminho_s3 = f"raw/ano={data_hoje.year}/mes={data_hoje.month:02d}/dia={data_hoje.day:02d}/b3_dados_brutos.parquet"
-
-# create client
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    aws_session_token=aws_session_token,
-    region_name='us-east-1'
-)
-
-try:
-    buffer_parquet.seek(0)
-    
-    s3_client.put_object(
-        Bucket=nome_bucket, Key=caminho_s3, Body=buffer_parquet.getvalue()
-    )
-    
-    logging.info(f"Upload para s3://{nome_bucket}/{caminho_s3} concluído.")
-except Exception as e:
-    logging.error(f"Erro no upload para o S3: {e}")
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+BACKFILL_ROOT = os.getenv("BACKFILL_ROOT", "raw/pregao_b3")
+BACKFILL_BUCKET = os.getenv("BACKFILL_BUCKET", bucket_name)
+BACKFILL_PREFIX = os.getenv("BACKFILL_PREFIX", "raw")
+BACKFILL_FILENAME = os.getenv("BACKFILL_FILENAME", "b3_dados_brutos.parquet")
+BACKFILL_MAX_WORKERS = int(os.getenv("BACKFILL_MAX_WORKERS", 16)) # Stay below AWS_MAX_POOL_CONNECTIONS
+BACKFILL_CHECKPOINT = os.getenv("BACKFILL_CHECKPOINT", ".backfill_checkpoint.jsonl")
+
+CONTENT_MD5_METADATA = "content-md5" # x-amz-meta-content-md5: compares multipart objects, whose ETag is not an MD5
+
+DAY_PATTERN = re.compile(r"ano=(\d{4})[/\\]mes=(\d{2})[/\\]dia=(\d{2})")
+
+# --- Discovery ---
+
+@dataclass
+class LocalPartition:
+    """
+    One local day and the S3 key it is uploaded to. A day is either a single dia=DD.parquet file or a
+    dia=DD/ directory of part files (see src/rolling_parquet.py), which is merged into one object.
+    Days of a month rewritten by src/compaction.py have `root` set: their rows are cut out of the compacted
+    file (plus any daily file it does not replace yet) through the manifest.
+    """
+    day: date
+    paths: list[str]
+    key: str
+    root: str | None = None
+
+    @property
+    def fingerprint(self) -> str:
+        stats = [os.stat(path) for path in self.paths]
+        return ";".join(f"{path}|{stat.st_size}|{stat.st_mtime_ns}" for path, stat in zip(self.paths, stats))
+
+    def payload(self) -> bytes:
+        if self.root is not None:
+            filesystem, root = resolve_root(self.root)
+            table = read_day_table(filesystem, root, self.day)
+            buffer = io.BytesIO()
+            pq.write_table(table.drop_columns(["data"]), buffer, compression="snappy")
+            return buffer.getvalue()
+        if len(self.paths) == 1:
+            with open(self.paths[0], "rb") as file:
+                return file.read()
+        table = concat_day_tables([pq.read_table(path, partitioning=None) for path in self.paths])
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression="snappy")
+        return buffer.getvalue()
+
+def discover_partitions(root: str, prefix: str = BACKFILL_PREFIX, filename: str = BACKFILL_FILENAME,
+                        start: date | None = None, end: date | None = None) -> list[LocalPartition]:
+    """
+    Finds the local day partitions under `root` and maps them onto '<prefix>/ano=/mes=/dia=/<filename>' keys.
+    """
+    days: dict[date, list[str]] = {}
+    patterns = [os.path.join(root, "ano=*", "mes=*", "dia=*.parquet"), os.path.join(root, "ano=*", "mes=*", "dia=*", "*.parquet")]
+    for path in sorted(path for pattern in patterns for path in glob.glob(pattern)):
+        match = DAY_PATTERN.search(path)
+        if not match:
+            continue
+        day = date(*(int(part) for part in match.groups()))
+        if (start and day < start) or (end and day > end):
+            continue
+        days.setdefault(day, []).append(path)
+
+    compacted = compacted_days(root, start, end)
+    for day, (compacted_path, replaced) in compacted.items():
+        # The compacted file stands in for the daily files it replaces (usually already purged)
+        days[day] = [compacted_path] + [path for path in days.get(day, []) if os.path.abspath(path) not in replaced]
+    if compacted:
+        logger.info(f"{len(compacted)} day(s) are read from compacted months.")
+
+    partitions = []
+    for day, paths in sorted(days.items()):
+        key = build_s3_path(prefix, None, datetime(day.year, day.month, day.day), filename)
+        partitions.append(LocalPartition(day, paths, key, root if day in compacted else None))
+    return partitions
+
+def compacted_days(root: str, start: date | None = None, end: date | None = None) -> dict[date, tuple[str, set[str]]]:
+    """
+    Days held by the compacted month files of the manifest, each with its compacted file and the daily
+    files that file replaces.
+    """
+    filesystem, path = resolve_root(root)
+    days = {}
+    for month, entry in sorted(load_manifest(filesystem, path)["months"].items()):
+        compacted_path = manifest_path(path, entry["file"])
+        if not os.path.exists(compacted_path):
+            logger.warning(f"Compacted file of {month} is missing: '{compacted_path}'. Its days are skipped.")
+            continue
+        replaced = {manifest_path(path, file) for file in entry["replaces"]}
+        for day in pq.read_table(compacted_path, columns=["data"]).column("data").unique().to_pylist():
+            if (start and day < start) or (end and day > end):
+                continue
+            days[day] = (compacted_path, replaced)
+    return days
+
+# --- Checkpoint ---
+
+class Checkpoint:
+    """
+    Append-only JSON lines of finished uploads. A partition is skipped on resume while its local files keep
+    the fingerprint (paths, sizes, mtimes) recorded when it was uploaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                line = ""
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue # Last line of an interrupted write
+                    self.done[entry["key"]] = entry["fingerprint"]
+            if line and not line.endswith("\n"):
+                with open(path, "a", encoding="utf-8") as file:
+                    file.write("\n") # Otherwise the next entry is appended to the cut line and lost with it
+
+    def is_done(self, partition: LocalPartition) -> bool:
+        return self.done.get(partition.key) == partition.fingerprint
+
+    def mark(self, partition: LocalPartition, md5: str) -> None:
+        entry = {"key": partition.key, "fingerprint": partition.fingerprint, "md5": md5,
+                 "uploaded_at": datetime.now().isoformat(timespec="seconds")}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+            self.done[partition.key] = partition.fingerprint
+
+# --- Upload ---
+
+def list_remote_objects(s3_client: boto3.client, bucket: str, prefix: str) -> dict[str, tuple[int, str]]:
+    """
+    Size and ETag of every object under `prefix`, with one paginated listing instead of a HEAD per key.
+    """
+    objects = {}
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=f"{prefix}/"):
+        for item in page.get("Contents", []):
+            objects[item["Key"]] = (item["Size"], item["ETag"].strip('"'))
+    return objects
+
+def upload_partition(s3_client: boto3.client, bucket: str, partition: LocalPartition,
+                     remote: tuple[int, str] | None) -> tuple[str, str]:
+    """
+    Uploads one partition unless S3 already holds the same bytes. Returns (status, md5).
+    """
+    payload = partition.payload()
+    md5 = hashlib.md5(payload).hexdigest()
+    if remote is not None and remote[0] == len(payload) and _same_content(s3_client, bucket, partition.key, remote[1], md5):
+        return "unchanged", md5
+    s3_client.put_object(Bucket=bucket, Key=partition.key, Body=payload, Metadata={CONTENT_MD5_METADATA: md5})
+    return "uploaded", md5
+
+def _same_content(s3_client: boto3.client, bucket: str, key: str, etag: str, md5: str) -> bool:
+    """
+    Single-part ETags are the MD5 of the object. Multipart ones ('<hash>-<parts>') are not, so the MD5 stored
+    in the object metadata is used; objects uploaded without it cannot be compared and are uploaded again
+    (a matching size says nothing about the bytes).
+    """
+    if "-" not in etag:
+        return etag == md5
+    stored = s3_client.head_object(Bucket=bucket, Key=key).get("Metadata", {}).get(CONTENT_MD5_METADATA)
+    if stored is None:
+        logger.warning(f"'{key}' is a multipart object without {CONTENT_MD5_METADATA} metadata; uploading it again.")
+        return False
+    return stored == md5
+
+def backfill(s3_client: boto3.client, partitions: list[LocalPartition], bucket: str = BACKFILL_BUCKET,
+             prefix: str = BACKFILL_PREFIX, checkpoint_path: str = BACKFILL_CHECKPOINT,
+             max_workers: int = BACKFILL_MAX_WORKERS, dry_run: bool = False) -> dict[str, int]:
+    """
+    Uploads the partitions on a bounded thread pool and returns a count per status.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = [partition for partition in partitions if not checkpoint.is_done(partition)]
+    counts = {"checkpointed": len(partitions) - len(pending), "uploaded": 0, "unchanged": 0, "failed": 0}
+    logger.info(f"{len(partitions)} local partition(s), {len(pending)} left after the checkpoint.")
+    if dry_run or not pending:
+        for partition in pending[:20]:
+            logger.info(f"Would upload {partition.paths} -> s3://{bucket}/{partition.key}")
+        return counts
+
+    remote = list_remote_objects(s3_client, bucket, prefix)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backfill") as executor:
+        futures = {executor.submit(upload_partition, s3_client, bucket, partition, remote.get(partition.key)): partition
+                   for partition in pending}
+        for number, future in enumerate(as_completed(futures), start=1):
+            partition = futures[future]
+            try:
+                status, md5 = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                logger.error(f"Failed to upload {partition.day} to '{partition.key}': {e}")
+                continue
+            counts[status] += 1
+            checkpoint.mark(partition, md5)
+            if number % 500 == 0 or number == len(pending):
+                logger.info(f"Progress: {number}/{len(pending)} ({counts})")
+    return counts
+
+# --- Main Execution Flow ---
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Backfills local day partitions into the S3 raw layout.")
+    parser.add_argument("--root", default=BACKFILL_ROOT, help="Local dataset (raw/pregao_b3, parquet_arq/preco_bitcoin, ...).")
+    parser.add_argument("--bucket", default=BACKFILL_BUCKET)
+    parser.add_argument("--prefix", default=BACKFILL_PREFIX)
+    parser.add_argument("--filename", default=BACKFILL_FILENAME, help="Object name inside each dia= partition.")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to upload (YYYY-MM-DD).")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to upload (YYYY-MM-DD).")
+    parser.add_argument("--max-workers", type=int, default=BACKFILL_MAX_WORKERS)
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT)
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be uploaded.")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    partitions = discover_partitions(args.root, args.prefix, args.filename, args.start, args.end)
+    s3_client = get_client("s3", AWS_REGION)
+    counts = backfill(s3_client, partitions, args.bucket, args.prefix, args.checkpoint, args.max_workers, args.dry_run)
+    logger.info(f"Backfill finished: {counts}")
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+import pytest
+
+from src.benchmarks import LAMBDA_IMPORT_BUDGET_MS, STARTUP_BUDGET_MS, _startup_probe
+
+# Modules that used to configure the root logger when imported
+SCRIPT_MODULES = [
+    "src.benchmarks", "src.bitoin_coin_gecko_api", "src.compaction", "src.etl", "src.firehose_converter",
+    "src.query", "src.query_db", "src.refine_job", "src.refine_worker", "src.scrapping_b3", "src.upload_buckets",
+]
+
+
+def _fresh(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def _import_ms(module: str, repeat: int = 3) -> float:
+    """
+    Best of `repeat` cold imports of `module`, each in a new interpreter.
+    """
+    code = f"import time\nstarted = time.perf_counter()\nimport {module}\nprint((time.perf_counter() - started) * 1000)"
+    return min(float(_fresh(code)) for _ in range(repeat))
+
+
+@pytest.mark.parametrize("module, budget_ms", [("src.cli", STARTUP_BUDGET_MS), ("src.trigger_glue", LAMBDA_IMPORT_BUDGET_MS)])
+def test_import_time_within_budget(module, budget_ms):
+    assert _import_ms(module) <= budget_ms
+
+
+def test_cli_help_loads_no_heavy_module():
+    assert _startup_probe("import src.cli; src.cli.build_parser().format_help()") == []
+
+
+def test_importing_scripts_leaves_logging_unconfigured():
+    imports = "\n".join(f"import {module}" for module in SCRIPT_MODULES)
+    assert _fresh(f"import logging\n{imports}\nprint(len(logging.getLogger().handlers))") == "0"
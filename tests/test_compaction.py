@@ -0,0 +1,47 @@
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.compaction import compact_month
+from src.dataset import read_pregao_table
+
+
+def _write_mixed_month(root) -> None:
+    month = root / "ano=2025" / "mes=08"
+    month.mkdir(parents=True)
+    pq.write_table(pa.table({"cod": ["VALE3", "PETR4"], "acao": ["VALE", "PETROBRAS"], "tipo": ["ON NM", "PN N2"],
+                             "qtde_teorica": [20, 10], "part_teorica_porc": [2.5, 1.5]}), month / "dia=01.parquet")
+    pd.DataFrame({"cod": ["PETR4"], "acao": ["PETROBRAS"], "tipo": pd.Categorical(["PN N2"]),
+                  "qtde_teorica": [11], "part_teorica_porc": [1.6]}).to_parquet(month / "dia=04.parquet", index=False)
+
+
+def test_month_crossing_the_tipo_change_is_compacted(tmp_path):
+    root = tmp_path / "raw"
+    _write_mixed_month(root)
+    before = read_pregao_table(date(2025, 8, 1), date(2025, 8, 31), root=str(root))
+
+    entry = compact_month(2025, 8, str(root))
+
+    compacted = pq.read_table(root / entry["file"])
+    assert entry["rows"] == 3
+    assert compacted.schema.field("tipo").type == pa.string()
+    assert compacted.column("cod").to_pylist() == ["PETR4", "PETR4", "VALE3"]
+    after = read_pregao_table(date(2025, 8, 1), date(2025, 8, 31), root=str(root))
+    assert after.sort_by([("data", "ascending"), ("cod", "ascending")]).equals(
+        before.sort_by([("data", "ascending"), ("cod", "ascending")]))
+
+
+def test_readers_listing_the_tree_do_not_see_the_compacted_file(tmp_path):
+    root = tmp_path / "raw"
+    _write_mixed_month(root)
+
+    entry = compact_month(2025, 8, str(root))
+
+    assert entry["file"].startswith("_compacted/ano=2025/mes=08/")
+    # Daily files are still there (grace period); a plain listing must not add the compacted rows to them
+    listed = ds.dataset(str(root), format="parquet", partitioning="hive").to_table()
+    assert listed.num_rows == 3
+    assert "data" not in listed.column_names
@@ -0,0 +1,59 @@
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.dataset import concat_day_tables, read_day_table, read_pregao, read_pregao_table, resolve_root
+from src.query import QueryEngine, ResultCache
+
+
+def _write_mixed_days(root) -> None:
+    """
+    One day as written before `tipo` became a category (plain string) and one written with the category
+    (dictionary<string> in Parquet), in the same month.
+    """
+    month = root / "ano=2025" / "mes=08"
+    month.mkdir(parents=True)
+    pq.write_table(pa.table({"cod": ["PETR4", "VALE3"], "acao": ["PETROBRAS", "VALE"], "tipo": ["PN N2", "ON NM"],
+                             "qtde_teorica": [10, 20], "part_teorica_porc": [1.5, 2.5]}), month / "dia=01.parquet")
+    pd.DataFrame({"cod": ["PETR4"], "acao": ["PETROBRAS"], "tipo": pd.Categorical(["PN N2"]),
+                  "qtde_teorica": [11], "part_teorica_porc": [1.6]}).to_parquet(month / "dia=04.parquet", index=False)
+
+
+def test_concat_day_tables_decodes_dictionaries_and_promotes_types():
+    legacy = pa.table({"tipo": ["ON"], "qtde_teorica": pa.array([1], pa.int32())})
+    new = pa.table({"tipo": pa.array(["PN"]).dictionary_encode(), "qtde_teorica": [2], "extra": [True]})
+
+    table = concat_day_tables([legacy, new])
+
+    assert table.schema.field("tipo").type == pa.string()
+    assert table.schema.field("qtde_teorica").type == pa.int64()
+    assert table.column("extra").to_pylist() == [None, True]
+
+
+def test_range_mixing_legacy_and_new_days_reads_as_one_schema(tmp_path):
+    root = tmp_path / "raw"
+    _write_mixed_days(root)
+
+    table = read_pregao_table(date(2025, 8, 1), date(2025, 8, 4), root=str(root))
+
+    assert table.schema.field("tipo").type == pa.string()
+    assert table.column("tipo").to_pylist() == ["PN N2", "ON NM", "PN N2"]
+    assert read_pregao(date(2025, 8, 1), date(2025, 8, 4), codes=["PETR4"], columns=["tipo"],
+                       root=str(root))["tipo"].tolist() == ["PN N2", "PN N2"]
+    filesystem, path = resolve_root(str(root))
+    assert read_day_table(filesystem, path, date(2025, 8, 4)).schema.field("tipo").type == pa.string()
+
+
+@pytest.mark.parametrize("sql", ["SELECT * FROM raw_pregao", "SELECT tipo, data FROM raw_pregao"])
+def test_raw_view_over_mixed_days(tmp_path, sql):
+    root = tmp_path / "raw"
+    _write_mixed_days(root)
+    engine = QueryEngine(str(root), str(tmp_path / "refined"), str(tmp_path / "none.db"), ResultCache())
+
+    result = engine.query(sql, date(2025, 8, 1), date(2025, 8, 4))
+
+    assert sorted(zip(result["data"], result["tipo"])) == [("2025-08-01", "ON NM"), ("2025-08-01", "PN N2"),
+                                                          ("2025-08-04", "PN N2")]
@@ -0,0 +1,54 @@
+import io
+
+import boto3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from moto import mock_aws
+
+from src.etl import transform_b3_data, upload_dataframe_to_s3
+
+BUCKET = "bucket-test"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _raw_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Código": ["PETR4", "VALE3", "Quantidade Teórica Total"],
+        "Ação": ["PETROBRAS", "VALE", ""],
+        "Tipo": ["PN N2", "ON NM", ""],
+        "Qtde. Teórica": ["4.566.995.139", "4.196.924.316", "99.999.999"],
+        "Part. (%)": ["7,823", "10,520", "100,000"],
+    })
+
+
+def test_transform_keeps_tipo_as_a_category_in_memory():
+    df = transform_b3_data(_raw_frame())
+
+    assert df["cod"].tolist() == ["PETR4", "VALE3"]
+    assert df["qtde_teorica"].tolist() == [4566995139, 4196924316]
+    assert df["part_teorica_porc"].tolist() == [7.823, 10.52]
+    assert df["tipo"].dtype == "category"
+
+
+def test_uploaded_parquet_stores_tipo_as_string_like_legacy_files(s3_client):
+    key = upload_dataframe_to_s3(s3_client, transform_b3_data(_raw_frame()), BUCKET, skip_unchanged=False, delta=False)
+
+    new_day = pq.read_table(io.BytesIO(s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read()))
+    assert new_day.schema.field("tipo").type == pa.string()
+
+    legacy_day = pa.table({"cod": ["ITUB4"], "acao": ["ITAUUNIBANCO"], "tipo": ["PN N1"],
+                           "qtde_teorica": [4801593832], "part_teorica_porc": [8.4]})
+    merged = pa.concat_tables([legacy_day, new_day.select(legacy_day.column_names)])
+    assert merged.column("tipo").to_pylist() == ["PN N1", "PN N2", "ON NM"]
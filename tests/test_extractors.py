@@ -0,0 +1,97 @@
+import base64
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import requests
+
+from src import extractors
+from src.etl import transform_b3_data
+from src.extractors import build_portfolio_api_url, extract_b3_data, extract_b3_data_api, parse_b3_url
+from src.table_parser import read_b3_table
+
+FIXTURES = Path(__file__).parent / "fixtures"
+IBOV_URL = "https://sistemaswebb3-listados.b3.com.br/indexPage/day/IBOV?language=pt-br"
+# Day the fixtures were recorded, as committed in the raw dataset
+EXPECTED = pd.read_parquet(Path(__file__).parents[1] / "raw/pregao_b3/ano=2025/mes=08/dia=01.parquet")
+
+
+class _Response:
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.status_code = 200
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return self.payload
+
+
+class RecordedSession(requests.Session):
+    """
+    Serves the recorded indexProxy pages, picked by the pageNumber of the base64 query in the URL.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        query = json.loads(base64.b64decode(url.rsplit("/", 1)[1]))
+        self.requested.append(query)
+        page = FIXTURES / f"b3_portfolio_ibov_day_page{query['pageNumber']}.json"
+        return _Response(json.loads(page.read_text(encoding="utf-8")))
+
+
+def _assert_matches_recorded_day(raw: pd.DataFrame) -> None:
+    transformed = transform_b3_data(raw).reset_index(drop=True)
+    assert transformed["cod"].tolist() == EXPECTED["cod"].tolist()
+    assert transformed["qtde_teorica"].tolist() == EXPECTED["qtde_teorica"].tolist()
+    assert transformed["part_teorica_porc"].tolist() == pytest.approx(EXPECTED["part_teorica_porc"].round(3).tolist())
+
+
+def test_parse_b3_url():
+    assert parse_b3_url(IBOV_URL) == ("IBOV", "day")
+    with pytest.raises(ValueError):
+        parse_b3_url("https://example.com/other")
+
+
+def test_api_url_encodes_the_query():
+    url = build_portfolio_api_url("IBOV", "day", page_number=2, page_size=50)
+    query = json.loads(base64.b64decode(url.rsplit("/", 1)[1]))
+    assert "/GetPortfolioDay/" in url
+    assert query == {"language": "pt-br", "pageNumber": 2, "pageSize": 50, "index": "IBOV", "segment": "1"}
+
+
+def test_api_extractor_fetches_every_page():
+    session = RecordedSession()
+
+    raw = extract_b3_data_api(IBOV_URL, session=session, page_size=50)
+
+    assert sorted(query["pageNumber"] for query in session.requested) == [1, 2]
+    assert list(raw.columns) == list(extractors.RAW_COLUMNS.values())
+    _assert_matches_recorded_day(raw)
+
+
+def test_dom_parser_matches_the_api_extractor():
+    html = (FIXTURES / "b3_index_page_ibov.html").read_text(encoding="utf-8")
+
+    raw = read_b3_table(html)
+
+    _assert_matches_recorded_day(raw)
+    api = transform_b3_data(extract_b3_data_api(IBOV_URL, session=RecordedSession(), page_size=50))
+    pd.testing.assert_frame_equal(transform_b3_data(raw).reset_index(drop=True), api.reset_index(drop=True))
+
+
+def test_falls_back_when_the_api_fails(monkeypatch):
+    fallback = pd.DataFrame({"Código": ["PETR4"]})
+
+    def broken(url):
+        raise requests.ConnectionError("down")
+
+    monkeypatch.setitem(extractors.EXTRACTORS, "api", broken)
+    monkeypatch.setitem(extractors.EXTRACTORS, "selenium", lambda url: fallback)
+
+    assert extract_b3_data(IBOV_URL, backend="api", fallback="selenium") is fallback
@@ -0,0 +1,137 @@
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from botocore.stub import Stubber
+from moto import mock_aws
+
+from src.create_firehose_stream import build_destination_config, record_columns
+from src.firehose_converter import convert, iter_json_records
+from src.price_poller import firehose_record, parse_price_payload
+
+BUCKET = "bucket-test"
+RAW_PREFIX = "dados-brutos/"
+STATE_KEY = "dados/_state/converted_keys.json"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _ingest_record(timestamp: str, price: float, heartbeat: bool = False) -> dict:
+    return {"timestamp": timestamp, "coin": "bitcoin", "price": price, "last_updated_at": 1754000000,
+            "heartbeat": heartbeat}
+
+
+def _poller_records() -> list[dict]:
+    fetched_at = datetime(2025, 8, 2, 0, 0, 5, tzinfo=timezone.utc)
+    ticks = parse_price_payload({"ethereum": {"brl": 20000.0, "usd": 3600.0, "last_updated_at": 1754092800}},
+                                ["brl", "usd"], fetched_at)
+    return [firehose_record(tick) for tick in ticks]
+
+
+def _put_synthetic_deliveries(s3_client) -> None:
+    """
+    What the stream left under the raw prefix: GZIP newline-delimited objects, an uncompressed object with
+    records concatenated without a delimiter, an empty object and one cut in the middle of a record.
+    """
+    gzipped = [_ingest_record(f"2025-08-01 12:00:{second:02d}", 600000.0 + second) for second in range(0, 60, 10)]
+    s3_client.put_object(Bucket=BUCKET, Key=f"{RAW_PREFIX}2025/08/01/12/stream-1",
+                         Body=gzip.compress("".join(json.dumps(record) + "\n" for record in gzipped).encode()))
+    concatenated = [_ingest_record("2025-08-01 23:59:59", 601000.0, heartbeat=True), *_poller_records()]
+    s3_client.put_object(Bucket=BUCKET, Key=f"{RAW_PREFIX}2025/08/02/00/stream-2",
+                         Body="".join(json.dumps(record) for record in concatenated).encode())
+    s3_client.put_object(Bucket=BUCKET, Key=f"{RAW_PREFIX}2025/08/02/00/stream-3", Body=b"")
+    s3_client.put_object(Bucket=BUCKET, Key=f"{RAW_PREFIX}2025/08/02/01/stream-4", Body=b'{"timestamp": "2025-08')
+
+
+def _keys(s3_client, prefix: str) -> list[str]:
+    return sorted(item["Key"] for item in s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get("Contents", []))
+
+
+def _read(s3_client, key: str):
+    return pq.read_table(io.BytesIO(s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read())).to_pandas()
+
+
+def test_iter_json_records_reads_every_delivery_shape():
+    records = [{"a": 1}, {"a": 2}]
+    newline = "".join(json.dumps(record) + "\n" for record in records).encode()
+
+    assert list(iter_json_records(newline)) == records
+    assert list(iter_json_records(gzip.compress(newline))) == records
+    assert list(iter_json_records(b'{"a": 1}{"a": 2}')) == records
+    assert list(iter_json_records(b"")) == []
+
+
+def test_convert_writes_one_parquet_file_per_coin_and_day(s3_client):
+    _put_synthetic_deliveries(s3_client)
+
+    counts = convert(s3_client, BUCKET, RAW_PREFIX, "dados/", STATE_KEY)
+
+    assert counts == {"objects": 3, "records": 9, "files": 2}
+    parquet_keys = [key for key in _keys(s3_client, "dados/") if key != STATE_KEY]
+    assert [key.rsplit("/", 1)[0] for key in parquet_keys] == ["dados/coin=bitcoin/data=2025-08-01",
+                                                               "dados/coin=ethereum/data=2025-08-02"]
+
+    bitcoin = _read(s3_client, parquet_keys[0])
+    # Same columns as the stream's Glue schema, which writes delivered records into the same partitions
+    assert list(bitcoin.columns) == [column["Name"] for column in record_columns]
+    assert list(bitcoin.columns) == ["timestamp", "coin", "currency", "price", "last_updated_at", "heartbeat"]
+    schema = pq.read_schema(io.BytesIO(s3_client.get_object(Bucket=BUCKET, Key=parquet_keys[0])["Body"].read()))
+    glue_types = {"string": pa.string(), "double": pa.float64(), "bigint": pa.int64(), "boolean": pa.bool_()}
+    assert [(field.name, field.type) for field in schema] == [(column["Name"], glue_types[column["Type"]])
+                                                              for column in record_columns]
+    assert len(bitcoin) == 7
+    assert bitcoin["timestamp"].is_monotonic_increasing
+    assert bitcoin["timestamp"].iloc[0] == "2025-08-01 12:00:00"
+    assert bitcoin["heartbeat"].sum() == 1
+    ethereum = _read(s3_client, parquet_keys[1])
+    assert sorted(zip(ethereum["currency"], ethereum["price"])) == [("brl", 20000.0), ("usd", 3600.0)]
+    assert ethereum["timestamp"].tolist() == ["2025-08-02 00:00:05", "2025-08-02 00:00:05"]
+
+    state = json.loads(s3_client.get_object(Bucket=BUCKET, Key=STATE_KEY)["Body"].read())
+    assert len(state["converted"]) == 3
+
+
+def test_convert_only_picks_up_new_deliveries(s3_client):
+    _put_synthetic_deliveries(s3_client)
+    convert(s3_client, BUCKET, RAW_PREFIX, "dados/", STATE_KEY)
+
+    assert convert(s3_client, BUCKET, RAW_PREFIX, "dados/", STATE_KEY) == {"objects": 0, "records": 0, "files": 0}
+
+    s3_client.put_object(Bucket=BUCKET, Key=f"{RAW_PREFIX}2025/08/02/12/stream-5",
+                         Body=(json.dumps(_ingest_record("2025-08-02 12:00:00", 602000.0)) + "\n").encode())
+    counts = convert(s3_client, BUCKET, RAW_PREFIX, "dados/", STATE_KEY, delete_source=True)
+
+    assert counts == {"objects": 1, "records": 1, "files": 1}
+    assert len(_keys(s3_client, "dados/coin=bitcoin/data=2025-08-02/")) == 1
+    assert _keys(s3_client, RAW_PREFIX) == [f"{RAW_PREFIX}2025/08/01/12/stream-1", f"{RAW_PREFIX}2025/08/02/00/stream-2",
+                                            f"{RAW_PREFIX}2025/08/02/00/stream-3", f"{RAW_PREFIX}2025/08/02/01/stream-4"]
+
+
+@pytest.mark.parametrize("delivery_format", ["parquet", "gzip", "none"])
+def test_destination_config_is_accepted_by_the_firehose_api(delivery_format):
+    config = build_destination_config(delivery_format, size_mb=5, interval_seconds=60)
+
+    assert config["BufferingHints"]["SizeInMBs"] == 64 # Dynamic partitioning needs at least 64 MB
+    assert config["CompressionFormat"] == ("GZIP" if delivery_format == "gzip" else "UNCOMPRESSED")
+    assert ("DataFormatConversionConfiguration" in config) == (delivery_format == "parquet")
+    assert build_destination_config(delivery_format, size_mb=500)["BufferingHints"]["SizeInMBs"] == 128
+
+    client = boto3.client("firehose", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+    with Stubber(client) as stubber: # Validates the request against the service model
+        stubber.add_response("create_delivery_stream", {"DeliveryStreamARN": "arn:aws:firehose:::stream"})
+        client.create_delivery_stream(DeliveryStreamName="ingest_bitcoin_stream", DeliveryStreamType="DirectPut",
+                                      ExtendedS3DestinationConfiguration=config)
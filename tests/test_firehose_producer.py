@@ -0,0 +1,133 @@
+import json
+import threading
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from src import firehose_producer
+from src.firehose_producer import MAX_BATCH_RECORDS, FirehoseProducer
+
+
+class FakeFirehose:
+    """
+    Records every put_record_batch call; `failures` lists, per call, the indexes answered with an error.
+    """
+
+    def __init__(self, failures: list[set[int]] | None = None):
+        self.failures = list(failures or [])
+        self.calls: list[list[bytes]] = []
+        self.lock = threading.Lock()
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        with self.lock:
+            self.calls.append([record["Data"] for record in Records])
+            failed = self.failures.pop(0) if self.failures else set()
+        results = [
+            {"ErrorCode": "ServiceUnavailableException", "ErrorMessage": "Slow down."} if index in failed
+            else {"RecordId": str(index)}
+            for index in range(len(Records))
+        ]
+        return {"FailedPutCount": len(failed), "RequestResponses": results}
+
+    @property
+    def sent(self) -> list[bytes]:
+        return [data for call in self.calls for data in call]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(firehose_producer, "FIREHOSE_RETRY_BACKOFF", 0)
+
+
+def test_records_are_sent_as_json_lines_in_batches_of_500():
+    client = FakeFirehose()
+    with FirehoseProducer(client, "stream", flush_interval=60) as producer:
+        for index in range(1200):
+            producer.put({"seq": index, "moeda": "bitcoin"})
+
+    assert [len(call) for call in client.calls] == [MAX_BATCH_RECORDS, MAX_BATCH_RECORDS, 200]
+    assert [json.loads(data)["seq"] for data in client.sent] == list(range(1200))
+    assert all(data.endswith(b"\n") for data in client.sent)
+    assert producer.stats()["records_sent"] == 1200
+
+
+def test_only_failed_entries_are_retried():
+    client = FakeFirehose(failures=[{1, 3}, {0}])
+    producer = FirehoseProducer(client, "stream", flush_interval=60)
+    for index in range(5):
+        producer.put({"seq": index})
+    producer.close()
+
+    assert [[json.loads(data)["seq"] for data in call] for call in client.calls] == [[0, 1, 2, 3, 4], [1, 3], [1]]
+    stats = producer.stats()
+    assert stats["records_sent"] == 5
+    assert stats["retries"] == 2
+    assert stats["records_failed"] == 0
+
+
+def test_records_are_given_up_after_max_retries():
+    client = FakeFirehose(failures=[{0}] * 10)
+    producer = FirehoseProducer(client, "stream", flush_interval=60, max_retries=2)
+    producer.put({"seq": 0})
+    producer.put({"seq": 1})
+    producer.close()
+
+    assert len(client.calls) == 3
+    stats = producer.stats()
+    assert stats["records_sent"] == 1
+    assert stats["records_failed"] == 1
+
+
+def test_flush_interval_sends_a_partial_batch():
+    client = FakeFirehose()
+    producer = FirehoseProducer(client, "stream", flush_interval=0.05)
+    producer.put("linha\n")
+    producer.flush(timeout=5)
+
+    assert client.sent == [b"linha\n"]
+    producer.close()
+
+
+def test_put_times_out_when_the_buffer_is_full():
+    client = FakeFirehose()
+    producer = FirehoseProducer(client, "stream", flush_interval=60, max_buffered_records=2)
+    producer.put(b"a")
+    producer.put(b"b")
+
+    with pytest.raises(TimeoutError):
+        producer.put(b"c", timeout=0.05)
+    producer.close()
+    assert client.sent == [b"a", b"b"]
+
+
+def test_oversized_record_is_rejected():
+    producer = FirehoseProducer(FakeFirehose(), "stream")
+    with pytest.raises(ValueError):
+        producer.put(b"x" * (firehose_producer.MAX_RECORD_BYTES + 1))
+    producer.close()
+
+
+def test_retries_against_a_stubbed_firehose_client():
+    client = boto3.client("firehose", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+    records = [b'{"seq": 0}\n', b'{"seq": 1}\n']
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "put_record_batch",
+            {"FailedPutCount": 1, "RequestResponses": [{"RecordId": "0"}, {"ErrorCode": "InternalFailure"}]},
+            {"DeliveryStreamName": "stream", "Records": [{"Data": data} for data in records]},
+        )
+        stubber.add_client_error("put_record_batch", "ServiceUnavailableException")
+        stubber.add_response(
+            "put_record_batch",
+            {"FailedPutCount": 0, "RequestResponses": [{"RecordId": "1"}]},
+            {"DeliveryStreamName": "stream", "Records": [{"Data": records[1]}]},
+        )
+        producer = FirehoseProducer(client, "stream", flush_interval=60)
+        producer.put({"seq": 0})
+        producer.put({"seq": 1})
+        producer.close()
+        stubber.assert_no_pending_responses()
+
+    assert producer.stats()["records_sent"] == 2
+    assert producer.stats()["retries"] == 2
@@ -0,0 +1,155 @@
+import pytest
+import requests
+
+from src import price_cache
+from src.price_cache import PriceCache
+
+
+class _Response:
+    def __init__(self, status_code: int = 200, payload: dict | None = None, headers: dict | None = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload or {}
+
+    def json(self) -> dict:
+        return self._payload
+
+
+class _FlakySession:
+    """
+    Answers with a price, then fails with the given outcomes in order.
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = [_Response(payload={"bitcoin": {"brl": 10.0, "last_updated_at": 1}}), *outcomes]
+
+    def get(self, url, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_failed_requests_fall_back_to_the_cached_price():
+    cache = PriceCache(_FlakySession(requests.ConnectionError("down"), _Response(500)), heartbeat_interval=0)
+
+    assert cache.get("bitcoin").status == "new"
+    for _ in range(2):
+        lookup = cache.get("bitcoin")
+        assert (lookup.status, lookup.price, lookup.emit) == ("error", 10.0, False)
+    assert cache.stats["errors"] == 2
+
+
+def test_failed_request_without_cached_price():
+    cache = PriceCache(_FlakySession(), heartbeat_interval=0)
+    cache.session.outcomes = [requests.Timeout("slow")]
+
+    lookup = cache.get("bitcoin")
+
+    assert (lookup.status, lookup.price) == ("error", None)
+
+
+class _RecordingSession:
+    """
+    Answers with the given responses in order and keeps the headers of every request.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent_headers = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent_headers.append(headers)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(price_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _price(price: float, last_updated_at: int, **headers) -> _Response:
+    return _Response(payload={"bitcoin": {"brl": price, "last_updated_at": last_updated_at}},
+                     headers={key.replace("_", "-"): value for key, value in headers.items()})
+
+
+def test_etag_is_sent_back_and_304_serves_the_cached_price(clock):
+    session = _RecordingSession(_price(10.0, 1, ETag='"v1"'), _Response(304))
+    cache = PriceCache(session, heartbeat_interval=0)
+
+    assert cache.get("bitcoin").status == "new"
+    lookup = cache.get("bitcoin")
+
+    assert session.sent_headers == [{}, {"If-None-Match": '"v1"'}]
+    assert (lookup.status, lookup.price, lookup.last_updated_at, lookup.emit) == ("not_modified", 10.0, 1, False)
+    assert cache.stats["not_modified"] == 1
+
+
+def test_max_age_serves_from_the_cache_without_a_request(clock):
+    session = _RecordingSession(_price(10.0, 1, Cache_Control="public, max-age=30"), _price(11.0, 2))
+    cache = PriceCache(session, heartbeat_interval=0)
+    cache.get("bitcoin")
+
+    clock[0] += 29
+    assert cache.get("bitcoin").status == "cached"
+    assert len(session.sent_headers) == 1
+
+    clock[0] += 1
+    lookup = cache.get("bitcoin")
+    assert (lookup.status, lookup.price) == ("new", 11.0)
+    assert len(session.sent_headers) == 2
+
+
+def test_no_cache_directive_disables_the_fresh_window(clock):
+    session = _RecordingSession(_price(10.0, 1, Cache_Control="no-cache, max-age=30"), _price(10.0, 1))
+    cache = PriceCache(session, heartbeat_interval=0)
+    cache.get("bitcoin")
+
+    assert cache.get("bitcoin").status == "duplicate"
+    assert len(session.sent_headers) == 2
+
+
+def test_unchanged_tick_is_suppressed_until_last_updated_at_moves(clock):
+    session = _RecordingSession(_price(10.0, 1), _price(10.0, 1), _price(10.0, 2))
+    cache = PriceCache(session, heartbeat_interval=0)
+
+    lookups = [cache.get("bitcoin") for _ in range(3)]
+
+    assert [(lookup.status, lookup.emit) for lookup in lookups] == [("new", True), ("duplicate", False), ("new", True)]
+    assert cache.stats["duplicates"] == 1
+    assert cache.stats["emitted"] == 2
+
+
+def test_unchanged_price_is_re_emitted_as_a_heartbeat(clock):
+    session = _RecordingSession(*[_price(10.0, 1) for _ in range(4)])
+    cache = PriceCache(session, heartbeat_interval=60)
+    cache.get("bitcoin")
+
+    clock[0] += 59
+    assert cache.get("bitcoin").emit is False
+    clock[0] += 1
+    heartbeat = cache.get("bitcoin")
+    assert (heartbeat.status, heartbeat.emit, heartbeat.heartbeat, heartbeat.price) == ("duplicate", True, True, 10.0)
+    clock[0] += 30 # The interval restarts at the heartbeat
+    assert cache.get("bitcoin").emit is False
+    assert cache.stats["heartbeats"] == 1
+
+
+def test_stats_and_hit_ratio(clock):
+    session = _RecordingSession(_price(10.0, 1, ETag='"v1"', Cache_Control="max-age=10"), _Response(304),
+                                _price(12.0, 3))
+    cache = PriceCache(session, heartbeat_interval=0)
+    assert cache.hit_ratio() == 0.0
+
+    cache.get("bitcoin") # miss
+    cache.get("bitcoin") # fresh: hit without a request
+    clock[0] += 10
+    cache.get("bitcoin") # 304: hit
+    clock[0] += 10
+    cache.get("bitcoin") # new price: miss
+
+    assert cache.stats == {"requests": 3, "hits": 2, "misses": 2, "not_modified": 1, "duplicates": 0,
+                           "heartbeats": 0, "emitted": 2, "errors": 0}
+    assert cache.hit_ratio() == 0.5
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from src.price_poller import (PRICE_IDS_PER_REQUEST, FirehoseSink, ParquetSink, PricePoller, SQLiteSink, chunk_ids,
+                              firehose_record, parse_price_payload)
+
+
+class FakeCoinGecko(BaseHTTPRequestHandler):
+    """
+    Answers /simple/price with one price per requested coin and currency, or with the queued error statuses.
+    """
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        with server.lock:
+            server.requests.append(query)
+            status = server.statuses.pop(0) if server.statuses else 200
+        if status != 200:
+            self.send_response(status)
+            self.send_header("Retry-After", "30")
+            self.end_headers()
+            return
+        currencies = query["vs_currencies"][0].split(",")
+        payload = {
+            coin: {**{currency: float(index + 1) for currency in currencies}, "last_updated_at": 1754000000}
+            for index, coin in enumerate(query["ids"][0].split(","))
+        }
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def coingecko():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCoinGecko)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _base_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class MemorySink:
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def write(self, ticks):
+        self.writes.append(ticks)
+
+    def close(self):
+        self.closed = True
+
+
+def test_parse_price_payload_skips_missing_currencies():
+    fetched_at = datetime(2025, 8, 1, tzinfo=timezone.utc)
+    ticks = parse_price_payload({"bitcoin": {"brl": 1.5, "last_updated_at": 7}, "ethereum": {"usd": 2}},
+                                ["brl", "usd"], fetched_at)
+
+    assert [(t.coin, t.currency, t.price, t.last_updated_at) for t in ticks] == [
+        ("bitcoin", "brl", 1.5, 7), ("ethereum", "usd", 2.0, None)
+    ]
+    assert chunk_ids(["a", "b", "c"], size=2) == [["a", "b"], ["c"]]
+
+
+def test_poll_batches_ids_into_as_few_requests_as_possible(coingecko):
+    coins = [f"coin-{index}" for index in range(PRICE_IDS_PER_REQUEST * 2 + 5)]
+    sink = MemorySink()
+    poller = PricePoller(coins, ["brl", "usd"], [sink], interval=0, base_url=_base_url(coingecko))
+
+    asyncio.run(poller.run(iterations=1))
+
+    assert len(coingecko.requests) == 3
+    batch_sizes = sorted(len(query["ids"][0].split(",")) for query in coingecko.requests)
+    assert batch_sizes == [5, PRICE_IDS_PER_REQUEST, PRICE_IDS_PER_REQUEST]
+    assert all(query["vs_currencies"] == ["brl,usd"] for query in coingecko.requests)
+    assert len(sink.writes) == 1 and len(sink.writes[0]) == len(coins) * 2
+    assert poller.stats["requests"] == 3
+    assert sink.closed
+
+
+def test_rate_limit_backs_off_and_recovers(coingecko):
+    coingecko.statuses = [429]
+    poller = PricePoller(["bitcoin"], ["brl"], [], interval=10, max_interval=300, base_url=_base_url(coingecko))
+
+    assert asyncio.run(poller.poll_once()) == []
+    assert poller.interval == 30 # Retry-After beats doubling the interval
+    assert poller.stats["rate_limited"] == 1
+
+    assert len(asyncio.run(poller.poll_once())) == 1
+    assert poller.interval == pytest.approx(24)
+
+
+def test_server_errors_are_counted_without_stopping_the_poll(coingecko):
+    coingecko.statuses = [500]
+    poller = PricePoller(["bitcoin"], ["brl"], [], base_url=_base_url(coingecko))
+
+    assert asyncio.run(poller.poll_once()) == []
+    assert poller.stats["errors"] == 1
+    assert poller.interval == poller.base_interval
+
+
+def test_ticks_reach_the_sqlite_and_parquet_sinks(coingecko, tmp_path):
+    db_path = str(tmp_path / "precos.db")
+    parquet_root = tmp_path / "precos_cripto"
+    poller = PricePoller(["bitcoin", "ethereum"], ["brl", "usd"],
+                         [SQLiteSink(db_path), ParquetSink(str(parquet_root))], interval=0,
+                         base_url=_base_url(coingecko))
+
+    asyncio.run(poller.run(iterations=2))
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT coin, currency, price, typeof(data_hora) FROM precos_cripto").fetchall()
+    conn.close()
+    assert len(rows) == 8
+    assert set(rows) == {("bitcoin", "brl", 1.0, "integer"), ("bitcoin", "usd", 1.0, "integer"),
+                         ("ethereum", "brl", 2.0, "integer"), ("ethereum", "usd", 2.0, "integer")}
+
+    parts = list(parquet_root.glob("ano=*/mes=*/dia=*/part-*.parquet"))
+    assert len(parts) == 2
+    assert len(pd.concat(pd.read_parquet(part) for part in parts)) == 8
+
+
+def test_firehose_sink_sends_the_partition_timestamp():
+    class Producer:
+        records = []
+
+        def put(self, record):
+            self.records.append(record)
+
+    fetched_at = datetime(2025, 8, 1, 23, 59, 30, tzinfo=timezone.utc)
+    ticks = parse_price_payload({"bitcoin": {"brl": 1.0}}, ["brl"], fetched_at)
+    FirehoseSink(Producer()).write(ticks)
+
+    assert Producer.records == [firehose_record(ticks[0])]
+    assert Producer.records[0]["timestamp"] == "2025-08-01 23:59:30"
+    assert json.dumps(Producer.records[0])
@@ -0,0 +1,196 @@
+import sqlite3
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src import query
+from src.dataset import read_pregao, read_pregao_table
+from src.query import QueryEngine, ResultCache
+
+
+def test_refined_view_exists_when_the_tree_is_missing(tmp_path):
+    engine = QueryEngine(str(tmp_path / "raw"), str(tmp_path / "refined"), str(tmp_path / "none.db"), ResultCache())
+
+    result = engine.query("SELECT acao, created_at, COUNT(*) AS n FROM refined GROUP BY acao, created_at",
+                          date(2025, 8, 1), date(2025, 8, 2))
+
+    assert list(result.columns) == ["acao", "created_at", "n"]
+    assert result.empty
+
+
+def test_refined_view_exists_when_the_tree_is_empty(tmp_path):
+    (tmp_path / "refined").mkdir()
+    engine = QueryEngine(str(tmp_path / "raw"), str(tmp_path / "refined"), str(tmp_path / "none.db"), ResultCache())
+
+    result = engine.query("SELECT cod FROM refined", date(2025, 8, 1), date(2025, 8, 2))
+
+    assert result.empty
+
+
+def _write_raw_days(root, days=(1, 2, 3)) -> None:
+    month = root / "ano=2025" / "mes=08"
+    month.mkdir(parents=True, exist_ok=True)
+    for day in days:
+        pq.write_table(pa.table({"cod": ["PETR4", "VALE3"], "acao": ["PETROBRAS", "VALE"], "tipo": ["PN N2", "ON NM"],
+                                 "qtde_teorica": [10 * day, 20 * day], "part_teorica_porc": [1.5, 2.5]}),
+                       month / f"dia={day:02d}.parquet")
+
+
+def _engine(tmp_path, **cache_options) -> QueryEngine:
+    return QueryEngine(str(tmp_path / "raw"), str(tmp_path / "refined"), str(tmp_path / "none.db"),
+                       ResultCache(**cache_options))
+
+
+@pytest.fixture
+def raw_reads(monkeypatch):
+    calls = []
+
+    def spy(start, end, codes=None, columns=None, root=None):
+        calls.append((start, end, codes))
+        return read_pregao_table(start, end, codes=codes, columns=columns, root=root)
+
+    monkeypatch.setattr(query, "read_pregao_table", spy)
+    return calls
+
+
+def test_simple_where_conjuncts_are_pushed_into_the_parquet_read(tmp_path, raw_reads):
+    _write_raw_days(tmp_path / "raw")
+
+    result = _engine(tmp_path).query(
+        "SELECT data, qtde_teorica FROM raw_pregao WHERE cod = 'PETR4' AND data >= '2025-08-02' AND qtde_teorica > 0",
+        date(2025, 8, 1), date(2025, 8, 31))
+
+    assert raw_reads == [(date(2025, 8, 2), date(2025, 8, 31), ["PETR4"])]
+    assert result.to_dict("list") == {"data": ["2025-08-02", "2025-08-03"], "qtde_teorica": [20, 30]}
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT cod FROM raw_pregao WHERE cod = 'PETR4' OR data = '2025-08-03'",
+    "SELECT cod FROM raw_pregao WHERE NOT (cod = 'PETR4')",
+    "SELECT cod FROM raw_pregao WHERE cod IN (SELECT cod FROM raw_pregao WHERE cod = 'VALE3')",
+    "SELECT cod FROM raw_pregao WHERE acao = 'cod = ''PETR4'''",
+])
+def test_conditional_predicates_are_left_to_sqlite(tmp_path, raw_reads, sql):
+    _write_raw_days(tmp_path / "raw")
+
+    expected = read_pregao(date(2025, 8, 1), date(2025, 8, 3), root=str(tmp_path / "raw"))
+    result = _engine(tmp_path).query(sql, date(2025, 8, 1), date(2025, 8, 3))
+
+    assert raw_reads == [(date(2025, 8, 1), date(2025, 8, 3), None)]
+    conn = sqlite3.connect(":memory:")
+    expected.assign(data=expected["data"].astype(str)).to_sql("raw_pregao", conn, index=False)
+    assert sorted(result["cod"]) == sorted(pd.read_sql_query(sql, conn)["cod"])
+
+
+def test_range_narrowed_to_nothing_still_has_the_raw_columns(tmp_path):
+    _write_raw_days(tmp_path / "raw")
+
+    result = _engine(tmp_path).query("SELECT cod, qtde_teorica FROM raw_pregao WHERE data > '2025-08-31'",
+                                     date(2025, 8, 1), date(2025, 8, 31))
+
+    assert list(result.columns) == ["cod", "qtde_teorica"]
+    assert result.empty
+
+
+def test_raw_view_exposes_the_range_with_a_data_column(tmp_path):
+    _write_raw_days(tmp_path / "raw")
+
+    result = _engine(tmp_path).query(
+        "SELECT data, SUM(qtde_teorica) AS total FROM raw_pregao GROUP BY data ORDER BY data",
+        date(2025, 8, 2), date(2025, 8, 3))
+
+    assert result.to_dict("list") == {"data": ["2025-08-02", "2025-08-03"], "total": [60, 90]}
+
+
+def test_repeated_query_is_answered_from_the_cache(tmp_path, raw_reads):
+    _write_raw_days(tmp_path / "raw")
+    engine = _engine(tmp_path)
+    sql = "SELECT cod, SUM(qtde_teorica) AS total FROM raw_pregao GROUP BY cod ORDER BY cod"
+
+    first = engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))
+    second = engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))
+
+    assert second.equals(first)
+    assert len(raw_reads) == 1
+    assert engine.cache.stats == {"hits": 1, "disk_hits": 0, "misses": 1, "evictions": 0}
+    engine.query(sql, date(2025, 8, 1), date(2025, 8, 2)) # Another range is another entry
+    assert len(raw_reads) == 2
+
+
+def test_changed_partition_file_invalidates_the_cached_result(tmp_path):
+    root = tmp_path / "raw"
+    _write_raw_days(root)
+    engine = _engine(tmp_path)
+    sql = "SELECT SUM(qtde_teorica) AS total FROM raw_pregao"
+    assert engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))["total"].tolist() == [180]
+
+    pq.write_table(pa.table({"cod": ["PETR4"], "acao": ["PETROBRAS"], "tipo": ["PN N2"], "qtde_teorica": [1000],
+                             "part_teorica_porc": [1.5]}), root / "ano=2025" / "mes=08" / "dia=02.parquet")
+
+    assert engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))["total"].tolist() == [1120]
+    assert engine.cache.stats["misses"] == 2
+    # A day outside the range does not touch the entry
+    _write_raw_days(root, days=(4,))
+    engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))
+    assert engine.cache.stats["hits"] == 1
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"value": range(rows)})
+
+
+def test_cache_evicts_the_least_recently_used_entry_by_count():
+    cache = ResultCache(max_entries=2, directory=None)
+    cache.put("a", _frame(1))
+    cache.put("b", _frame(1))
+    cache.get("a") # "b" becomes the oldest
+
+    cache.put("c", _frame(1))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_cache_evicts_by_memory_and_skips_oversized_results():
+    entry_bytes = int(_frame(1000).memory_usage(deep=True).sum())
+    cache = ResultCache(max_entries=10, max_mb=2.5 * entry_bytes / 2**20, directory=None)
+    for key in "abc":
+        cache.put(key, _frame(1000))
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
+    assert cache.stats["evictions"] == 1
+
+    cache.put("huge", _frame(10000))
+    assert cache.get("huge") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
+
+
+def test_disk_tier_serves_results_across_cache_instances(tmp_path):
+    _write_raw_days(tmp_path / "raw")
+    directory = str(tmp_path / "cache")
+    sql = "SELECT cod, qtde_teorica FROM raw_pregao WHERE data = '2025-08-03' ORDER BY cod"
+
+    first = _engine(tmp_path, directory=directory).query(sql, date(2025, 8, 1), date(2025, 8, 3))
+    engine = _engine(tmp_path, directory=directory) # A new CLI run: empty memory tier
+    second = engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))
+
+    assert second.equals(first)
+    assert engine.cache.stats == {"hits": 0, "disk_hits": 1, "misses": 0, "evictions": 0}
+    engine.query(sql, date(2025, 8, 1), date(2025, 8, 3))
+    assert engine.cache.stats["hits"] == 1 # Promoted to memory
+
+
+def test_disk_tier_keeps_the_most_recently_used_files(tmp_path):
+    directory = tmp_path / "cache"
+    cache = ResultCache(max_entries=2, directory=str(directory))
+    for key in ("a", "b", "c"):
+        cache.put(key, _frame(1))
+        time.sleep(0.01) # Distinct modification times
+
+    assert sorted(path.name for path in directory.iterdir()) == ["b.parquet", "c.parquet"]
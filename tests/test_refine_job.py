@@ -0,0 +1,48 @@
+import ast
+from datetime import date
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from src import dataset, refine_job
+from src.refine_job import TOTAL_COLUMN, write_refined
+
+
+def _top(codes: list[str]) -> pa.Table:
+    return pa.table({"cod": codes, "acao": [f"{code} S/A" for code in codes], TOTAL_COLUMN: [1] * len(codes)})
+
+
+def _refined_rows(root) -> set[tuple[str, str]]:
+    dataset = ds.dataset(str(root), format="parquet", partitioning="hive")
+    table = dataset.to_table(columns=["cod", "created_at"])
+    return set(zip(table["cod"].to_pylist(), table["created_at"].to_pylist()))
+
+
+def test_rewriting_a_day_drops_companies_that_left_the_top(tmp_path):
+    filesystem = pafs.LocalFileSystem()
+    root = str(tmp_path / "refined")
+
+    write_refined(_top(["AAA3", "BBB3"]), filesystem, root, date(2025, 8, 1))
+    write_refined(_top(["AAA3"]), filesystem, root, date(2025, 7, 31))
+    write_refined(_top(["AAA3", "CCC3"]), filesystem, root, date(2025, 8, 1))
+
+    assert _refined_rows(root) == {("AAA3", "2025-07-31"), ("AAA3", "2025-08-01"), ("CCC3", "2025-08-01")}
+
+
+def test_main_refines_every_changed_partition(monkeypatch):
+    run_dates = []
+    monkeypatch.setattr(refine_job, "run", lambda run_date, *args: run_dates.append(run_date) or _top([]))
+
+    refine_job.main(["--partitions", "2025-08-01,2025-07-31,2025-08-01", "--job-bookmark-option", "job-bookmark-disable"])
+
+    assert run_dates == [date(2025, 7, 31), date(2025, 8, 1)]
+
+
+def test_glue_python_shell_modules_stay_python_3_9_compatible():
+    # Glue Python shell runs 3.9: no newer syntax, and `list[str] | None` annotations must not be evaluated
+    for module in (refine_job, dataset):
+        ast.parse(Path(module.__file__).read_text(encoding="utf-8"), feature_version=(3, 9))
+    assert refine_job.main.__annotations__["argv"] == "list[str] | None"
+    assert dataset.read_day_table.__annotations__["codes"] == "list[str] | None"
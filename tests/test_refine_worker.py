@@ -0,0 +1,131 @@
+import json
+from datetime import date, timedelta
+
+import boto3
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from moto import mock_aws
+
+from src import aws_clients, metrics
+from src.refine_job import TOTAL_COLUMN
+from src.refine_worker import RefineWorker, lambda_consumers, message_partitions
+
+FIRST_DAY = date(2025, 7, 25)
+LAST_DAY = date(2025, 8, 1)
+
+
+@pytest.fixture
+def sqs(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    metrics.configure([])
+    with mock_aws():
+        aws_clients.clear_cache()
+        client = boto3.client("sqs", region_name="us-east-1")
+        queue_url = client.create_queue(QueueName="refine-events")["QueueUrl"]
+        yield client, queue_url
+    aws_clients.clear_cache()
+
+
+@pytest.fixture
+def roots(tmp_path):
+    raw = tmp_path / "raw"
+    day = FIRST_DAY
+    while day <= LAST_DAY:
+        month_dir = raw / f"ano={day.year}" / f"mes={day.month:02d}"
+        month_dir.mkdir(parents=True, exist_ok=True)
+        # BBBB4 overtakes AAAA3 from August on
+        pq.write_table(pa.table({
+            "cod": ["AAAA3", "BBBB4", "CCCC3"],
+            "acao": ["AAA ON", "BBB PN", "CCC ON"],
+            "qtde_teorica": [100, 1000 if day.month == 8 else 10, 1],
+        }), month_dir / f"dia={day.day:02d}.parquet")
+        day += timedelta(days=1)
+    return {"raw_root": str(raw), "output_root": str(tmp_path / "refined"), "state_root": str(tmp_path / "state")}
+
+
+def _s3_notification(day: date) -> str:
+    key = f"raw/ano={day.year}/mes={day.month:02d}/dia={day.day:02d}/b3_dados_brutos.parquet"
+    return json.dumps({"Records": [{"eventSource": "aws:s3", "s3": {"object": {"key": key}}}]})
+
+
+def _queue_depth(client, queue_url) -> tuple[int, int]:
+    attributes = client.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"],
+    )["Attributes"]
+    return int(attributes["ApproximateNumberOfMessages"]), int(attributes["ApproximateNumberOfMessagesNotVisible"])
+
+
+def _refined(output_root) -> dict[str, list[str]]:
+    table = ds.dataset(output_root, format="parquet", partitioning="hive").to_table()
+    rows = sorted(zip(table["created_at"].to_pylist(), table[TOTAL_COLUMN].to_pylist(), table["cod"].to_pylist()),
+                  key=lambda row: (str(row[0]), -row[1]))
+    refined = {}
+    for created_at, _, code in rows:
+        refined.setdefault(str(created_at), []).append(code)
+    return refined
+
+
+def test_message_partitions():
+    assert message_partitions({"MessageId": "1", "Body": _s3_notification(LAST_DAY)}) == {"2025-08-01"}
+    assert message_partitions({"MessageId": "2", "Body": '{"partitions": ["2025-07-31"]}'}) == {"2025-07-31"}
+    assert message_partitions({"MessageId": "3", "Body": '{"Event": "s3:TestEvent"}'}) == set()
+    assert message_partitions({"MessageId": "4", "Body": "not json"}) == set()
+
+
+def test_worker_refines_the_notified_days_and_deletes_the_messages(sqs, roots):
+    client, queue_url = sqs
+    for body in [_s3_notification(LAST_DAY), json.dumps({"partitions": ["2025-07-31"]}),
+                 json.dumps({"Event": "s3:TestEvent"}), "not json"]:
+        client.send_message(QueueUrl=queue_url, MessageBody=body)
+
+    worker = RefineWorker(client, queue_url, **roots, top_n=2, max_workers=2, wait_seconds=0, visibility_timeout=30)
+    stats = worker.run_forever(max_batches=1)
+
+    assert stats["messages"] == 4
+    assert stats["deleted"] == 4
+    assert stats["refreshes"] == 2
+    assert _queue_depth(client, queue_url) == (0, 0)
+    assert _refined(roots["output_root"]) == {"2025-07-31": ["AAAA3", "BBBB4"], "2025-08-01": ["BBBB4", "AAAA3"]}
+
+
+def test_messages_of_failed_days_are_left_for_redelivery(sqs, roots):
+    client, queue_url = sqs
+    broken = f"{roots['raw_root']}/ano=2025/mes=07/dia=30.parquet"
+    with open(broken, "wb") as file:
+        file.write(b"not parquet")
+    client.send_message(QueueUrl=queue_url, MessageBody=_s3_notification(date(2025, 7, 30)))
+    client.send_message(QueueUrl=queue_url, MessageBody=_s3_notification(LAST_DAY))
+
+    worker = RefineWorker(client, queue_url, **roots, wait_seconds=0, visibility_timeout=30)
+    stats = worker.run_forever(max_batches=1)
+
+    assert stats["failed_days"] == 1
+    assert stats["deleted"] == 1
+    assert _queue_depth(client, queue_url) == (0, 1)
+
+
+def test_receive_errors_back_off_without_stopping_the_worker():
+    class FailingSQS:
+        calls = 0
+
+        def receive_message(self, **kwargs):
+            FailingSQS.calls += 1
+            if FailingSQS.calls == 3:
+                worker.stop()
+            raise ConnectionError("network blip")
+
+    worker = RefineWorker(FailingSQS(), "queue", wait_seconds=0, receive_backoff_max=0)
+    stats = worker.run_forever()
+
+    assert stats["receive_errors"] == 3
+    assert stats["batches"] == 0
+
+
+def test_queue_without_lambda_mappings_has_no_consumers(sqs):
+    _, queue_url = sqs
+
+    assert lambda_consumers(boto3.client("lambda", region_name="us-east-1"), queue_url) == []
@@ -0,0 +1,81 @@
+import io
+
+import boto3
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from moto import mock_aws
+
+from src.s3_upload import MIN_PART_SIZE, S3MultipartWriter, write_parquet_to_s3
+
+BUCKET = "bucket-test"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _multipart_uploads(s3_client) -> list:
+    return s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+
+
+def test_small_object_is_sent_with_a_single_put(s3_client):
+    with S3MultipartWriter(s3_client, BUCKET, "small.bin", Metadata={"origem": "teste"}) as sink:
+        sink.write(b"abc")
+
+    response = s3_client.get_object(Bucket=BUCKET, Key="small.bin")
+    assert response["Body"].read() == b"abc"
+    assert response["Metadata"] == {"origem": "teste"}
+    assert "-" not in response["ETag"]
+
+
+def test_large_object_is_streamed_in_parts(s3_client):
+    payload = np.random.default_rng(0).bytes(2 * MIN_PART_SIZE + 1234)
+
+    with S3MultipartWriter(s3_client, BUCKET, "large.bin", part_size_mb=5, max_concurrency=2) as sink:
+        for start in range(0, len(payload), 1024 * 1024):
+            sink.write(payload[start:start + 1024 * 1024])
+
+    response = s3_client.get_object(Bucket=BUCKET, Key="large.bin")
+    assert response["Body"].read() == payload
+    assert response["ETag"].strip('"').endswith("-3")
+    assert _multipart_uploads(s3_client) == []
+
+
+def test_error_inside_the_writer_aborts_the_upload(s3_client):
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(s3_client, BUCKET, "broken.bin", part_size_mb=5) as sink:
+            sink.write(b"x" * (MIN_PART_SIZE + 1))
+            raise RuntimeError("falha no meio do upload")
+
+    assert _multipart_uploads(s3_client) == []
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET)
+
+
+def test_write_parquet_to_s3_round_trips_the_frame(s3_client):
+    rng = np.random.default_rng(1)
+    rows = 400_000
+    df = pd.DataFrame({
+        "cod": rng.integers(0, 10**9, rows).astype(str),
+        "qtde_teorica": rng.integers(0, 10**12, rows),
+        "part": rng.random(rows),
+    })
+
+    size = write_parquet_to_s3(s3_client, df, BUCKET, "raw/data.parquet", row_group_size=50_000,
+                               compression="none", part_size_mb=5)
+
+    response = s3_client.get_object(Bucket=BUCKET, Key="raw/data.parquet")
+    body = response["Body"].read()
+    assert len(body) == size > MIN_PART_SIZE
+    assert "-" in response["ETag"]
+    parquet = pq.ParquetFile(io.BytesIO(body))
+    assert parquet.metadata.num_row_groups == 8
+    pd.testing.assert_frame_equal(parquet.read().to_pandas(), df)
@@ -0,0 +1,35 @@
+import threading
+
+import pandas as pd
+
+from src import scheduler
+from src.scheduler import ScrapeTarget, run_targets
+
+
+def test_timed_out_attempt_never_uploads_over_its_retry(monkeypatch):
+    release_first = threading.Event()
+    calls = []
+    uploads = []
+
+    def extract(url, cancelled=None):
+        calls.append(url)
+        if len(calls) == 1:
+            release_first.wait(10) # The first attempt hangs past its timeout
+        return pd.DataFrame({"cod": ["PETR4"]})
+
+    monkeypatch.setattr(scheduler, "SCHEDULER_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(scheduler, "extract_b3_data", extract)
+    monkeypatch.setattr(scheduler, "transform_b3_data", lambda df: df)
+    monkeypatch.setattr(scheduler, "upload_dataframe_to_s3",
+                        lambda *args, **kwargs: uploads.append(threading.current_thread().name) or "key")
+
+    results = run_targets([ScrapeTarget("IBOV")], s3_client=None, bucket="bkt", timeout=0.2, max_retries=1)
+
+    release_first.set()
+    for thread in threading.enumerate():
+        if thread.name.startswith("b3-scrape"):
+            thread.join(5)
+
+    assert (results[0].status, results[0].attempts) == ("success", 2)
+    assert len(calls) == 2
+    assert len(uploads) == 1
@@ -0,0 +1,46 @@
+import io
+
+import boto3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from moto import mock_aws
+
+from src import aws_clients, metrics, scrapping_b3
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    metrics.configure([])
+    with mock_aws():
+        aws_clients.clear_cache()
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=scrapping_b3.nome_bucket)
+        yield client
+    aws_clients.clear_cache()
+
+
+def test_legacy_entry_point_uses_the_shared_extractor_and_streaming_upload(s3_client, monkeypatch):
+    urls = []
+    raw = pd.DataFrame({"Código": ["PETR4", "Redutor"], "Ação": ["PETROBRAS", ""], "Tipo": ["PN N2", ""],
+                        "Qtde. Teórica": ["4.566.995.139", "1"], "Part. (%)": ["7,823", ""]})
+    monkeypatch.setattr(scrapping_b3, "extract_b3_data", lambda url: urls.append(url) or raw)
+
+    key = scrapping_b3.executar_scraping()
+
+    assert urls == [scrapping_b3.B3_SCRAPE_URL]
+    table = pq.read_table(io.BytesIO(s3_client.get_object(Bucket=scrapping_b3.nome_bucket, Key=key)["Body"].read()))
+    assert table.column("cod").to_pylist() == ["PETR4"]
+    assert table.schema.field("tipo").type == pa.string()
+    assert "data_hora" in table.column_names
+
+
+def test_nothing_is_uploaded_when_extraction_fails(s3_client, monkeypatch):
+    monkeypatch.setattr(scrapping_b3, "extract_b3_data", lambda url: None)
+
+    assert scrapping_b3.executar_scraping() is None
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=scrapping_b3.nome_bucket)
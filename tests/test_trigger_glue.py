@@ -0,0 +1,101 @@
+import json
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from src import trigger_glue
+from src.trigger_glue import collect_partitions, lambda_handler, partitions_from_key
+
+JOB_NAME = "ETL_glue_pregao_B3"
+QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/123456789012/glue-trigger"
+
+
+def _s3_record(key: str) -> dict:
+    return {"eventSource": "aws:s3", "s3": {"bucket": {"name": "bucket-fiap-b3"}, "object": {"key": key}}}
+
+
+def _sqs_record(message_id: str, body: dict) -> dict:
+    return {"eventSource": "aws:sqs", "messageId": message_id, "body": json.dumps(body)}
+
+
+def _batch() -> dict:
+    return {"Records": [
+        _sqs_record("m1", {"Records": [_s3_record("raw/ano=2025/mes=08/dia=01/b3_dados_brutos.parquet")]}),
+        _sqs_record("m2", {"Records": [_s3_record("raw/ano%3D2025/mes%3D08/dia%3D02/b3_dados_brutos.parquet"),
+                                       _s3_record("raw/ano=2025/mes=08/dia=01/b3_dados_brutos.parquet")]}),
+        _sqs_record("m3", {"Event": "s3:TestEvent"}),
+        _sqs_record("m4", {"partitions": ["2025-07-31"]}),
+    ]}
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setenv(JOB_NAME, JOB_NAME)
+    monkeypatch.setenv("GLUE_TRIGGER_QUEUE_URL", QUEUE_URL)
+    credentials = {"region_name": "us-east-1", "aws_access_key_id": "x", "aws_secret_access_key": "x"}
+    stubbed = {"glue": boto3.client("glue", **credentials), "sqs": boto3.client("sqs", **credentials)}
+    stubbers = {name: Stubber(client) for name, client in stubbed.items()}
+    monkeypatch.setattr(trigger_glue, "get_client", lambda service_name: stubbed[service_name])
+    for stubber in stubbers.values():
+        stubber.activate()
+    yield stubbers
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+        stubber.deactivate()
+
+
+def test_collect_partitions_merges_notifications_and_follow_ups():
+    partitions, message_ids = collect_partitions(_batch())
+
+    assert partitions == {"2025-07-31", "2025-08-01", "2025-08-02"}
+    assert message_ids == ["m1", "m2", "m3", "m4"]
+    assert collect_partitions({"Records": [_s3_record("raw/ano=2025/mes=08/dia=05/x.parquet")]}) == ({"2025-08-05"}, [])
+    assert partitions_from_key("refined/acao=PETR4/created_at=2025-08-01/x.parquet") is None
+
+
+def test_one_job_run_per_batch(clients):
+    clients["glue"].add_response(
+        "start_job_run", {"JobRunId": "jr_1"},
+        {"JobName": JOB_NAME, "Arguments": {"--partitions": "2025-07-31,2025-08-01,2025-08-02"}},
+    )
+
+    response = lambda_handler(_batch(), None)
+
+    assert response["statusCode"] == 200
+    assert response["batchItemFailures"] == []
+
+
+def test_running_job_requeues_the_partitions(clients):
+    clients["glue"].add_client_error("start_job_run", "ConcurrentRunsExceededException")
+    clients["sqs"].add_response(
+        "send_message", {"MessageId": "follow-up"},
+        {"QueueUrl": QUEUE_URL, "MessageBody": json.dumps({"partitions": ["2025-07-31", "2025-08-01", "2025-08-02"]}),
+         "DelaySeconds": min(trigger_glue.GLUE_FOLLOW_UP_DELAY_SECONDS, 900)},
+    )
+
+    response = lambda_handler(_batch(), None)
+
+    assert response["batchItemFailures"] == []
+
+
+def test_running_job_without_follow_up_queue_returns_the_messages(clients, monkeypatch):
+    monkeypatch.delenv("GLUE_TRIGGER_QUEUE_URL")
+    clients["glue"].add_client_error("start_job_run", "ConcurrentRunsExceededException")
+
+    response = lambda_handler(_batch(), None)
+
+    assert response["batchItemFailures"] == [{"itemIdentifier": message_id} for message_id in ["m1", "m2", "m3", "m4"]]
+
+
+def test_batch_without_partitions_starts_nothing(clients):
+    response = lambda_handler({"Records": [_sqs_record("m1", {"Event": "s3:TestEvent"})]}, None)
+
+    assert response["batchItemFailures"] == []
+
+
+def test_other_glue_errors_are_raised(clients):
+    clients["glue"].add_client_error("start_job_run", "InternalServiceException")
+
+    with pytest.raises(Exception, match="InternalServiceException"):
+        lambda_handler(_batch(), None)
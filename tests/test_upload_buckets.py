@@ -0,0 +1,191 @@
+import hashlib
+import io
+import os
+from datetime import date, timedelta
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from moto import mock_aws
+
+from src.compaction import compact_month
+from src.upload_buckets import CONTENT_MD5_METADATA, backfill, discover_partitions, list_remote_objects
+
+BUCKET = "bucket-test"
+FIRST_DAY = date(2025, 6, 1)
+DAYS = 75 # June, July and half of August
+DAYS_AT_SCALE = 1100 # More keys than one list_objects_v2 page (1000)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _day_table(day: date) -> pa.Table:
+    return pa.table({"cod": ["AAAA3", "BBBB4"], "acao": ["AAA ON", "BBB PN"], "qtde_teorica": [day.day, day.month]})
+
+
+def _write_local_history(root, first_day: date = FIRST_DAY, count: int = DAYS) -> list[date]:
+    days = [first_day + timedelta(days=offset) for offset in range(count)]
+    for day in days:
+        month_dir = root / f"ano={day.year}" / f"mes={day.month:02d}"
+        if day.day % 10 == 0: # Rolling part-file layout
+            (month_dir / f"dia={day.day:02d}").mkdir(parents=True, exist_ok=True)
+            table = _day_table(day)
+            pq.write_table(table.slice(0, 1), month_dir / f"dia={day.day:02d}" / "part-0.parquet")
+            pq.write_table(table.slice(1), month_dir / f"dia={day.day:02d}" / "part-1.parquet")
+        else:
+            month_dir.mkdir(parents=True, exist_ok=True)
+            pq.write_table(_day_table(day), month_dir / f"dia={day.day:02d}.parquet")
+    return days
+
+
+def _remote_table(s3_client, key: str) -> pa.Table:
+    body = s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+    return pq.read_table(io.BytesIO(body))
+
+
+def test_backfill_uploads_every_day_and_resumes_from_the_checkpoint(s3_client, tmp_path):
+    root = tmp_path / "pregao_b3"
+    days = _write_local_history(root)
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+
+    partitions = discover_partitions(str(root), prefix="raw", filename="b3_dados_brutos.parquet")
+    assert [partition.day for partition in partitions] == days
+    assert partitions[0].key == "raw/ano=2025/mes=06/dia=01/b3_dados_brutos.parquet"
+
+    counts = backfill(s3_client, partitions, BUCKET, "raw", checkpoint, max_workers=8)
+    assert counts == {"checkpointed": 0, "uploaded": DAYS, "unchanged": 0, "failed": 0}
+    keys = [item["Key"] for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=BUCKET)
+            for item in page.get("Contents", [])]
+    assert len(keys) == DAYS
+    remote = _remote_table(s3_client, "raw/ano=2025/mes=06/dia=10/b3_dados_brutos.parquet")
+    assert remote.equals(_day_table(date(2025, 6, 10)))
+    head = s3_client.head_object(Bucket=BUCKET, Key=partitions[0].key)
+    assert head["Metadata"][CONTENT_MD5_METADATA] == head["ETag"].strip('"')
+
+    # Resume: the checkpoint covers everything
+    counts = backfill(s3_client, partitions, BUCKET, "raw", checkpoint, max_workers=8)
+    assert counts == {"checkpointed": DAYS, "uploaded": 0, "unchanged": 0, "failed": 0}
+
+    # Lost checkpoint: the listing shows the same bytes are already there
+    counts = backfill(s3_client, partitions, BUCKET, "raw", str(tmp_path / "new.jsonl"), max_workers=8)
+    assert counts == {"checkpointed": 0, "uploaded": 0, "unchanged": DAYS, "failed": 0}
+
+
+def test_changed_day_is_uploaded_again(s3_client, tmp_path):
+    root = tmp_path / "pregao_b3"
+    _write_local_history(root)
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    backfill(s3_client, discover_partitions(str(root)), BUCKET, "raw", checkpoint)
+
+    changed = root / "ano=2025" / "mes=07" / "dia=15.parquet"
+    pq.write_table(_day_table(date(2025, 7, 16)), changed)
+    os.utime(changed, ns=(0, 0))
+
+    counts = backfill(s3_client, discover_partitions(str(root)), BUCKET, "raw", checkpoint)
+    assert counts == {"checkpointed": DAYS - 1, "uploaded": 1, "unchanged": 0, "failed": 0}
+    remote = _remote_table(s3_client, "raw/ano=2025/mes=07/dia=15/b3_dados_brutos.parquet")
+    assert remote.equals(_day_table(date(2025, 7, 16)))
+
+
+def test_days_of_compacted_months_are_cut_out_of_the_compacted_file(s3_client, tmp_path):
+    root = tmp_path / "pregao_b3"
+    _write_local_history(root)
+    compact_month(2025, 6, str(root))
+    for path in (root / "ano=2025" / "mes=06").glob("dia=*"):
+        if path.is_file():
+            path.unlink() # As purge_retired would after the grace period
+
+    partitions = discover_partitions(str(root), start=date(2025, 6, 1), end=date(2025, 6, 30))
+    assert len(partitions) == 30
+    assert all(partition.root == str(root) for partition in partitions)
+
+    counts = backfill(s3_client, partitions, BUCKET, "raw", str(tmp_path / "checkpoint.jsonl"))
+    assert counts["uploaded"] == 30
+    table = _remote_table(s3_client, "raw/ano=2025/mes=06/dia=07/b3_dados_brutos.parquet")
+    assert "data" not in table.column_names
+    assert table.sort_by("cod").equals(_day_table(date(2025, 6, 7)))
+
+
+def _put_multipart(s3_client, key: str, body: bytes, metadata: dict | None = None) -> None:
+    upload = s3_client.create_multipart_upload(Bucket=BUCKET, Key=key, Metadata=metadata or {})
+    part = s3_client.upload_part(Bucket=BUCKET, Key=key, UploadId=upload["UploadId"], PartNumber=1, Body=body)
+    s3_client.complete_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload["UploadId"],
+                                        MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": part["ETag"]}]})
+
+
+def test_multipart_object_without_md5_metadata_is_uploaded_again(s3_client, tmp_path):
+    root = tmp_path / "pregao_b3"
+    _write_local_history(root)
+    partition = discover_partitions(str(root), start=date(2025, 6, 1), end=date(2025, 6, 2))[0]
+    payload = partition.payload()
+    stale = bytes(len(payload)) # Same size, other bytes
+    _put_multipart(s3_client, partition.key, stale)
+    assert "-" in s3_client.head_object(Bucket=BUCKET, Key=partition.key)["ETag"]
+
+    counts = backfill(s3_client, [partition], BUCKET, "raw", str(tmp_path / "checkpoint.jsonl"))
+
+    assert counts["uploaded"] == 1
+    assert s3_client.get_object(Bucket=BUCKET, Key=partition.key)["Body"].read() == payload
+
+
+def test_multipart_object_with_md5_metadata_is_compared_by_it(s3_client, tmp_path):
+    root = tmp_path / "pregao_b3"
+    _write_local_history(root)
+    partition = discover_partitions(str(root), start=date(2025, 6, 1), end=date(2025, 6, 2))[0]
+    payload = partition.payload()
+    _put_multipart(s3_client, partition.key, payload, {CONTENT_MD5_METADATA: hashlib.md5(payload).hexdigest()})
+
+    counts = backfill(s3_client, [partition], BUCKET, "raw", str(tmp_path / "checkpoint.jsonl"))
+
+    assert counts["unchanged"] == 1
+
+
+def test_part_files_written_before_and_after_the_tipo_change_are_merged(tmp_path):
+    day_dir = tmp_path / "pregao_b3" / "ano=2025" / "mes=08" / "dia=04"
+    day_dir.mkdir(parents=True)
+    pq.write_table(pa.table({"cod": ["PETR4"], "tipo": ["PN N2"]}), day_dir / "part-0.parquet")
+    pq.write_table(pa.table({"cod": ["VALE3"], "tipo": pa.array(["ON NM"]).dictionary_encode()}),
+                   day_dir / "part-1.parquet")
+
+    partition = discover_partitions(str(tmp_path / "pregao_b3"))[0]
+    table = pq.read_table(io.BytesIO(partition.payload()))
+
+    assert table.schema.field("tipo").type == pa.string()
+    assert table.column("tipo").to_pylist() == ["PN N2", "ON NM"]
+
+
+def test_backfill_at_more_partitions_than_one_listing_page(s3_client, tmp_path):
+    root = tmp_path / "pregao_b3"
+    days = _write_local_history(root, date(2022, 1, 1), DAYS_AT_SCALE) # Up to 2025-01-04
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    partitions = discover_partitions(str(root))
+    assert [partition.day for partition in partitions] == days
+
+    counts = backfill(s3_client, partitions, BUCKET, "raw", str(checkpoint), max_workers=16)
+    assert counts == {"checkpointed": 0, "uploaded": DAYS_AT_SCALE, "unchanged": 0, "failed": 0}
+
+    pages = list(s3_client.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix="raw/"))
+    assert len(pages) == 2
+    remote = list_remote_objects(s3_client, BUCKET, "raw")
+    assert sorted(remote) == sorted(partition.key for partition in partitions)
+    assert remote[partitions[-1].key][0] == len(partitions[-1].payload())
+
+    # Interrupted run: the checkpoint lost its tail, with the last line cut mid-write
+    lines = checkpoint.read_text(encoding="utf-8").splitlines(keepends=True)
+    checkpoint.write_text("".join(lines[:600]) + lines[600][:20], encoding="utf-8")
+
+    counts = backfill(s3_client, partitions, BUCKET, "raw", str(checkpoint), max_workers=16)
+    # The keys past the first listing page are recognised as unchanged too
+    assert counts == {"checkpointed": 600, "uploaded": 0, "unchanged": DAYS_AT_SCALE - 600, "failed": 0}
+    counts = backfill(s3_client, partitions, BUCKET, "raw", str(checkpoint), max_workers=16)
+    assert counts["checkpointed"] == DAYS_AT_SCALE